@@ -1,14 +1,55 @@
 import sys
+import time
 
 if "unittest" not in sys.modules:
     # pylint: disable=import-error, no-name-in-module
     # pylint: disable=invalid-name
     import aqt
-    from aqt.qt import QAction, qconnect  # type: ignore
-    from aqt.utils import showWarning
+    from anki.notes import Note
+    from aqt.operations import QueryOp
+    from aqt.qt import QAction, QMenu, qconnect  # type: ignore
+    from aqt.utils import (
+        askUser,
+        chooseList,
+        getSaveFile,
+        getText,
+        showInfo,
+        showWarning,
+        tooltip,
+    )
 
     from .arqimporter_dialog import ARQImporterDialog
-    from . import models
+    from . import fonts, gen_notes, models, neighbor_context
+    from .exporter import export_question_set
+    from .gen_notes import revert_import
+    from .import_checkpoint import (
+        clear_checkpoint,
+        discard_unrecorded_notes,
+        pending_import,
+        resumed_job,
+    )
+    from .import_queue import run_import_job
+    from .media_rebuild import rebuild_question_set_media
+    from .migration import pending_migration
+    from .question_sets import (
+        collect_garbage,
+        get_import_ledger,
+        question_set_titles,
+    )
+    from .question_sets_dialog import choose_question_sets
+    from .retitle import retitle_question_set
+    from .search_dialog import open_search_index
+    from .watcher import get_watches, poll_watches, unwatch_file
+
+    # milliseconds between checks of watched files
+    WATCH_INTERVAL = 10000
+    # checks are skipped for up to this many intervals after failures that keep happening
+    MAX_BACKOFF = 32
+    polling = False
+    watch_timer = None
+    # failures of checks in a row, and the time until which checks are skipped after them
+    poll_failures = 0
+    poll_resume_time = 0.0
 
     def open_dialog():
         current_version = aqt.mw.col.get_config(
@@ -21,12 +62,280 @@ if "unittest" not in sys.modules:
                 "وجاوب بنعم على النافذة التي ستظهر."
             )
             return
+        if pending_migration(aqt.mw.col):
+            showWarning(
+                "يجري تحديث ملحوظات ARQImporter الخاصة بك. "
+                "انتظر حتى يكتمل التحديث، أو أعد تشغيل أنكي لاستئنافه."
+            )
+            return
+        if pending_import(aqt.mw.col) and resume_import():
+            return
         dialog = ARQImporterDialog(aqt.mw)
         dialog.exec()
 
+    def resume_import():
+        "Offer to resume an interrupted import. Returns whether it's being resumed."
+        checkpoint = pending_import(aqt.mw.col)
+        job = resumed_job(aqt.mw.col)
+        if job is None or not askUser(
+            "توقف استيراد مجموعة الأسئلة «%s» قبل أن يكتمل، بعد السؤال %i. "
+            "هل تريد إكمال استيرادها من حيث توقف؟"
+            % (checkpoint["title"], checkpoint["last_seq"])
+        ):
+            clear_checkpoint(aqt.mw.col)
+            return False
+
+        def op(col):
+            discard_unrecorded_notes(col)
+            index = open_search_index(aqt.mw)
+            try:
+                return run_import_job(col, Note, job, index)
+            finally:
+                index.close()
+
+        def on_success(added):
+            aqt.mw.reset()
+            tooltip("أضيف %i سؤال إلى %s." % (max(added, 0), job["title"]))
+
+        QueryOp(parent=aqt.mw, op=op, success=on_success).failure(
+            lambda exc: showWarning(str(exc))
+        ).with_progress().run_in_background()
+        return True
+
+    def on_collect_garbage():
+        QueryOp(
+            parent=aqt.mw,
+            op=collect_garbage,
+            success=lambda trashed: tooltip(
+                "تم حذف %i ملف وسائط غير مستخدم." % len(trashed)
+            ),
+        ).with_progress().run_in_background()
+
+    def choose_question_set(prompt: str):
+        titles = question_set_titles(aqt.mw.col)
+        if not titles:
+            showWarning("لا توجد مجموعات أسئلة في مجموعتك.")
+            return None
+        return titles[chooseList(prompt, titles, parent=aqt.mw)]
+
+    def on_export():
+        title = choose_question_set("اختر مجموعة الأسئلة التي تريد تصديرها")
+        if title is None:
+            return
+        path = getSaveFile(aqt.mw, "تصدير نص", "arqimporter_export", "", ".txt", title)
+        if not path:
+            return
+        QueryOp(
+            parent=aqt.mw,
+            op=lambda col: export_question_set(col, title, path),
+            success=lambda count: tooltip("تم تصدير %i سؤال." % count),
+        ).failure(
+            lambda exc: showWarning("تعذر تصدير مجموعة الأسئلة بعلاماتها: %s" % exc)
+        ).with_progress().run_in_background()
+
+    def on_rebuild_media():
+        titles = question_set_titles(aqt.mw.col)
+        selected = choose_question_sets(
+            aqt.mw, titles, "اختر مجموعات الأسئلة التي تريد إعادة بناء ملفاتها"
+        )
+        if not selected:
+            return
+
+        def op(col):
+            report = rebuild_question_set_media(
+                col, None if len(selected) == len(titles) else set(selected)
+            )
+            if fonts.SUBSET_FONTS and fonts.fonts_available():
+                fonts.update_font_subsets(
+                    col, fonts.collection_texts(col), rebuild=True
+                )
+            return report
+
+        QueryOp(
+            parent=aqt.mw,
+            op=op,
+            success=lambda report: showInfo(report.summary()),
+        ).with_progress().run_in_background()
+
+    def on_retitle():
+        title = choose_question_set("اختر مجموعة الأسئلة التي تريد إعادة تسميتها")
+        if title is None:
+            return
+        new_title, ok = getText("العنوان الجديد:", parent=aqt.mw, default=title)
+        new_title = new_title.strip()
+        if not ok or not new_title or new_title == title:
+            return
+
+        def op(col):
+            index = open_search_index(aqt.mw)
+            try:
+                return retitle_question_set(col, title, new_title, index)
+            finally:
+                index.close()
+
+        def on_failure(exc):
+            if isinstance(exc, ValueError):
+                showWarning("لديك بالفعل مجموعة أسئلة بهذا العنوان.")
+            else:
+                showWarning(str(exc))
+
+        QueryOp(
+            parent=aqt.mw,
+            op=op,
+            success=lambda count: tooltip("تمت إعادة تسمية %i ملحوظة." % count),
+        ).failure(on_failure).with_progress().run_in_background()
+
+    def on_revert_import():
+        # newest first
+        entries = get_import_ledger(aqt.mw.col)[::-1]
+        if not entries:
+            showWarning("لا توجد عمليات استيراد مسجلة.")
+            return
+        choices = [
+            "%s - %s - %i سؤال"
+            % (
+                entry["title"],
+                time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["time"])),
+                entry["count"],
+            )
+            for entry in entries
+        ]
+        entry = entries[
+            chooseList("اختر عملية الاستيراد التي تريد التراجع عنها", choices)
+        ]
+        if not askUser(
+            "سيتم حذف %i ملحوظة أضيفت إلى %s مع بطاقاتها. هل تريد الاستمرار؟"
+            % (entry["count"], entry["title"])
+        ):
+            return
+
+        def op(col):
+            index = open_search_index(aqt.mw)
+            try:
+                return revert_import(col, entry["first_nid"], index)
+            finally:
+                index.close()
+
+        def on_success(count):
+            aqt.mw.reset()
+            tooltip("تم حذف %i ملحوظة." % count)
+
+        def on_failure(exc):
+            if isinstance(exc, ValueError):
+                showWarning("لم تعد عملية الاستيراد هذه مسجلة.")
+            else:
+                showWarning(str(exc))
+
+        QueryOp(parent=aqt.mw, op=op, success=on_success).failure(
+            on_failure
+        ).with_progress().run_in_background()
+
+    def on_unwatch():
+        titles = sorted(get_watches(aqt.mw.col))
+        if not titles:
+            showWarning("لا توجد ملفات مراقبة.")
+            return
+        title = titles[
+            chooseList("اختر مجموعة الأسئلة التي تريد إيقاف مراقبة ملفها", titles)
+        ]
+        unwatch_file(aqt.mw.col, title)
+        tooltip("أوقفت مراقبة ملف %s." % title)
+
+    def poll():
+        global polling  # pylint: disable=global-statement
+        if (
+            polling
+            or aqt.mw.col is None
+            or time.time() < poll_resume_time
+            or not get_watches(aqt.mw.col)
+        ):
+            return
+        polling = True
+
+        def op(col):
+            index = open_search_index(aqt.mw)
+            try:
+                return poll_watches(col, Note, index)
+            finally:
+                index.close()
+
+        def on_done(result):
+            global polling, poll_failures  # pylint: disable=global-statement
+            polling = False
+            poll_failures = 0
+            added, stopped = result
+            messages = [
+                "أضيف %i سؤال إلى %s." % (count, title)
+                for title, count in added.items()
+            ] + [
+                "أوقفت مراقبة ملف %s: %s" % (title, reason)
+                for title, reason in stopped.items()
+            ]
+            if messages:
+                tooltip("<br>".join(messages))
+
+        def on_failure(exc):
+            global polling, poll_failures, poll_resume_time  # pylint: disable=global-statement
+            polling = False
+            # reported once, then checked again less and less often until it succeeds
+            if not poll_failures:
+                tooltip("تعذر فحص الملفات المراقبة: %s" % exc)
+            poll_failures += 1
+            poll_resume_time = (
+                time.time() + min(2**poll_failures, MAX_BACKOFF) * WATCH_INTERVAL / 1000
+            )
+
+        QueryOp(parent=aqt.mw, op=op, success=on_done).failure(
+            on_failure
+        ).run_in_background()
+
+    def start_watching():
+        "Start the timer polling the watched files, once for all profiles opened."
+        global watch_timer  # pylint: disable=global-statement
+        if watch_timer is None:
+            watch_timer = aqt.mw.progress.timer(
+                WATCH_INTERVAL, poll, True, parent=aqt.mw
+            )
+
+    def apply_config(config=None):
+        config = config or aqt.mw.addonManager.getConfig(__name__)
+        gen_notes.COMPRESS_MEDIA = config.get("compress_media", False)
+        gen_notes.PARALLEL_PARSE = config.get("parallel_parsing", False)
+        fonts.SUBSET_FONTS = config.get("subset_fonts", False)
+        neighbor_context.CONTEXT_SIZE = config.get("neighbor_context", 2)
+
     if aqt.mw is not None:
+        menu = QMenu("مستورد الأسئلة العربية", aqt.mw)
+        aqt.mw.form.menuTools.addMenu(menu)
         action = QAction(aqt.mw)
         action.setText("استيراد الأسئلة العربية")
-        aqt.mw.form.menuTools.addAction(action)
+        menu.addAction(action)
         qconnect(action.triggered, open_dialog)
+        action = QAction(aqt.mw)
+        action.setText("حذف ملفات مجموعات الأسئلة غير المستخدمة")
+        menu.addAction(action)
+        qconnect(action.triggered, on_collect_garbage)
+        action = QAction(aqt.mw)
+        action.setText("تصدير مجموعة أسئلة")
+        menu.addAction(action)
+        qconnect(action.triggered, on_export)
+        action = QAction(aqt.mw)
+        action.setText("إعادة بناء ملفات مجموعات الأسئلة")
+        menu.addAction(action)
+        qconnect(action.triggered, on_rebuild_media)
+        action = QAction(aqt.mw)
+        action.setText("إعادة تسمية مجموعة أسئلة")
+        menu.addAction(action)
+        qconnect(action.triggered, on_retitle)
+        action = QAction(aqt.mw)
+        action.setText("التراجع عن عملية استيراد")
+        menu.addAction(action)
+        qconnect(action.triggered, on_revert_import)
+        action = QAction(aqt.mw)
+        action.setText("إيقاف مراقبة ملف")
+        menu.addAction(action)
+        qconnect(action.triggered, on_unwatch)
         aqt.gui_hooks.profile_did_open.append(models.ensure_note_type)
+        aqt.gui_hooks.profile_did_open.append(start_watching)
+        apply_config()
+        aqt.mw.addonManager.setConfigUpdatedAction(__name__, apply_config)
@@ -0,0 +1,142 @@
+"""
+Read question sets from structured files straight into the blocks parse_questions returns,
+without guessing the kind of each line from markers.
+
+CSV and TSV rows have a column for each of the question, answer, chapter and extra note;
+the columns are set in the add-on config by index, or by name if the file has a header row.
+An empty chapter cell continues the chapter of the previous row.
+
+In Markdown files, headings set the chapter, with nested headings forming nested chapters;
+a list item at the start of a line starts a question, indented lines and lines that don't
+start a list item are its answer, and quoted lines ("> ") are its extra note.
+"""
+import csv
+import os
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .source_files import iter_decoded_lines
+
+BLOCK_FIELDS = ("question", "answer", "chapter", "extra")
+DEFAULT_COLUMNS: Dict[str, Union[int, str]] = {
+    "question": 0,
+    "answer": 1,
+    "chapter": 2,
+    "extra": 3,
+}
+
+MD_HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*$")
+MD_ITEM_RE = re.compile(r"^(?:[-*+]|\d+[.)])\s+(.*)$")
+
+
+def cell_html(value: str) -> str:
+    "Join the lines of a cell the way parse_questions joins the lines of a block."
+    return "<br>".join(line.strip() for line in value.splitlines() if line.strip())
+
+
+def read_delimited(
+    lines: Iterable[str],
+    delimiter: str,
+    columns: Optional[Dict[str, Union[int, str]]] = None,
+    header: bool = False,
+) -> Iterator[Dict[str, str]]:
+    """
+    Yield a block for each row of a CSV or TSV text given as lines without line breaks.
+    _columns_ maps block fields to column indices, or to column names if _header_ is true.
+    Fields without a column are left empty, and rows without a question or answer are skipped.
+    """
+    columns = DEFAULT_COLUMNS if columns is None else columns
+    # line breaks are put back so that the csv module keeps them in quoted cells
+    rows = csv.reader((line + "\n" for line in lines), delimiter=delimiter)
+    indices: Dict[str, int] = {}
+    if header:
+        names = next(rows, [])
+        for field, column in columns.items():
+            if isinstance(column, str):
+                indices[field] = names.index(column)
+            else:
+                indices[field] = column
+    else:
+        indices = {field: int(column) for field, column in columns.items()}
+    chapter = ""
+    for row in rows:
+        block = {
+            field: (
+                cell_html(row[indices[field]])
+                if field in indices and indices[field] < len(row)
+                else ""
+            )
+            for field in BLOCK_FIELDS
+        }
+        chapter = block["chapter"] = block["chapter"] or chapter
+        if block["question"] or block["answer"]:
+            yield block
+
+
+def read_markdown(lines: Iterable[str]) -> Iterator[Dict[str, str]]:
+    "Yield the blocks of a Markdown text given as lines without line breaks."
+    # (level, text) of the headings the current line is under
+    headings: List[Tuple[int, str]] = []
+    block: Optional[Dict[str, List[str]]] = None
+
+    def finish(block: Dict[str, List[str]]) -> Dict[str, str]:
+        return {
+            "question": "<br>".join(block["question"]),
+            "answer": "<br>".join(block["answer"]),
+            "chapter": "<br>".join(text for _, text in headings),
+            "extra": "<br>".join(block["extra"]),
+        }
+
+    for line in lines:
+        if not line.strip():
+            continue
+        heading = MD_HEADING_RE.match(line)
+        item = MD_ITEM_RE.match(line)
+        if heading:
+            if block:
+                yield finish(block)
+                block = None
+            level = len(heading.group(1))
+            while headings and headings[-1][0] >= level:
+                headings.pop()
+            headings.append((level, heading.group(2)))
+        elif item:
+            if block:
+                yield finish(block)
+            block = {"question": [item.group(1).strip()], "answer": [], "extra": []}
+        elif block is None:
+            # text before the first question
+            continue
+        elif line.lstrip().startswith(">"):
+            block["extra"].append(line.lstrip()[1:].strip())
+        else:
+            answer = line.strip()
+            nested = MD_ITEM_RE.match(answer)
+            block["answer"].append(nested.group(1) if nested else answer)
+    if block:
+        yield finish(block)
+
+
+def read_structured_file(
+    path: str, config: Optional[Dict[str, Any]] = None
+) -> Optional[List[Dict[str, str]]]:
+    """
+    Return the blocks of a CSV, TSV or Markdown file, or None for other kinds of files.
+    _config_ is the "structured_files" section of the add-on config.
+    """
+    config = config or {}
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "rb") as f:
+        lines = iter_decoded_lines(f)
+        if ext in (".csv", ".tsv"):
+            return list(
+                read_delimited(
+                    lines,
+                    "\t" if ext == ".tsv" else config.get("csv_delimiter", ","),
+                    config.get("columns"),
+                    config.get("header_row", False),
+                )
+            )
+        if ext in (".md", ".markdown"):
+            return list(read_markdown(lines))
+    return None
@@ -1,21 +1,124 @@
+import csv
+import time
+
 import aqt
 from aqt.qt import *
 from aqt import qtmajor
 import aqt.editor
-from aqt.utils import getFile, showWarning, askUser, tooltip
+from aqt.operations import QueryOp
+from aqt.utils import getFile, showText, showWarning, askUser, tooltip
 from anki.notes import Note
 
 if qtmajor > 5:
     from . import import_dialog_qt6 as arqimporter_form
 else:
     from . import import_dialog_qt5 as arqimporter_form
-from .gen_notes import add_notes, cleanse_text
+from .adapters import read_structured_file
+from .import_queue import (
+    DONE,
+    FAILED,
+    PENDING,
+    RUNNING,
+    plan_import_job,
+    run_import_job,
+    run_import_queue,
+)
+from .metrics import analyze, format_report, read_metrics
+from .question_sets import get_import_ledger
+from .search_dialog import SearchDialog, open_search_index
+from .source_files import SAMPLE_SIZE, detect_encoding, iter_decoded_lines
 from . import models
 
+NO_NEW_QUESTIONS_MESSAGE = (
+    "عدد الأسئلة المستوردة سابقاً أكبر من عددها في النص الحالي. "
+    "تأكد من أنك أدخلت العدد الصحيح، "
+    "أو تأكد من أنك أدخلت النص الكامل."
+)
+
+
+def job_error_message(exc):
+    "The message shown for an error raised by an import job."
+    if isinstance(exc, ValueError):
+        return (
+            "لا يطابق النص الأسئلة المستوردة سابقًا مع إدراج أسئلة جديدة فقط. "
+            "يبدو أن بعض الأسئلة المستوردة قد عُدّلت أو حُذفت من النص."
+        )
+    if isinstance(exc, KeyError):
+        return (
+            "تعذر إيجاد حقل {field} في نوع ملحوظة {name} في مجموعتك. "
+            "إذا لم يكن لديك أي ملحوظات ARQImporter بعد، تستطيع حذف "
+            "نوع الملحوظة من خلال أدوات > إدارة أنواع الملحوظات وإعادة تشغيل "
+            "أنكي لحل المشكلة. أو أضف الحقل إلى نوع الملحوظة.".format(
+                field=str(exc), name=models.ARQOne.name
+            )
+        )  # pylint: disable=no-member
+    return str(exc)
+
+
+def media_report(col, title):
+    "Describe the size of the media file written by the last import, if it was of _title_."
+    ledger = get_import_ledger(col)
+    if not ledger or ledger[-1]["title"] != title or not ledger[-1].get("media_size"):
+        return ""
+    size = ledger[-1]["media_size"]
+    raw_size = ledger[-1]["media_raw_size"]
+    report = "<br>Question set file: %i KB" % (size // 1024)
+    if size < raw_size:
+        report += ", compressed %.1f:1" % (raw_size / size)
+    return report + "."
+
+
+PLAN_WARNINGS = {
+    "empty_question": "سؤال فارغ",
+    "empty_answer": "جواب فارغ",
+    "duplicate_question": "سؤال مكرر",
+}
+
+
+def describe_plan(plan, elapsed):
+    "The report of an import plan shown by the preview."
+    lines = []
+    if plan["error"] == "mismatch":
+        lines.append(job_error_message(ValueError()))
+    elif plan["error"] == "no_new_blocks":
+        lines.append(NO_NEW_QUESTIONS_MESSAGE)
+    if plan["title_exists"]:
+        lines.append("تحذير: لديك بالفعل مجموعة أسئلة لها العنوان نفسه.")
+    lines += [
+        "عدد الأسئلة في النص: %i" % plan["blocks"],
+        "عدد الأبواب: %i" % plan["chapters"],
+        "الملحوظات التي ستضاف: %i" % plan["new"],
+        "الملحوظات الموجودة في المجموعة: %i" % plan["existing"],
+        "الملحوظات الموجودة التي ستعدل: %i (سيتغير رقم %i منها)"
+        % (plan["touched"], plan["renumbered"]),
+    ]
+    if plan["new_decks"]:
+        lines.append("الرزم التي ستنشأ:")
+        lines += plan["new_decks"]
+    if plan["warnings"]:
+        lines.append("")
+        lines.append("تنبيهات:")
+        lines += [
+            "السؤال %i: %s %s"
+            % (warning["seq"], PLAN_WARNINGS[warning["kind"]], warning["question"])
+            for warning in plan["warnings"]
+        ]
+    lines.append("")
+    lines.append("استغرقت المعاينة %.2f ثانية." % elapsed)
+    return "\n".join(lines)
+
 
 class ARQImporterDialog(QDialog):
     def __init__(self, mw):
         self.mw = mw
+        # the opened file and its size, for watching it for questions added later
+        self.sourcePath = None
+        self.sourceSize = 0
+        # the blocks of an opened CSV, TSV or Markdown file, which are imported as they are
+        self.sourceBlocks = None
+        # import jobs queued to run one after another in the background
+        self.queue = []
+        self.queueRunning = False
 
         QDialog.__init__(self)
         self.form = arqimporter_form.Ui_Dialog()
@@ -26,44 +129,76 @@ class ARQImporterDialog(QDialog):
         self.form.cancelButton.clicked.connect(self.reject)
         self.form.openFileButton.clicked.connect(self.onOpenFile)
         self.form.helpButton.clicked.connect(self.onHelp)
+        self.form.searchButton.clicked.connect(self.onSearch)
+        self.form.planButton.clicked.connect(self.onPlan)
+        self.form.queueButton.clicked.connect(self.onQueue)
+        self.form.runQueueButton.clicked.connect(self.onRunQueue)
+        self.form.metricsButton.clicked.connect(self.onMetrics)
+        self.form.queueList.itemDoubleClicked.connect(self.onRemoveQueued)
+        self.form.queueList.setToolTip("انقر مرتين على مجموعة لحذفها من الطابور.")
+        self.baseTitle = self.windowTitle()
         self.form.recognizeChaptersCheckBox.toggled.connect(
             lambda t: self.form.chapterLineEdit.setEnabled(t)
         )
+        self.form.recognizeChaptersCheckBox.toggled.connect(
+            lambda t: self.form.chapterDecksCheckBox.setEnabled(t)
+        )
+        self.form.chapterDecksCheckBox.setEnabled(
+            self.form.recognizeChaptersCheckBox.isChecked()
+        )
         self.form.recognizeExtraCheckBox.toggled.connect(
             lambda t: self.form.extraLineEdit.setEnabled(t)
         )
         self.form.previosImportedQuestionsCheckBox.toggled.connect(
             lambda t: self.form.previosImportedQuestionsNumber.setEnabled(t)
         )
+        self.form.insertQuestionsCheckBox.toggled.connect(
+            lambda t: self.form.previosImportedQuestionsCheckBox.setEnabled(not t)
+        )
+        self.form.watchFileCheckBox.setEnabled(False)
 
         opt = QTextOption()
         opt.setTextDirection(Qt.LayoutDirection.RightToLeft)
         opt.setAlignment(Qt.AlignmentFlag.AlignRight)
         self.form.textBox.document().setDefaultTextOption(opt)
 
-    def accept(self):
-        "On close, create notes from the contents of the text editor."
+    def collectJob(self, check_title=True):
+        "Return an import job for the contents of the dialog, or None after warning about them."
         title = self.form.titleBox.text().strip()
 
         if not title:
             showWarning("يجب أن تدخل عنوانًا لمجموعة الأسئلة.")
-            return
+            return None
 
         prev_imported_number = (
             self.form.previosImportedQuestionsNumber.value()
             if self.form.previosImportedQuestionsCheckBox.isChecked()
             else 0
         )
-        escaped_title = title.replace('"', '\\"')
-        if (prev_imported_number == 0) and self.mw.col.find_notes(
-            f'"note:{models.ARQOne.name}" ' f'"عنوان:{escaped_title}"'
-        ):
-            showWarning(
-                "لديك بالفعل مجموعة أسئلة لها العنوان نفسه في مجموعتك. "
-                "انظر ما إذا كنت بالفعل قد أضفت هذه الأسئلة، "
-                "أو استخدم اسمًا مختلفًا."
+        insert_mode = self.form.insertQuestionsCheckBox.isChecked()
+        # the preview reports title collisions instead of refusing them
+        if check_title:
+            escaped_title = title.replace('"', '\\"')
+            title_exists = bool(
+                self.mw.col.find_notes(
+                    f'"note:{models.ARQOne.name}" ' f'"عنوان:{escaped_title}"'
+                )
+            ) or any(
+                job["title"] == title and job["status"] != FAILED for job in self.queue
             )
-            return
+            if insert_mode and not title_exists:
+                showWarning(
+                    "لا توجد مجموعة أسئلة بهذا العنوان في مجموعتك. "
+                    "تأكد من أنك أدخلت عنوان المجموعة التي أدرجت فيها الأسئلة."
+                )
+                return None
+            if not insert_mode and prev_imported_number == 0 and title_exists:
+                showWarning(
+                    "لديك بالفعل مجموعة أسئلة لها العنوان نفسه في مجموعتك. "
+                    "انظر ما إذا كنت بالفعل قد أضفت هذه الأسئلة، "
+                    "أو استخدم اسمًا مختلفًا."
+                )
+                return None
 
         if not self.form.textBox.toPlainText().strip():
             showWarning(
@@ -71,71 +206,177 @@ class ARQImporterDialog(QDialog):
                 "اكتب نصًا في الصندوق النصي، أو "
                 'استخدم زر "فتح ملف" لاستيراد ملف نصي.'
             )
-            return
+            return None
 
-        tags = self.mw.col.tags.split(self.form.tagsBox.text())
-        text = cleanse_text(self.form.textBox.toPlainText().strip())
-        did = self.deckChooser.selectedId()
-        qa_marker = self.form.qa_marker.text()
-        question_marker = self.form.questionMarkerRadioButton.isChecked()
         chapter_marker = (
             self.form.chapterLineEdit.text()
             if self.form.recognizeChaptersCheckBox.isChecked()
             else None
         )
-        extra_marker = (
-            self.form.extraLineEdit.text()
-            if self.form.recognizeExtraCheckBox.isChecked()
-            else None
-        )
+        return {
+            "title": title,
+            "tags": self.mw.col.tags.split(self.form.tagsBox.text()),
+            "source": self.form.textBox.toPlainText(),
+            "blocks": self.sourceBlocks,
+            "deck_id": self.deckChooser.selectedId(),
+            "qa_marker": self.form.qa_marker.text(),
+            "question_marker": self.form.questionMarkerRadioButton.isChecked(),
+            "chapter_marker": chapter_marker,
+            "extra_marker": (
+                self.form.extraLineEdit.text()
+                if self.form.recognizeExtraCheckBox.isChecked()
+                else None
+            ),
+            "prev_imported_number": prev_imported_number,
+            "insert": insert_mode,
+            "chapter_decks": (
+                chapter_marker is not None
+                and self.form.chapterDecksCheckBox.isChecked()
+            ),
+            "source_path": self.sourcePath,
+            "source_size": self.sourceSize,
+            "watch": (
+                self.form.watchFileCheckBox.isEnabled()
+                and self.form.watchFileCheckBox.isChecked()
+            ),
+            "status": PENDING,
+        }
+
+    def accept(self):
+        "On close, create notes from the contents of the text editor."
+        job = self.collectJob()
+        if job is None:
+            return
 
+        index = open_search_index(self.mw)
         try:
-            notes_generated = add_notes(
-                self.mw.col,
-                Note,
-                title,
-                tags,
-                text,
-                did,
-                qa_marker,
-                question_marker,
-                chapter_marker,
-                extra_marker,
-                prev_imported_number,
-            )
-        except KeyError as e:
-            showWarning(
-                "تعذر إيجاد حقل {field} في نوع ملحوظة {name} في مجموعتك. "
-                "إذا لم يكن لديك أي ملحوظات ARQImporter بعد، تستطيع حذف "
-                "نوع الملحوظة من خلال أدوات > إدارة أنواع الملحوظات وإعادة تشغيل "
-                "أنكي لحل المشكلة. أو أضف الحقل إلى نوع الملحوظة.".format(
-                    field=str(e), name=models.ARQOne.name
-                )
-            )  # pylint: disable=no-member
+            notes_generated = run_import_job(self.mw.col, Note, job, index)
+        except (ValueError, KeyError) as e:
+            showWarning(job_error_message(e))
             return
+        finally:
+            index.close()
 
         if notes_generated >= 0:
-            # a hack to mark previously imported notes as updated so that importing/exporting works as expected
-            old_nids = self.mw.col.find_notes(
-                f'"note:{models.ARQOne.name}" ' f'"عنوان:{escaped_title}"'
-            )
-            old_notes = sorted(
-                map(lambda nid: self.mw.col.get_note(nid), old_nids),
-                key=lambda n: int(n["رقم السؤال"]),
-            )[:prev_imported_number]
-            for note in old_notes:
-                note["إضافي"] += " "
-                note.flush()
-
             super(ARQImporterDialog, self).accept()
             self.mw.reset()
-            tooltip("%i notes added." % notes_generated)
+            tooltip(
+                "%i notes added.%s"
+                % (notes_generated, media_report(self.mw.col, job["title"]))
+            )
         else:
-            showWarning(
-                "عدد الأسئلة المستوردة سابقاً أكبر من عددها في النص الحالي. "
-                "تأكد من أنك أدخلت العدد الصحيح، "
-                "أو تأكد من أنك أدخلت النص الكامل."
+            showWarning(NO_NEW_QUESTIONS_MESSAGE)
+
+    def onPlan(self):
+        job = self.collectJob(check_title=False)
+        if job is None:
+            return
+        start = time.perf_counter()
+        plan = plan_import_job(self.mw.col, job)
+        elapsed = time.perf_counter() - start
+        showText(describe_plan(plan, elapsed), parent=self, title="معاينة الاستيراد")
+
+    def reject(self):
+        if self.queueRunning:
+            tooltip("انتظر حتى ينتهي استيراد الطابور.")
+            return
+        super(ARQImporterDialog, self).reject()
+
+    def clearSource(self):
+        self.form.titleBox.clear()
+        self.form.textBox.setReadOnly(False)
+        self.form.textBox.clear()
+        self.sourcePath = None
+        self.sourceSize = 0
+        self.sourceBlocks = None
+        self.form.watchFileCheckBox.setEnabled(False)
+
+    def onQueue(self):
+        job = self.collectJob()
+        if job is None:
+            return
+        self.queue.append(job)
+        self.form.queueList.addItem(QListWidgetItem())
+        self.updateQueueItem(job)
+        # the other options are kept, as the queued sets often share them
+        self.clearSource()
+
+    def updateQueueItem(self, job):
+        row = next(i for i, queued in enumerate(self.queue) if queued is job)
+        item = self.form.queueList.item(row)
+        if job["status"] == PENDING:
+            status = "في الانتظار"
+        elif job["status"] == RUNNING:
+            status = "جارٍ الاستيراد..."
+        elif job["status"] == DONE:
+            status = (
+                "أضيفت %i ملحوظة" % job["result"]
+                if job["result"] >= 0
+                else "لا أسئلة جديدة"
             )
+        else:
+            status = "فشل"
+            item.setToolTip(job_error_message(job["error"]))
+        item.setText("%s: %s" % (job["title"], status))
+        if self.queueRunning:
+            finished = sum(queued["status"] in (DONE, FAILED) for queued in self.queue)
+            self.setWindowTitle(
+                "%s (%i/%i)" % (self.baseTitle, finished, len(self.queue))
+            )
+
+    def onRemoveQueued(self, item):
+        row = self.form.queueList.row(item)
+        if self.queueRunning:
+            return
+        del self.queue[row]
+        self.form.queueList.takeItem(row)
+
+    def setQueueRunning(self, running):
+        self.queueRunning = running
+        for button in (
+            self.form.addCardsButton,
+            self.form.queueButton,
+            self.form.runQueueButton,
+        ):
+            button.setEnabled(not running)
+        if not running:
+            self.setWindowTitle(self.baseTitle)
+
+    def onRunQueue(self):
+        if not any(job["status"] == PENDING for job in self.queue):
+            tooltip("لا توجد مجموعات في الطابور.")
+            return
+        self.setQueueRunning(True)
+
+        def on_change(job):
+            self.mw.taskman.run_on_main(lambda: self.updateQueueItem(job))
+
+        def op(col):
+            index = open_search_index(self.mw)
+            try:
+                return run_import_queue(col, Note, self.queue, index, on_change)
+            finally:
+                index.close()
+
+        def on_done(failed):
+            self.setQueueRunning(False)
+            self.mw.reset()
+            if failed:
+                showWarning(
+                    "تعذر استيراد %i من مجموعات الطابور. "
+                    "مرر المؤشر فوق المجموعة لمعرفة السبب." % failed
+                )
+            else:
+                tooltip("اكتمل استيراد الطابور.")
+
+        def on_failure(exc):
+            self.setQueueRunning(False)
+            self.mw.reset()
+            showWarning(str(exc))
+
+        QueryOp(parent=self, op=op, success=on_done).failure(
+            on_failure
+        ).run_in_background()
 
     def onOpenFile(self):
         if self.form.textBox.toPlainText().strip() and not askUser(
@@ -146,9 +387,39 @@ class ARQImporterDialog(QDialog):
         filename = getFile(self, "استيراد نص", None, key="import")
         if not filename:
             return
-        with open(filename, "r", encoding="utf-8") as f:
-            text = f.read()
+        try:
+            blocks = read_structured_file(
+                filename,
+                self.mw.addonManager.getConfig(__name__).get("structured_files"),
+            )
+        except (ValueError, csv.Error) as e:
+            showWarning(
+                "تعذرت قراءة الملف. تأكد من إعدادات structured_files "
+                "في إعدادات الإضافة.\n\n{}".format(e)
+            )
+            return
+        with open(filename, "rb") as f:
+            encoding = detect_encoding(f.read(SAMPLE_SIZE))
+            f.seek(0)
+            text = "\n".join(iter_decoded_lines(f, encoding))
+            self.sourceSize = f.tell()
         self.form.textBox.setPlainText(text)
+        self.sourcePath = filename
+        self.sourceBlocks = blocks
+        # the questions of structured files don't come from the editor, so it can't be edited
+        self.form.textBox.setReadOnly(blocks is not None)
+        # watched files are read as UTF-8 text with markers
+        self.form.watchFileCheckBox.setEnabled(
+            blocks is None and encoding in ("utf-8", "utf-8-sig")
+        )
+
+    def onSearch(self):
+        SearchDialog(self.mw, self).exec()
+
+    def onMetrics(self):
+        showText(
+            format_report(analyze(read_metrics())), parent=self, title="أداء الاستيراد"
+        )
 
     def onHelp(self):
         QDesktopServices.openUrl(QUrl("https://t.me/Ankiarabic_QA"))
@@ -0,0 +1,103 @@
+"""
+Export imported question sets back to marked text that the importer understands.
+"""
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from .question_sets import fetch_question_set, get_import_ledger
+
+
+def line_conflict(
+    block: Dict[str, str],
+    qa_marker: Optional[str],
+    chapter_marker: Optional[str],
+    extra_marker: Optional[str],
+) -> Optional[str]:
+    """
+    Return what in _block_ parse_questions would read back differently when exported with
+    the given markers, or None. The text format has no way to escape a marker.
+    """
+    for line in block["question"].split("<br>") + block["answer"].split("<br>"):
+        if chapter_marker and line.startswith(chapter_marker):
+            return f"a line starting with the chapter marker {chapter_marker!r}"
+    for line in block["answer"].split("<br>"):
+        if (
+            extra_marker
+            and line.startswith(extra_marker)
+            and (qa_marker is None or qa_marker not in line)
+        ):
+            return f"an answer line starting with the extra marker {extra_marker!r}"
+    if block["chapter"] and not chapter_marker:
+        return "a chapter, but no chapter marker"
+    if block["extra"] and not extra_marker:
+        return "extra lines, but no extra marker"
+    if block["extra"] and qa_marker and qa_marker in block["extra"]:
+        return f"an extra line with the marker {qa_marker!r}"
+    return None
+
+
+def format_question_set(
+    blocks: Iterable[Dict[str, str]],
+    chapter_marker: Optional[str] = "#",
+    extra_marker: Optional[str] = "$",
+    qa_marker: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    Yield the lines of a text that parse_questions parses back into _blocks_ using the
+    same markers. Chapter lines are only written when the chapter changes, as
+    parse_questions carries the chapter over to the following blocks. Question and answer
+    lines are written as they are, as they already contain the marker that separated them.
+    Raises ValueError for a block that wouldn't be parsed back the same, as found by
+    line_conflict; extra lines are only checked for _qa_marker_ if it's given.
+    """
+    chapter = ""
+    for seq, block in enumerate(blocks, 1):
+        conflict = line_conflict(block, qa_marker, chapter_marker, extra_marker)
+        if conflict is not None:
+            raise ValueError(f"question {seq} has {conflict}")
+        if chapter_marker and block["chapter"] and block["chapter"] != chapter:
+            for line in block["chapter"].split("<br>"):
+                yield f"{chapter_marker} {line}"
+            chapter = block["chapter"]
+        if block["question"]:
+            yield from block["question"].split("<br>")
+        if block["answer"]:
+            yield from block["answer"].split("<br>")
+        if extra_marker and block["extra"]:
+            for line in block["extra"].split("<br>"):
+                yield f"{extra_marker} {line}"
+
+
+def question_set_markers(col: Any, title: str) -> Dict[str, Optional[str]]:
+    """
+    Return the markers the question set was last imported with, from the import ledger,
+    or the usual "#" and "$" markers if it has no entry there.
+    """
+    for entry in reversed(get_import_ledger(col)):
+        if entry["title"] == title and "qa_marker" in entry["options"]:
+            options = entry["options"]
+            return {
+                "qa_marker": options["qa_marker"],
+                "chapter_marker": options["chapter_marker"],
+                "extra_marker": options["extra_marker"],
+            }
+    return {"qa_marker": None, "chapter_marker": "#", "extra_marker": "$"}
+
+
+def export_question_set(col: Any, title: str, path: str) -> int:
+    """
+    Write the question set with the given title to a text file at _path_, marked with the
+    markers it was imported with. The file is only written if the whole set can be
+    exported. Returns the number of exported questions.
+    Raises ValueError like format_question_set.
+    """
+    notes = fetch_question_set(col, title)
+    lines = list(
+        format_question_set(
+            (note.block for note in notes), **question_set_markers(col, title)
+        )
+    )
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(line)
+            f.write("\n")
+    return len(notes)
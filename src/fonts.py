@@ -0,0 +1,118 @@
+"""
+Subsets of the card template fonts holding only the characters used by the imported
+question sets, which are much smaller than the full fonts users copy to the media folder.
+The subsets are generated with fontTools if it's installed, and regenerated only when
+an import brings characters they don't cover yet. The template falls back to the
+full fonts for missing subsets and characters.
+"""
+import html
+import io
+import os
+import string
+from typing import Any, Iterable, List, Set
+
+try:
+    # brotli is needed by fontTools to write WOFF2 files
+    import brotli  # pylint: disable=unused-import
+    from fontTools import subset as font_subset
+except ImportError:  # fontTools isn't installed
+    font_subset = None  # type: ignore
+
+from .question_sets import HTML_TAG_RE, MODEL_NAME
+
+# (full font in the media folder, its subset)
+FONTS = (
+    ("_Sh_LoutsSh.ttf", "_arq-font-500.woff2"),
+    ("_Sh_LoutsShB.ttf", "_arq-font-700.woff2"),
+)
+# the characters the subsets cover, as a string
+CODEPOINTS_CONFIG_KEY = "arqimporter_font_codepoints"
+# always covered, so that the text of the template itself is
+BASE_CHARACTERS = frozenset(
+    string.printable
+    + "".join(chr(c) for c in range(0x0600, 0x0670))
+    # no-break space, joiners and direction marks
+    + "\u00a0\u200c\u200d\u200e\u200f"
+)
+
+# whether subsets are updated after imports, set from the add-on config
+SUBSET_FONTS = False
+
+
+def fonts_available() -> bool:
+    return font_subset is not None
+
+
+def text_characters(texts: Iterable[str]) -> Set[str]:
+    "Return the characters shown for the HTML _texts_."
+    characters: Set[str] = set()
+    for text in texts:
+        characters.update(html.unescape(HTML_TAG_RE.sub("", text)))
+    return characters
+
+
+def collection_texts(col: Any) -> List[str]:
+    "Return the fields of all ARQ notes, using a single query."
+    model = col.models.by_name(MODEL_NAME)
+    return [
+        field
+        for flds in col.db.list("select flds from notes where mid = ?", model["id"])
+        for field in flds.split("\x1f")
+    ]
+
+
+def subset_font(path: str, characters: Iterable[str]) -> bytes:
+    "Return a WOFF2 subset of the font at _path_ covering _characters_."
+    options = font_subset.Options()
+    options.flavor = "woff2"
+    # the glyphs Arabic letters take in their positions are only reachable through
+    # the layout features
+    options.layout_features = ["*"]
+    font = font_subset.load_font(path, options)
+    subsetter = font_subset.Subsetter(options)
+    subsetter.populate(unicodes=[ord(c) for c in characters])
+    subsetter.subset(font)
+    data = io.BytesIO()
+    font_subset.save_font(font, data, options)
+    return data.getvalue()
+
+
+def save_media_file(col: Any, filename: str, data: bytes) -> None:
+    "Write _data_ to the media folder as _filename_, replacing the file if it exists."
+    if os.path.exists(os.path.join(col.media.dir(), filename)):
+        # write_data would otherwise pick another name for the new contents
+        col.media.trash_files([filename])
+    col.media.write_data(filename, data)
+
+
+def update_font_subsets(
+    col: Any, texts: Iterable[str], rebuild: bool = False
+) -> List[str]:
+    """
+    Make sure the font subsets in the media folder cover the characters of _texts_,
+    regenerating them from the full fonts if they don't. If _rebuild_ is true, the subsets
+    are regenerated to cover just the characters of _texts_, which should then be the
+    fields of all notes. Fonts that aren't in the media folder are skipped.
+    Returns the names of the written subsets.
+    """
+    covered = set() if rebuild else set(col.get_config(CODEPOINTS_CONFIG_KEY, ""))
+    needed = covered | BASE_CHARACTERS | text_characters(texts)
+    media_dir = col.media.dir()
+    fonts = [
+        (source, subset)
+        for source, subset in FONTS
+        if os.path.exists(os.path.join(media_dir, source))
+    ]
+    if needed == covered and all(
+        os.path.exists(os.path.join(media_dir, subset)) for _, subset in fonts
+    ):
+        return []
+    written = []
+    for source, subset in fonts:
+        save_media_file(
+            col, subset, subset_font(os.path.join(media_dir, source), needed)
+        )
+        written.append(subset)
+    if written:
+        col.set_config(CODEPOINTS_CONFIG_KEY, "".join(sorted(needed)))
+    return written
@@ -1,16 +1,51 @@
-from typing import Any, Callable, List, TYPE_CHECKING, Optional
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+from itertools import repeat
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    TYPE_CHECKING,
+    Optional,
+    Tuple,
+)
 import json
+import multiprocessing
+import os
 import sys
 
-if "unittest" in sys.modules:
-    TESTING = True
-else:
-    from aqt import mw
-
-    TESTING = False
+from .metrics import Stopwatch
+from .neighbor_context import context_changes, update_neighbor_context
+from .question_sets import (
+    HTML_TAG_RE,
+    MEDIA_REFS_CONFIG_KEY,
+    MODEL_NAME,
+    QuestionSetMedia,
+    field_ords,
+    fetch_question_set,
+    get_import_ledger,
+    get_media_refs,
+    media_ref,
+    record_import,
+    relink_question_set,
+    remove_ledger_entry,
+    trash_question_set_media,
+    update_note_fields,
+)
+
+# whether media files are written compressed, set from the add-on config
+COMPRESS_MEDIA = False
+# notes added by add_notes between checkpoints
+CHUNK_SIZE = 1000
+# characters taken by an index into the line table of a media file, with its comma
+LINE_REF_SIZE = 4
 
 if TYPE_CHECKING:
     from anki.notes import Note
+    from .search_index import SearchIndex
 
 
 def populate_note(
@@ -23,6 +58,7 @@ def populate_note(
     chapter: str,
     extra: str,
     deck_id: int,
+    media_file: str,
 ) -> None:
 
     note.note_type()["did"] = deck_id  # type: ignore
@@ -33,7 +69,7 @@ def populate_note(
     note["إضافي"] = extra
     note["عنوان"] = title
     note["رقم السؤال"] = str(seq)
-    note["كل الأسئلة"] = f'<img src="{title}.js">'
+    note["كل الأسئلة"] = media_ref(media_file)
 
 
 def parse_questions(
@@ -47,6 +83,27 @@ def parse_questions(
     Parse question pairs. If _question_marker_ is true, treat the _qa_marker_ as a
     separator between the question and the answer, otherwise treat it as a marker for the answer lines.
     """
+    return [
+        block
+        for _, block in iter_blocks(
+            lines, qa_marker, question_marker, chapter_marker, extra_marker
+        )
+    ]
+
+
+def iter_blocks(
+    lines: List[str],
+    qa_marker: str,
+    question_marker: bool,
+    chapter_marker: Optional[str],
+    extra_marker: Optional[str],
+    chapter: Optional[List[str]] = None,
+) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """
+    Same as parse_questions, but yield (index of the first line, block) pairs.
+    _chapter_ is the list of chapter lines in effect before the first line, for parsing
+    a text from the middle.
+    """
 
     def is_chapter_line(i):
         return (
@@ -87,14 +144,14 @@ def parse_questions(
 
         return res
 
-    ret = []
     cur_question = []
     cur_answer = []
-    cur_chapter: List[str] = []
+    cur_chapter: List[str] = list(chapter or [])
     cur_extra = []
 
     i = 0
     while i < len(lines):
+        start = i
         if is_chapter_line(i):
             cur_chapter = []
             while is_chapter_line(i):
@@ -109,18 +166,97 @@ def parse_questions(
         while is_extra_line(i):
             cur_extra.append(lines[i][len(extra_marker) :].strip())
             i += 1
-        ret.append(
-            {
-                "question": "<br>".join(cur_question),
-                "answer": "<br>".join(cur_answer),
-                "chapter": "<br>".join(cur_chapter),
-                "extra": "<br>".join(cur_extra),
-            }
-        )
+        yield start, {
+            "question": "<br>".join(cur_question),
+            "answer": "<br>".join(cur_answer),
+            "chapter": "<br>".join(cur_chapter),
+            "extra": "<br>".join(cur_extra),
+        }
         cur_question = []
         cur_answer = []
         cur_extra = []
 
+
+# inputs shorter than this are not worth the cost of starting worker processes
+PARALLEL_PARSE_MIN_LINES = 20000
+# whether imports parse long texts in worker processes, set from the add-on config
+PARALLEL_PARSE = False
+
+
+def split_at_chapters(
+    lines: List[str], chapter_marker: str, parts: int
+) -> List[Tuple[int, int]]:
+    """
+    Split _lines_ into at most _parts_ (start, end) ranges of roughly equal size.
+    Ranges only start at the first line of a run of chapter lines, which always begins
+    a new block in parse_questions.
+    """
+    starts = [0]
+    previous_is_chapter = False
+    for i, line in enumerate(lines):
+        is_chapter = line.startswith(chapter_marker)
+        if is_chapter and not previous_is_chapter and i > 0:
+            starts.append(i)
+        previous_is_chapter = is_chapter
+
+    target = max(1, len(lines) // parts)
+    ranges = []
+    range_start = 0
+    for start in starts[1:]:
+        if start - range_start >= target:
+            ranges.append((range_start, start))
+            range_start = start
+    ranges.append((range_start, len(lines)))
+    return ranges
+
+
+def parse_questions_parallel(
+    lines: List[str],
+    qa_marker: str,
+    question_marker: bool,
+    chapter_marker: Optional[str],
+    extra_marker: Optional[str],
+    max_workers: Optional[int] = None,
+    min_lines: int = PARALLEL_PARSE_MIN_LINES,
+) -> List:
+    """
+    Same as parse_questions, but split the lines at chapter boundaries and parse the parts
+    in worker processes. A block never spans a chapter line and the chapter is reset at
+    each boundary, so concatenating the results gives the same blocks in the same order.
+    Workers are only forked on Linux: elsewhere they would be spawned, which in packaged
+    Anki builds starts the app again or imports the add-on with aqt in each worker.
+    Falls back to parsing in this process for short inputs, on other systems, or if the
+    workers fail for any reason.
+    """
+    args = (qa_marker, question_marker, chapter_marker, extra_marker)
+    if (
+        not chapter_marker
+        or len(lines) < min_lines
+        or not sys.platform.startswith("linux")
+    ):
+        return parse_questions(lines, *args)
+    workers = max_workers or os.cpu_count() or 1
+    if workers < 2:
+        return parse_questions(lines, *args)
+    # a few parts per worker to even out chapters of different sizes
+    ranges = split_at_chapters(lines, chapter_marker, workers * 4)
+    if len(ranges) < 2:
+        return parse_questions(lines, *args)
+
+    ret: List = []
+    try:
+        with ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context("fork")
+        ) as executor:
+            for blocks in executor.map(
+                parse_questions,
+                (lines[start:end] for start, end in ranges),
+                *(repeat(arg) for arg in args),
+            ):
+                ret.extend(blocks)
+    except Exception:  # pylint: disable=broad-except
+        # a parse error is raised again by the serial parser
+        return parse_questions(lines, *args)
     return ret
 
 
@@ -148,7 +284,15 @@ def cleanse_text(string: str) -> List[str]:
     return text
 
 
-def write_question_set_to_file(question_set, title):
+def render_question_set(question_set: List) -> Iterator[str]:
+    """
+    Yield the contents of the media file holding the whole question set in chunks.
+    The HTML of each block is JSON-escaped on its own, which gives the same result as
+    escaping the whole text at once.
+    The file also defines ARQChapters, an index of the chapters with the numbers of their
+    first and last questions and the range of their HTML in ARQText, in UTF-16 code units
+    as used by JavaScript strings, so that a chapter can be shown without scanning the text.
+    """
     current = 1
 
     def format_line(line, previous_line):
@@ -164,17 +308,139 @@ def write_question_set_to_file(question_set, title):
         current += 1
         return s
 
-    lines = []
-
+    chapters: List[Dict[str, Any]] = []
+    offset = 0
+    yield 'var ARQText = "'
     for current_line, line in enumerate(question_set):
-        lines.append(format_line(line, question_set[current_line - 1]))
+        s = format_line(line, question_set[current_line - 1])
+        yield json.dumps(s, ensure_ascii=False)[1:-1]
+        if (
+            not current_line
+            or line["chapter"] != question_set[current_line - 1]["chapter"]
+        ):
+            chapters.append(
+                {
+                    "name": line["chapter"],
+                    "start": current_line + 1,
+                    "offset": offset,
+                    "length": 0,
+                }
+            )
+        length = len(s.encode("utf-16-le")) // 2
+        chapters[-1]["end"] = current_line + 1
+        chapters[-1]["length"] += length
+        offset += length
+    yield '";\nvar ARQChapters = '
+    yield json.dumps(chapters, ensure_ascii=False)
+    yield ";"
+
+
+def render_line_table(question_set: List) -> Iterator[str]:
+    """
+    Yield the contents of a media file holding the question set with each distinct answer
+    line stored once, for sets where the same lines answer several questions.
+    ARQBlocks holds the question, the indices of the answer lines in ARQLines and the extra
+    note of each block, and ARQChapters the numbers of the first and last questions
+    of each chapter.
+    """
+    line_ids: Dict[str, int] = {}
+    chapters: List[Dict[str, Any]] = []
+    yield "var ARQBlocks = ["
+    for seq, block in enumerate(question_set, 1):
+        ids = [
+            line_ids.setdefault(line, len(line_ids))
+            for line in block["answer"].split("<br>")
+        ]
+        yield ("," if seq > 1 else "") + json.dumps(
+            [block["question"], ids, block["extra"]],
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        if not chapters or block["chapter"] != chapters[-1]["name"]:
+            chapters.append({"name": block["chapter"], "start": seq})
+        chapters[-1]["end"] = seq
+    yield "];\nvar ARQLines = "
+    yield json.dumps(list(line_ids), ensure_ascii=False)
+    yield ";\nvar ARQChapters = "
+    yield json.dumps(chapters, ensure_ascii=False)
+    yield ";"
+
+
+def use_line_table(question_set: List) -> bool:
+    """
+    Return whether the line table format makes the media file of the set smaller,
+    estimated in characters: each repeated answer line is replaced by an index
+    of LINE_REF_SIZE characters.
+    """
+    refs = 0
+    total = 0
+    distinct = set()
+    for block in question_set:
+        for line in block["answer"].split("<br>"):
+            refs += 1
+            # with the <br> joining it to the next line
+            total += len(line) + 4
+            distinct.add(line)
+    # quoted and separated by a comma in the table
+    table = sum(len(line) + 3 for line in distinct)
+    return total - table > refs * LINE_REF_SIZE
+
+
+def render_media(question_set: List) -> Iterator[str]:
+    "Render the question set in the format that makes its media file smaller."
+    if use_line_table(question_set):
+        return render_line_table(question_set)
+    return render_question_set(question_set)
+
+
+def save_question_set_media(
+    col: Any, question_set: List, compress: Optional[bool] = None
+) -> Tuple[str, int, int]:
+    """
+    Render the question set to a temporary file and add it to the media folder,
+    compressed if _compress_ is true, or if it's None and COMPRESS_MEDIA is set.
+    Returns the name of the media file, its size, and the size of the plain file.
+    """
+    with QuestionSetMedia(
+        render_media(question_set),
+        COMPRESS_MEDIA if compress is None else compress,
+    ) as media:
+        return media.save(col), media.size, media.raw_size
+
+
+def write_question_set_to_file(col: Any, question_set: List) -> str:
+    """
+    Render the question set to a temporary file and add it to the media folder.
+    Returns the name of the media file.
+    """
+    return save_question_set_media(col, question_set)[0]
+
 
-    # save question set to media folder
-    text = "".join(lines)
-    js = f"var ARQText = {json.dumps(text, ensure_ascii=False)};"
-    fname = f"{title}.js"
-    mw.col.media.trash_files([fname])
-    mw.col.media.write_data(fname, js.encode())
+def chapter_deck_name(deck_name: str, chapter: str) -> str:
+    "Name the subdeck of _deck_name_ for _chapter_, nested a level for each chapter line."
+    names = [
+        HTML_TAG_RE.sub("", name).replace("::", ":").strip()
+        for name in chapter.split("<br>")
+    ]
+    return "::".join([deck_name, *(name for name in names if name)])
+
+
+def resolve_chapter_decks(
+    col: Any, deck_id: int, chapters: Iterable[str]
+) -> Dict[str, int]:
+    """
+    Map each distinct chapter to the ID of its subdeck of the deck _deck_id_, creating
+    missing decks. Each deck is looked up once per import, however many notes go to it.
+    Blocks without a chapter stay in the deck itself.
+    """
+    deck_name = col.decks.name(deck_id)
+    deck_ids: Dict[str, int] = {}
+    for chapter in chapters:
+        if chapter in deck_ids:
+            continue
+        name = chapter_deck_name(deck_name, chapter)
+        deck_ids[chapter] = deck_id if name == deck_name else col.decks.id(name)
+    return deck_ids
 
 
 def add_notes(
@@ -189,28 +455,386 @@ def add_notes(
     chapter_marker: Optional[str] = None,
     extra_marker: Optional[str] = None,
     prev_imported_number: int = 0,
+    index: Optional["SearchIndex"] = None,
+    parallel: bool = False,
+    blocks: Optional[List[Dict[str, str]]] = None,
+    chapter_decks: bool = False,
+    ledger_options: Optional[Dict[str, Any]] = None,
+    source_digest: Optional[str] = None,
+    timings: Optional[Dict[str, float]] = None,
+    on_chunk: Optional[Callable[[List[Dict[str, str]], int, List[int]], None]] = None,
 ) -> int:
+    """
+    Add notes for the blocks of _text_ after the first _prev_imported_number_ ones.
+    _blocks_ can be given instead of _text_ if it's already parsed.
+    If _chapter_decks_ is true, the notes of each chapter go to a subdeck of _deck_id_.
+    If _ledger_options_ is given, the import is recorded in the import ledger with them
+    and the digest of the source text.
+    If _timings_ is given, the seconds spent in each phase of the import are added to it.
+    If _on_chunk_ is given, it's called after every CHUNK_SIZE added notes but the last
+    with the parsed blocks, the number of the last added one and the IDs of the added
+    notes, so that an interrupted import can be resumed from there.
+    Returns the number of added notes, or -1 if there are no new blocks.
+    """
 
+    stopwatch = Stopwatch(timings)
     added = prev_imported_number
     model = col.models.by_name("ARQ 1.0")
-    lines = parse_questions(
-        text, separator, question_marker, chapter_marker, extra_marker
-    )
+    if blocks is None:
+        parse = parse_questions_parallel if parallel else parse_questions
+        lines = parse(text, separator, question_marker, chapter_marker, extra_marker)
+    else:
+        lines = blocks
+    stopwatch.lap("parse")
     if len(lines) <= prev_imported_number:
         return -1
+    # the media file is written first as the notes reference it by the digest of its contents
+    media_file, *media_sizes = save_question_set_media(col, lines)
+    stopwatch.lap("media")
+    deck_ids = (
+        resolve_chapter_decks(
+            col, deck_id, (line["chapter"] for line in lines[prev_imported_number:])
+        )
+        if chapter_decks
+        else {}
+    )
+    index_rows = []
+    nids = []
     for line in lines[prev_imported_number:]:
         question = line["question"]
         answer = line["answer"]
         chapter = line["chapter"]
         extra = line["extra"]
+        did = deck_ids.get(chapter, deck_id)
         n = note_constructor(col, model)
         populate_note(
-            n, added + 1, title, tags, question, answer, chapter, extra, deck_id
+            n,
+            added + 1,
+            title,
+            tags,
+            question,
+            answer,
+            chapter,
+            extra,
+            did,
+            media_file,
         )
-        col.add_note(n, deck_id)
+        col.add_note(n, did)
         added += 1
-
-    if not TESTING:
-        write_question_set_to_file(lines, title)
+        nids.append(n.id)
+        if index is not None:
+            index_rows.append((n.id, title, added, question, answer))
+        if (
+            on_chunk is not None
+            and (added - prev_imported_number) % CHUNK_SIZE == 0
+            and added < len(lines)
+        ):
+            # the notes of the chunk are searchable once it's recorded as imported
+            if index is not None:
+                index.add(index_rows)
+                index_rows = []
+            on_chunk(lines, added, nids)
+    stopwatch.lap("notes")
+
+    if index is not None:
+        index.add(index_rows)
+    stopwatch.lap("index")
+
+    update_neighbor_context(col, title)
+    relink_question_set(col, title, media_file)
+    if ledger_options is not None:
+        record_import(
+            col, title, nids, media_file, ledger_options, source_digest, media_sizes
+        )
+    stopwatch.lap("relink")
 
     return added - prev_imported_number
+
+
+def align_inserted_blocks(
+    old_blocks: List[Dict[str, str]], new_blocks: List[Dict[str, str]]
+) -> Tuple[List[int], List[int]]:
+    """
+    Align a new parse of a question set against the blocks already imported.
+    Returns the indices in _new_blocks_ of the inserted blocks, and the new index of each
+    old block. Raises ValueError if _new_blocks_ isn't _old_blocks_ with blocks inserted.
+    """
+
+    def key(block: Dict[str, str]) -> Tuple[str, ...]:
+        return (block["question"], block["answer"], block["chapter"], block["extra"])
+
+    matcher = SequenceMatcher(
+        None, [key(b) for b in old_blocks], [key(b) for b in new_blocks], autojunk=False
+    )
+    inserted: List[int] = []
+    positions: List[int] = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            positions.extend(range(j1, j2))
+        elif tag == "insert":
+            inserted.extend(range(j1, j2))
+        else:
+            raise ValueError(
+                f"question {i1 + 1} of the imported set was changed or removed"
+            )
+    return inserted, positions
+
+
+def insert_notes(
+    col: Any,
+    note_constructor: Callable,
+    title: str,
+    tags: List[str],
+    text: List[str],
+    deck_id: int,
+    separator: str = "?",
+    question_marker: bool = True,
+    chapter_marker: Optional[str] = None,
+    extra_marker: Optional[str] = None,
+    index: Optional["SearchIndex"] = None,
+    chapter_decks: bool = False,
+    ledger_options: Optional[Dict[str, Any]] = None,
+    source_digest: Optional[str] = None,
+    blocks: Optional[List[Dict[str, str]]] = None,
+    timings: Optional[Dict[str, float]] = None,
+) -> int:
+    """
+    Add the questions inserted anywhere in the text of an already imported question set,
+    and renumber the existing notes shifted by them in one bulk update, keeping their cards.
+    _blocks_ can be given instead of _text_ if it's already parsed.
+    If _chapter_decks_ is true, the added notes of each chapter go to a subdeck of _deck_id_.
+    If _ledger_options_ is given, the import is recorded in the import ledger.
+    If _timings_ is given, the seconds spent in each phase of the import are added to it.
+    Returns the number of added notes. Raises ValueError if questions that were already
+    imported are changed or missing in the text.
+    """
+    stopwatch = Stopwatch(timings)
+    model = col.models.by_name("ARQ 1.0")
+    if blocks is None:
+        lines = parse_questions(
+            text, separator, question_marker, chapter_marker, extra_marker
+        )
+    else:
+        lines = blocks
+    stopwatch.lap("parse")
+    existing = fetch_question_set(col, title)
+    inserted, positions = align_inserted_blocks(
+        [note.block for note in existing], lines
+    )
+    stopwatch.lap("align")
+    # the media file is written first as the notes reference it by the digest of its contents
+    media_file, *media_sizes = save_question_set_media(col, lines)
+    stopwatch.lap("media")
+    deck_ids = (
+        resolve_chapter_decks(col, deck_id, (lines[i]["chapter"] for i in inserted))
+        if chapter_decks
+        else {}
+    )
+    index_rows = []
+    nids = []
+    for i in inserted:
+        line = lines[i]
+        did = deck_ids.get(line["chapter"], deck_id)
+        n = note_constructor(col, model)
+        populate_note(
+            n,
+            i + 1,
+            title,
+            tags,
+            line["question"],
+            line["answer"],
+            line["chapter"],
+            line["extra"],
+            did,
+            media_file,
+        )
+        col.add_note(n, did)
+        nids.append(n.id)
+        index_rows.append((n.id, title, i + 1, line["question"], line["answer"]))
+
+    renumbered = {}
+    for note, position in zip(existing, positions):
+        if note.seq != position + 1:
+            renumbered[note.nid] = {"رقم السؤال": str(position + 1)}
+            index_rows.append(
+                (
+                    note.nid,
+                    title,
+                    position + 1,
+                    note.block["question"],
+                    note.block["answer"],
+                )
+            )
+    update_note_fields(col, renumbered)
+    stopwatch.lap("notes")
+
+    if index is not None:
+        index.add(index_rows)
+    stopwatch.lap("index")
+
+    update_neighbor_context(col, title)
+    relink_question_set(col, title, media_file)
+    if ledger_options is not None:
+        record_import(
+            col, title, nids, media_file, ledger_options, source_digest, media_sizes
+        )
+    stopwatch.lap("relink")
+
+    return len(inserted)
+
+
+def plan_notes(
+    col: Any,
+    title: str,
+    text: List[str],
+    deck_id: int,
+    separator: str = "?",
+    question_marker: bool = True,
+    chapter_marker: Optional[str] = None,
+    extra_marker: Optional[str] = None,
+    prev_imported_number: int = 0,
+    insert: bool = False,
+    blocks: Optional[List[Dict[str, str]]] = None,
+    chapter_decks: bool = False,
+) -> Dict[str, Any]:
+    """
+    Plan an import like add_notes, or insert_notes if _insert_ is true, would do it,
+    parsing the text and looking up the collection without writing anything or rendering
+    the media file. Returns a dict of:
+    - blocks: number of parsed blocks
+    - new: number of notes that would be added
+    - existing: number of notes already in the question set
+    - renumbered: number of existing notes whose question number would change
+    - touched: number of existing notes that would be written, as all notes of the set
+      are relinked to the new media file
+    - chapters: number of distinct chapters
+    - new_decks: names of chapter decks that would be created
+    - title_exists: whether a new question set would take the title of an existing one
+    - warnings: a {"seq", "kind", "question"} dict for each block with an empty question
+      or answer, or the question of an earlier block ("empty_question", "empty_answer"
+      and "duplicate_question")
+    - error: None, "no_new_blocks" if the import would add nothing, or "mismatch" if
+      insert_notes would raise ValueError
+    """
+    if blocks is None:
+        lines = parse_questions(
+            text, separator, question_marker, chapter_marker, extra_marker
+        )
+    else:
+        lines = blocks
+    existing = fetch_question_set(col, title)
+    plan: Dict[str, Any] = {
+        "blocks": len(lines),
+        "new": 0,
+        "existing": len(existing),
+        "renumbered": 0,
+        "touched": 0,
+        "chapters": len({line["chapter"] for line in lines}),
+        "new_decks": [],
+        "title_exists": bool(existing) and not insert and not prev_imported_number,
+        "warnings": [],
+        "error": None,
+    }
+
+    seen: Dict[str, int] = {}
+    for seq, line in enumerate(lines, 1):
+        question = line["question"]
+        if not question:
+            plan["warnings"].append(
+                {"seq": seq, "kind": "empty_question", "question": question}
+            )
+        if not line["answer"]:
+            plan["warnings"].append(
+                {"seq": seq, "kind": "empty_answer", "question": question}
+            )
+        if question and question in seen:
+            plan["warnings"].append(
+                {"seq": seq, "kind": "duplicate_question", "question": question}
+            )
+        seen.setdefault(question, seq)
+
+    if insert:
+        try:
+            added, positions = align_inserted_blocks(
+                [note.block for note in existing], lines
+            )
+        except ValueError:
+            plan["error"] = "mismatch"
+            return plan
+        plan["renumbered"] = sum(
+            note.seq != position + 1 for note, position in zip(existing, positions)
+        )
+    elif len(lines) <= prev_imported_number:
+        plan["error"] = "no_new_blocks"
+        return plan
+    else:
+        added = list(range(prev_imported_number, len(lines)))
+    plan["new"] = len(added)
+    plan["touched"] = len(existing)
+
+    if chapter_decks:
+        deck_name = col.decks.name(deck_id)
+        names = {chapter_deck_name(deck_name, lines[i]["chapter"]) for i in added} - {
+            deck_name
+        }
+        plan["new_decks"] = sorted(
+            name for name in names if col.decks.id_for_name(name) is None
+        )
+    return plan
+
+
+def revert_import(
+    col: Any, first_nid: int, index: Optional["SearchIndex"] = None
+) -> int:
+    """
+    Remove the notes added by the import recorded in the ledger with _first_nid_ in one bulk
+    delete, renumber the remaining notes of the set, if any, and replace its media file.
+    The notes are found by their ID range, without searching the collection.
+    Returns the number of removed notes.
+    Raises ValueError if no import with _first_nid_ is recorded in the ledger.
+    """
+    entry = next(
+        (e for e in get_import_ledger(col) if e["first_nid"] == first_nid), None
+    )
+    if entry is None:
+        raise ValueError(f"no import starting at note {first_nid} is recorded")
+    title = entry["title"]
+    model = col.models.by_name(MODEL_NAME)
+    nids = col.db.list(
+        "select id from notes where id between ? and ? and mid = ? "
+        "and field_at_index(flds, ?) = ?",
+        entry["first_nid"],
+        entry["last_nid"],
+        model["id"],
+        field_ords(model)["عنوان"],
+        title,
+    )
+    col.remove_notes(nids)
+    if index is not None:
+        index.remove(nids)
+
+    remaining = fetch_question_set(col, title)
+    # the remaining notes are renumbered and get new neighbors in one bulk update
+    changes = context_changes(remaining)
+    index_rows = []
+    for i, note in enumerate(remaining):
+        if note.seq != i + 1:
+            changes.setdefault(note.nid, {})["رقم السؤال"] = str(i + 1)
+            index_rows.append(
+                (note.nid, title, i + 1, note.block["question"], note.block["answer"])
+            )
+    update_note_fields(col, changes)
+    if index is not None:
+        index.add(index_rows)
+
+    if remaining:
+        media_file = write_question_set_to_file(col, [n.block for n in remaining])
+        relink_question_set(col, title, media_file)
+    else:
+        refs = get_media_refs(col)
+        media_file = refs.pop(title, "")
+        col.set_config(MEDIA_REFS_CONFIG_KEY, refs)
+        if media_file and media_file not in refs.values():
+            trash_question_set_media(col, media_file)
+    remove_ledger_entry(col, first_nid)
+    return len(nids)
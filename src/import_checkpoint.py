@@ -0,0 +1,125 @@
+"""
+Checkpoints of large imports, so that an import interrupted by a crash can be resumed
+where it stopped.
+
+The job of the import is saved with its parsed blocks in the add-on's user files when its
+first chunk of notes is added, and a small record next to it keeps the number of the last
+added question after each chunk. Both are kept per profile on this device rather than in
+the collection config, which is synced to devices where the job file doesn't exist.
+Notes added after the last checkpoint are removed before the import is resumed, and the
+resumed job appends the blocks after that question without parsing the text again.
+"""
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from .paths import user_files_path
+from .question_sets import fetch_question_set
+
+
+def checkpoint_path(col: Any, suffix: str = "") -> str:
+    "Return the path of the checkpoint record of the profile of _col_ in the user files."
+    profile = os.path.basename(os.path.dirname(col.path))
+    return user_files_path(f"checkpoint-{profile}{suffix}.json")
+
+
+def pending_import(col: Any) -> Optional[Dict[str, Any]]:
+    """
+    Return the checkpoint of an interrupted import: the "title" and "source_digest" of the
+    imported set, the "last_seq" added question and the "path" of the saved job.
+    """
+    path = checkpoint_path(col)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_checkpoint(col: Any, checkpoint: Dict[str, Any]) -> None:
+    # written to a temporary file first so that a crash doesn't leave half a record
+    path = checkpoint_path(col)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def save_checkpoint(
+    col: Any,
+    job: Dict[str, Any],
+    blocks: List[Dict[str, str]],
+    source_digest: str,
+    last_seq: int,
+    nids: List[int],
+) -> None:
+    """
+    Record that the blocks of _job_ up to _last_seq_ are imported, as the notes _nids_
+    added since the checkpoint was created.
+    """
+    checkpoint = pending_import(col)
+    if (
+        checkpoint is None
+        or checkpoint["title"] != job["title"]
+        or checkpoint["source_digest"] != source_digest
+    ):
+        if checkpoint is not None:
+            clear_checkpoint(col)
+        path = checkpoint_path(col, f"-{source_digest}")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(dict(job, blocks=blocks), f, ensure_ascii=False)
+        checkpoint = {
+            "title": job["title"],
+            "source_digest": source_digest,
+            "path": path,
+            "first_nid": nids[0],
+            "prev_imported_number": job["prev_imported_number"],
+        }
+    checkpoint["last_seq"] = last_seq
+    write_checkpoint(col, checkpoint)
+
+
+def clear_checkpoint(col: Any) -> None:
+    "Forget the checkpoint, after the import finished or the user chose not to resume it."
+    checkpoint = pending_import(col)
+    if checkpoint is None:
+        return
+    if os.path.exists(checkpoint["path"]):
+        os.remove(checkpoint["path"])
+    os.remove(checkpoint_path(col))
+
+
+def resumed_job(col: Any) -> Optional[Dict[str, Any]]:
+    """
+    Return the import job of the checkpoint, set to import the blocks after it, or None if
+    there's no checkpoint or its job was deleted. Its "checkpointed" notes are recorded in
+    the import ledger with the ones it adds, so that the whole import can be reverted.
+    """
+    checkpoint = pending_import(col)
+    if checkpoint is None or not os.path.exists(checkpoint["path"]):
+        return None
+    with open(checkpoint["path"], encoding="utf-8") as f:
+        job = json.load(f)
+    job["prev_imported_number"] = checkpoint["last_seq"]
+    job["checkpointed"] = {
+        "first_nid": checkpoint["first_nid"],
+        "count": checkpoint["last_seq"] - checkpoint["prev_imported_number"],
+        "prev_imported_number": checkpoint["prev_imported_number"],
+    }
+    return job
+
+
+def discard_unrecorded_notes(col: Any) -> int:
+    """
+    Remove the notes the interrupted import added after its last checkpoint, which the
+    resumed job adds again. Returns their number.
+    """
+    checkpoint = pending_import(col)
+    if checkpoint is None:
+        return 0
+    nids = [
+        note.nid
+        for note in fetch_question_set(col, checkpoint["title"])
+        if note.seq > checkpoint["last_seq"]
+    ]
+    if nids:
+        col.remove_notes(nids)
+    return len(nids)
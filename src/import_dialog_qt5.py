@@ -98,6 +98,15 @@ class Ui_Dialog(object):
         self.titleBox = QtWidgets.QLineEdit(Dialog)
         self.titleBox.setObjectName("titleBox")
         self.formLayout.setWidget(1, QtWidgets.QFormLayout.FieldRole, self.titleBox)
+        self.insertQuestionsCheckBox = QtWidgets.QCheckBox(Dialog)
+        self.insertQuestionsCheckBox.setObjectName("insertQuestionsCheckBox")
+        self.formLayout.setWidget(8, QtWidgets.QFormLayout.SpanningRole, self.insertQuestionsCheckBox)
+        self.watchFileCheckBox = QtWidgets.QCheckBox(Dialog)
+        self.watchFileCheckBox.setObjectName("watchFileCheckBox")
+        self.formLayout.setWidget(9, QtWidgets.QFormLayout.SpanningRole, self.watchFileCheckBox)
+        self.chapterDecksCheckBox = QtWidgets.QCheckBox(Dialog)
+        self.chapterDecksCheckBox.setObjectName("chapterDecksCheckBox")
+        self.formLayout.setWidget(10, QtWidgets.QFormLayout.SpanningRole, self.chapterDecksCheckBox)
         self.verticalLayout_2.addLayout(self.formLayout)
         self.label_4 = QtWidgets.QLabel(Dialog)
         self.label_4.setObjectName("label_4")
@@ -111,18 +120,43 @@ class Ui_Dialog(object):
         self.textBox.setLayoutDirection(QtCore.Qt.RightToLeft)
         self.textBox.setObjectName("textBox")
         self.verticalLayout_2.addWidget(self.textBox)
+        self.queueList = QtWidgets.QListWidget(Dialog)
+        self.queueList.setMaximumSize(QtCore.QSize(16777215, 120))
+        self.queueList.setLayoutDirection(QtCore.Qt.RightToLeft)
+        self.queueList.setObjectName("queueList")
+        self.verticalLayout_2.addWidget(self.queueList)
         self.horizontalLayout = QtWidgets.QHBoxLayout()
         self.horizontalLayout.setObjectName("horizontalLayout")
         self.helpButton = QtWidgets.QPushButton(Dialog)
         self.helpButton.setObjectName("helpButton")
         self.horizontalLayout.addWidget(self.helpButton)
+        self.metricsButton = QtWidgets.QPushButton(Dialog)
+        self.metricsButton.setAutoDefault(False)
+        self.metricsButton.setObjectName("metricsButton")
+        self.horizontalLayout.addWidget(self.metricsButton)
         self.openFileButton = QtWidgets.QPushButton(Dialog)
         self.openFileButton.setAutoDefault(False)
         self.openFileButton.setDefault(False)
         self.openFileButton.setObjectName("openFileButton")
         self.horizontalLayout.addWidget(self.openFileButton)
+        self.searchButton = QtWidgets.QPushButton(Dialog)
+        self.searchButton.setAutoDefault(False)
+        self.searchButton.setObjectName("searchButton")
+        self.horizontalLayout.addWidget(self.searchButton)
         spacerItem = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
         self.horizontalLayout.addItem(spacerItem)
+        self.planButton = QtWidgets.QPushButton(Dialog)
+        self.planButton.setAutoDefault(False)
+        self.planButton.setObjectName("planButton")
+        self.horizontalLayout.addWidget(self.planButton)
+        self.queueButton = QtWidgets.QPushButton(Dialog)
+        self.queueButton.setAutoDefault(False)
+        self.queueButton.setObjectName("queueButton")
+        self.horizontalLayout.addWidget(self.queueButton)
+        self.runQueueButton = QtWidgets.QPushButton(Dialog)
+        self.runQueueButton.setAutoDefault(False)
+        self.runQueueButton.setObjectName("runQueueButton")
+        self.horizontalLayout.addWidget(self.runQueueButton)
         self.addCardsButton = QtWidgets.QPushButton(Dialog)
         self.addCardsButton.setAutoDefault(False)
         self.addCardsButton.setDefault(True)
@@ -149,11 +183,20 @@ class Ui_Dialog(object):
         Dialog.setTabOrder(self.recognizeExtraCheckBox, self.extraLineEdit)
         Dialog.setTabOrder(self.extraLineEdit, self.previosImportedQuestionsCheckBox)
         Dialog.setTabOrder(self.previosImportedQuestionsCheckBox, self.previosImportedQuestionsNumber)
-        Dialog.setTabOrder(self.previosImportedQuestionsNumber, self.textBox)
-        Dialog.setTabOrder(self.textBox, self.addCardsButton)
+        Dialog.setTabOrder(self.previosImportedQuestionsNumber, self.insertQuestionsCheckBox)
+        Dialog.setTabOrder(self.insertQuestionsCheckBox, self.watchFileCheckBox)
+        Dialog.setTabOrder(self.watchFileCheckBox, self.chapterDecksCheckBox)
+        Dialog.setTabOrder(self.chapterDecksCheckBox, self.textBox)
+        Dialog.setTabOrder(self.textBox, self.queueList)
+        Dialog.setTabOrder(self.queueList, self.planButton)
+        Dialog.setTabOrder(self.planButton, self.queueButton)
+        Dialog.setTabOrder(self.queueButton, self.runQueueButton)
+        Dialog.setTabOrder(self.runQueueButton, self.addCardsButton)
         Dialog.setTabOrder(self.addCardsButton, self.cancelButton)
-        Dialog.setTabOrder(self.cancelButton, self.openFileButton)
-        Dialog.setTabOrder(self.openFileButton, self.helpButton)
+        Dialog.setTabOrder(self.cancelButton, self.metricsButton)
+        Dialog.setTabOrder(self.metricsButton, self.openFileButton)
+        Dialog.setTabOrder(self.openFileButton, self.searchButton)
+        Dialog.setTabOrder(self.searchButton, self.helpButton)
 
     def retranslateUi(self, Dialog):
         _translate = QtCore.QCoreApplication.translate
@@ -170,10 +213,26 @@ class Ui_Dialog(object):
         self.questionMarkerRadioButton.setText(_translate("Dialog", "السؤال"))
         self.answerMarkerRadioButton.setText(_translate("Dialog", "الجواب"))
         self.label.setText(_translate("Dialog", "العنوان"))
+        self.chapterDecksCheckBox.setToolTip(_translate("Dialog", "تضاف أسئلة كل باب إلى مجموعة فرعية باسم الباب داخل المجموعة المختارة"))
+        self.chapterDecksCheckBox.setText(_translate("Dialog", "ضع أسئلة كل باب في مجموعة فرعية"))
+        self.watchFileCheckBox.setToolTip(_translate("Dialog", "بعد الاستيراد، تضاف الأسئلة التي تكتبها في آخر الملف المفتوح تلقائيًا. يتطلب فتح ملف"))
+        self.watchFileCheckBox.setText(_translate("Dialog", "مراقبة الملف واستيراد الأسئلة التي تضاف إلى آخره"))
+        self.insertQuestionsCheckBox.setToolTip(_translate("Dialog", "يضيف الأسئلة المدرجة في أي مكان من النص فقط، ويعيد ترقيم الأسئلة الموجودة مع الحفاظ على جدولتها"))
+        self.insertQuestionsCheckBox.setText(_translate("Dialog", "أُدرجت أسئلة جديدة في نص مجموعة استوردتها سابقًا"))
         self.label_4.setText(_translate("Dialog", "نص الأسئلة والأجوبة"))
         self.helpButton.setText(_translate("Dialog", "مساعدة"))
+        self.metricsButton.setToolTip(_translate("Dialog", "يعرض سرعة عمليات الاستيراد السابقة ويميز ما كان منها أبطأ كثيرًا من المعتاد."))
+        self.metricsButton.setText(_translate("Dialog", "الأداء"))
         self.openFileButton.setToolTip(_translate("Dialog", "يستبدل محتوى محرر النص بمحتوى ملف نصي على حاسوبك."))
         self.openFileButton.setText(_translate("Dialog", "فتح ملف"))
+        self.searchButton.setToolTip(_translate("Dialog", "يبحث في الأسئلة والأجوبة التي استوردتها سابقًا"))
+        self.searchButton.setText(_translate("Dialog", "بحث"))
+        self.planButton.setToolTip(_translate("Dialog", "يعرض ما سيضيفه الاستيراد وما سيغيره دون أن يكتب شيئًا في مجموعتك."))
+        self.planButton.setText(_translate("Dialog", "معاينة"))
+        self.queueButton.setToolTip(_translate("Dialog", "يضيف النص والإعدادات الحالية إلى طابور الاستيراد، لتستورد عدة مجموعات معًا."))
+        self.queueButton.setText(_translate("Dialog", "إضافة إلى الطابور"))
+        self.runQueueButton.setToolTip(_translate("Dialog", "يستورد مجموعات الطابور واحدة تلو الأخرى في الخلفية."))
+        self.runQueueButton.setText(_translate("Dialog", "استيراد الطابور"))
         self.addCardsButton.setToolTip(_translate("Dialog", "يولد ملحوظات من النص في محرر النص"))
         self.addCardsButton.setText(_translate("Dialog", "إضافة ملحوظات"))
         self.addCardsButton.setShortcut(_translate("Dialog", "Ctrl+Return"))
@@ -0,0 +1,246 @@
+"""
+Import jobs: the text and options of one import as set in the import dialog,
+so that several question sets can be queued and imported one after another
+in the background.
+"""
+import hashlib
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from . import fonts, gen_notes, metrics
+from .gen_notes import add_notes, cleanse_text, insert_notes, plan_notes
+from .import_checkpoint import clear_checkpoint, pending_import, save_checkpoint
+from .metrics import record_metrics
+from .question_sets import get_import_ledger, merge_ledger_entry, question_set_nids
+from .watcher import read_new_blocks, watch_file
+
+if TYPE_CHECKING:
+    from .search_index import SearchIndex
+
+ImportJob = Dict[str, Any]
+
+# job statuses
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def job_ledger_options(job: ImportJob) -> Dict[str, Any]:
+    "The options of a job as recorded in the import ledger."
+    # a resumed job is recorded as the import it resumes
+    checkpointed = job.get("checkpointed") or {}
+    return {
+        "mode": "insert" if job["insert"] else "append",
+        "deck_id": job["deck_id"],
+        "tags": job["tags"],
+        "qa_marker": job["qa_marker"],
+        "question_marker": job["question_marker"],
+        "chapter_marker": job["chapter_marker"],
+        "extra_marker": job["extra_marker"],
+        "prev_imported_number": checkpointed.get(
+            "prev_imported_number", job["prev_imported_number"]
+        ),
+        "chapter_decks": job["chapter_decks"],
+        "source_path": job["source_path"],
+    }
+
+
+def import_metrics(
+    col: Any, job: ImportJob, added: int, timings: Dict[str, float]
+) -> Dict[str, Any]:
+    "The entry of a finished import of _job_ in the metrics history."
+    ledger = get_import_ledger(col)
+    media_size = (
+        ledger[-1].get("media_size")
+        if ledger and ledger[-1]["title"] == job["title"]
+        else None
+    )
+    seconds = sum(timings.values())
+    return {
+        "time": int(time.time()),
+        "mode": "insert" if job["insert"] else "append",
+        "questions": len(question_set_nids(col, job["title"])),
+        "added": added,
+        "source_bytes": len(job["source"].encode()),
+        "media_bytes": media_size,
+        "phases": {phase: round(t, 3) for phase, t in timings.items()},
+        "seconds": round(seconds, 3),
+        "notes_per_sec": round(added / seconds, 1) if seconds else 0.0,
+        "collection_notes": col.note_count(),
+    }
+
+
+def run_import_job(
+    col: Any,
+    note_constructor: Callable,
+    job: ImportJob,
+    index: Optional["SearchIndex"] = None,
+    metrics_path: Optional[str] = None,
+) -> int:
+    """
+    Import the question set of _job_, update the font subsets if enabled, and start watching
+    its source file if the job asks to. The last block of a watched file isn't imported, but
+    watched for lines added to it. The import is recorded in the metrics history at
+    _metrics_path_, or at metrics.METRICS_PATH if it's None.
+    Appended notes are added in chunks, checkpointing the progress of the import after each
+    so that it can be resumed if it's interrupted.
+    Returns the number of added notes, or -1 if there are no new questions, like add_notes.
+    Raises what add_notes and insert_notes raise.
+    """
+    source = job["source"]
+    source_digest = hashlib.sha1(source.encode()).hexdigest()
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    if job["watch"] and job["blocks"] is None:
+        # the last block of a watched file is held back, as the lines appended to the file
+        # later may still be part of it, and it's imported by poll_watches once they are
+        blocks, held_back_offset, held_back_chapter = read_new_blocks(
+            job["source_path"],
+            0,
+            job["qa_marker"],
+            job["question_marker"],
+            job["chapter_marker"],
+            job["extra_marker"],
+        )
+        # kept in the job so that a resumed import watches the file from there too
+        job = dict(job, blocks=blocks, watch_from=[held_back_offset, held_back_chapter])
+    args = (
+        col,
+        note_constructor,
+        job["title"],
+        job["tags"],
+        # the text of structured files isn't parsed
+        cleanse_text(source.strip()) if job["blocks"] is None else [],
+        job["deck_id"],
+        job["qa_marker"],
+        job["question_marker"],
+        job["chapter_marker"],
+        job["extra_marker"],
+    )
+    kwargs: Dict[str, Any] = dict(
+        chapter_decks=job["chapter_decks"],
+        ledger_options=job_ledger_options(job),
+        source_digest=source_digest,
+        blocks=job["blocks"],
+        timings=timings,
+    )
+    # cleansing is part of parsing
+    timings["parse"] = time.perf_counter() - start
+    if job["insert"]:
+        added = insert_notes(*args, index, **kwargs)
+    else:
+        added = add_notes(
+            *args,
+            job["prev_imported_number"],
+            index,
+            parallel=gen_notes.PARALLEL_PARSE,
+            on_chunk=lambda blocks, seq, nids: save_checkpoint(
+                col, job, blocks, source_digest, seq, nids
+            ),
+            **kwargs,
+        )
+        if added > 0 and job.get("checkpointed"):
+            merge_ledger_entry(
+                col,
+                job["title"],
+                job["checkpointed"]["first_nid"],
+                job["checkpointed"]["count"],
+            )
+    checkpoint = pending_import(col)
+    if checkpoint is not None and checkpoint["source_digest"] == source_digest:
+        clear_checkpoint(col)
+    if added >= 0 and fonts.SUBSET_FONTS and fonts.fonts_available():
+        start = time.perf_counter()
+        fonts.update_font_subsets(
+            col,
+            (
+                [source]
+                if job["blocks"] is None
+                else [value for block in job["blocks"] for value in block.values()]
+            ),
+        )
+        timings["fonts"] = time.perf_counter() - start
+    if added > 0:
+        record_metrics(
+            import_metrics(col, job, added, timings),
+            metrics.METRICS_PATH if metrics_path is None else metrics_path,
+        )
+    if job["watch"] and (added >= 0 or "watch_from" in job):
+        offset, chapter = job.get("watch_from") or (job["source_size"], None)
+        if chapter is not None and len(question_set_nids(col, job["title"])) > len(
+            job["blocks"]
+        ):
+            # the held back block was imported before, so only what follows the end of
+            # the file is new
+            offset, chapter = job["source_size"], None
+        watch_file(
+            col,
+            job["title"],
+            job["source_path"],
+            offset,
+            chapter,
+            job["deck_id"],
+            job["tags"],
+            job["qa_marker"],
+            job["question_marker"],
+            job["chapter_marker"],
+            job["extra_marker"],
+            job["chapter_decks"],
+        )
+    return added
+
+
+def plan_import_job(col: Any, job: ImportJob) -> Dict[str, Any]:
+    "Plan the import of _job_ without writing to the collection. See plan_notes."
+    return plan_notes(
+        col,
+        job["title"],
+        cleanse_text(job["source"].strip()) if job["blocks"] is None else [],
+        job["deck_id"],
+        job["qa_marker"],
+        job["question_marker"],
+        job["chapter_marker"],
+        job["extra_marker"],
+        job["prev_imported_number"],
+        job["insert"],
+        job["blocks"],
+        job["chapter_decks"],
+    )
+
+
+def run_import_queue(
+    col: Any,
+    note_constructor: Callable,
+    jobs: List[ImportJob],
+    index: Optional["SearchIndex"] = None,
+    on_change: Optional[Callable[[ImportJob], None]] = None,
+    metrics_path: Optional[str] = None,
+) -> int:
+    """
+    Run the pending jobs of the queue one after another, setting the "status" of each
+    and its "result" (the number of added notes) or "error" (the exception it raised).
+    A failed job doesn't stop the jobs after it.
+    _on_change_ is called with each job when its status changes.
+    The imports are recorded in the metrics history at _metrics_path_, as in run_import_job.
+    Returns the number of failed jobs.
+    """
+    failed = 0
+    for job in jobs:
+        if job["status"] != PENDING:
+            continue
+        job["status"] = RUNNING
+        if on_change:
+            on_change(job)
+        try:
+            job["result"] = run_import_job(
+                col, note_constructor, job, index, metrics_path
+            )
+            job["status"] = DONE
+        except Exception as exc:  # pylint: disable=broad-except
+            job["error"] = exc
+            job["status"] = FAILED
+            failed += 1
+        if on_change:
+            on_change(job)
+    return failed
@@ -0,0 +1,110 @@
+"""
+Regenerate question set media files from the notes in the collection.
+"""
+
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Collection, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from . import gen_notes
+from .gen_notes import render_media
+from .neighbor_context import context_changes
+from .question_sets import (
+    QuestionSetMedia,
+    StoredNote,
+    fetch_question_sets,
+    media_ref,
+    relink_question_set,
+    update_note_fields,
+)
+
+# sets rendered ahead of the one being saved, per worker thread
+RENDER_AHEAD = 2
+
+
+class MediaRebuildReport(NamedTuple):
+    sets: int
+    notes: int
+    # media files that were missing or whose contents changed
+    written: int
+    seconds: float
+
+    def summary(self) -> str:
+        rate = self.sets / self.seconds if self.seconds else 0
+        return (
+            f"تمت معالجة {self.sets} مجموعة أسئلة ({self.notes} ملحوظة) "
+            f"في {self.seconds:.2f} ثانية ({rate:.0f} مجموعة في الثانية)، "
+            f"وكُتب {self.written} ملف."
+        )
+
+
+def _render(media_dir: str, notes: List[StoredNote]) -> Tuple[QuestionSetMedia, bool]:
+    media = QuestionSetMedia(
+        render_media([note.block for note in notes]), gen_notes.COMPRESS_MEDIA
+    )
+    exists = os.path.exists(os.path.join(media_dir, media.filename))
+    return media, exists
+
+
+def rebuild_question_set_media(
+    col: Any,
+    titles: Optional[Collection[str]] = None,
+    max_workers: Optional[int] = None,
+) -> MediaRebuildReport:
+    """
+    Regenerate the media files of all question sets, or the sets in _titles_, from the
+    notes in the collection. Files are rendered and hashed in a thread pool; as they are
+    named after their contents, only files that don't exist yet are written, and only
+    notes referencing a different file are updated. Files are streamed through temporary
+    files, and only a few sets per worker are rendered ahead of the one being saved, so
+    memory and disk use are bounded by the largest sets rather than the total.
+    The neighbor contexts of the notes are brought up to date with the add-on config too.
+    """
+    start = time.time()
+    sets = fetch_question_sets(col, titles)
+    media_dir = col.media.dir()
+    written = 0
+    contexts: Dict[int, Dict[str, str]] = {}
+    ahead = RENDER_AHEAD * (max_workers or os.cpu_count() or 1)
+    queued: Deque[Tuple[str, List[StoredNote], Future]] = deque()
+
+    # media and note updates go through the collection, so they stay in this thread
+    def store(title: str, notes: List[StoredNote], rendered: Future) -> None:
+        nonlocal written
+        media, exists = rendered.result()
+        with media:
+            filename = media.filename
+            if not exists:
+                filename = media.save(col)
+                written += 1
+        ref = media_ref(filename)
+        stale = [note.nid for note in notes if note.media != ref]
+        if stale:
+            relink_question_set(col, title, filename, stale)
+        contexts.update(context_changes(notes))
+
+    with ThreadPoolExecutor(max_workers) as executor:
+        try:
+            for title, notes in sets.items():
+                queued.append(
+                    (title, notes, executor.submit(_render, media_dir, notes))
+                )
+                if len(queued) > ahead:
+                    store(*queued.popleft())
+            while queued:
+                store(*queued.popleft())
+        finally:
+            # the temporary files of the sets left after a failure are discarded
+            for _, _, rendered in queued:
+                if not rendered.cancel() and rendered.exception() is None:
+                    rendered.result()[0].discard()
+    update_note_fields(col, contexts)
+
+    return MediaRebuildReport(
+        len(sets),
+        sum(len(notes) for notes in sets.values()),
+        written,
+        time.time() - start,
+    )
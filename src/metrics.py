@@ -0,0 +1,175 @@
+"""
+A local history of import metrics, to check reports of slow imports against.
+
+Each import appends a line of compact JSON to a file in the add-on's user files, which is
+rotated when it grows too large. Imports whose throughput falls well below the median
+of the previous imports of sets of similar size are flagged as regressions.
+
+The module doesn't import the rest of the add-on, so that the history can be queried
+without Anki:
+
+    python metrics.py [--last N] [--regressions] [--path FILE]
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+
+# paths.USER_FILES_DIR, which can't be imported when the module is run as a script
+USER_FILES_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "user_files")
+METRICS_PATH = os.path.join(USER_FILES_DIR, "import_metrics.jsonl")
+# the file is rotated to METRICS_PATH + ".1" when it grows beyond this
+MAX_FILE_SIZE = 1024 * 1024
+# number of previous imports of the same size class the baseline is computed from
+BASELINE_WINDOW = 20
+# imports needed before a baseline is computed
+MIN_BASELINE = 5
+# imports slower than this fraction of the baseline are flagged
+REGRESSION_FACTOR = 0.5
+
+
+class Stopwatch:
+    "Add the seconds between laps to the phases of _timings_, if it's not None."
+
+    def __init__(self, timings: Optional[Dict[str, float]]):
+        self.timings = timings
+        self.last = time.perf_counter()
+
+    def lap(self, phase: str) -> None:
+        if self.timings is None:
+            return
+        now = time.perf_counter()
+        self.timings[phase] = self.timings.get(phase, 0.0) + now - self.last
+        self.last = now
+
+
+def size_class(questions: int) -> int:
+    "Number of digits of the number of questions, so that sets within 10x share a class."
+    return len(str(max(questions, 1)))
+
+
+def record_metrics(entry: Dict[str, Any], path: str = METRICS_PATH) -> None:
+    "Append _entry_ to the history, rotating the file first if it's too large."
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path) and os.path.getsize(path) >= MAX_FILE_SIZE:
+        os.replace(path, path + ".1")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+
+def read_metrics(path: str = METRICS_PATH) -> List[Dict[str, Any]]:
+    "Return the entries of the history, including the rotated file, oldest first."
+    entries = []
+    for filename in (path + ".1", path):
+        if not os.path.exists(filename):
+            continue
+        with open(filename, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # a line cut short by a crash
+                    continue
+    return entries
+
+
+def analyze(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Return copies of _entries_ with the "baseline" throughput of each, the median of the
+    previous BASELINE_WINDOW imports of its size class (None if there are fewer than
+    MIN_BASELINE), and whether it's a "regression".
+    """
+    previous: Dict[int, List[float]] = {}
+    analyzed = []
+    for entry in entries:
+        rates = previous.setdefault(size_class(entry["questions"]), [])
+        baseline = (
+            statistics.median(rates[-BASELINE_WINDOW:])
+            if len(rates) >= MIN_BASELINE
+            else None
+        )
+        analyzed.append(
+            dict(
+                entry,
+                baseline=baseline,
+                regression=baseline is not None
+                and entry["notes_per_sec"] < baseline * REGRESSION_FACTOR,
+            )
+        )
+        rates.append(entry["notes_per_sec"])
+    return analyzed
+
+
+def format_report(
+    entries: List[Dict[str, Any]], last: int = 20, regressions_only: bool = False
+) -> str:
+    "Describe the trend of each size class and the last _last_ analyzed _entries_."
+    if not entries:
+        return "لا توجد عمليات استيراد مسجلة بعد."
+    lines = ["متوسط السرعة (ملحوظة في الثانية) حسب حجم المجموعة:"]
+    classes: Dict[int, List[float]] = {}
+    for entry in entries:
+        classes.setdefault(size_class(entry["questions"]), []).append(
+            entry["notes_per_sec"]
+        )
+    for digits, rates in sorted(classes.items()):
+        half = len(rates) // 2
+        trend = ""
+        if half:
+            older = statistics.median(rates[:half])
+            newer = statistics.median(rates[half:])
+            trend = " (%+.0f%% بين النصف الأقدم والأحدث)" % (
+                (newer / older - 1) * 100 if older else 0
+            )
+        lines.append(
+            "- من %i إلى %i سؤال: %.0f في %i استيراد%s"
+            % (
+                10 ** (digits - 1) if digits > 1 else 0,
+                10**digits - 1,
+                statistics.median(rates),
+                len(rates),
+                trend,
+            )
+        )
+    shown = [e for e in entries if e["regression"]] if regressions_only else entries
+    lines.append("")
+    lines.append("آخر عمليات الاستيراد:")
+    for entry in shown[-last:]:
+        phases = "، ".join(
+            "%s %.2f" % (phase, seconds) for phase, seconds in entry["phases"].items()
+        )
+        lines.append(
+            "%s%s: %i سؤال، %i مضافة، %.2f ثانية (%s)، %.0f ملحوظة في الثانية%s"
+            % (
+                "⚠ " if entry["regression"] else "",
+                time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["time"])),
+                entry["questions"],
+                entry["added"],
+                entry["seconds"],
+                phases,
+                entry["notes_per_sec"],
+                (
+                    "، المعتاد %.0f" % entry["baseline"]
+                    if entry["baseline"] is not None
+                    else ""
+                ),
+            )
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Show the import metrics history.")
+    parser.add_argument("--path", default=METRICS_PATH, help="the history file")
+    parser.add_argument("--last", type=int, default=20, help="imports to list")
+    parser.add_argument(
+        "--regressions", action="store_true", help="list only flagged imports"
+    )
+    args = parser.parse_args()
+    print(format_report(analyze(read_metrics(args.path)), args.last, args.regressions))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Note-level steps of note type upgrades, run over all notes of the note type in batches.
+
+The position of the last finished batch is saved in the collection config, so that an
+interrupted migration resumes from there the next time it's run. A transform can therefore
+be run again on notes that were updated just before an interruption, and must give the
+same result when that happens.
+"""
+from typing import Any, Callable, Dict, List, Optional
+
+from .question_sets import write_note_fields
+
+# takes the fields of a note by name, and returns the fields to change, if any
+NoteTransform = Callable[[Dict[str, str]], Optional[Dict[str, str]]]
+
+MIGRATION_CONFIG_KEY = "arqimporter_note_migration"
+BATCH_SIZE = 2000
+
+
+def pending_migration(col: Any) -> Optional[Dict[str, Any]]:
+    """
+    Return the state of an unfinished migration: the versions whose transforms are still to
+    be run, and the ID of the last note the first of them was run on.
+    """
+    return col.get_config(MIGRATION_CONFIG_KEY, default=None)
+
+
+def schedule_note_transforms(col: Any, versions: List[str]) -> None:
+    "Mark the note transforms of the upgrades to _versions_ as pending."
+    state = pending_migration(col) or {"versions": [], "last_nid": 0}
+    state["versions"].extend(v for v in versions if v not in state["versions"])
+    if state["versions"]:
+        col.set_config(MIGRATION_CONFIG_KEY, state)
+
+
+def run_note_transforms(
+    col: Any,
+    model_name: str,
+    transforms: Dict[str, NoteTransform],
+    batch_size: int = BATCH_SIZE,
+    progress: Optional[Callable[[str, int, int], None]] = None,
+) -> int:
+    """
+    Run the pending note transforms, given by the version they upgrade to, over the notes of
+    the note type, reading and writing _batch_size_ notes at a time in note ID order.
+    _progress_ is called after each batch with the version, the number of processed notes
+    and the total. Returns the number of changed notes.
+    """
+    state = pending_migration(col)
+    if state is None:
+        return 0
+    model = col.models.by_name(model_name)
+    ords = {field["name"]: field["ord"] for field in model["flds"]}
+    names = sorted(ords, key=lambda name: ords[name])
+    total = col.db.scalar("select count() from notes where mid = ?", model["id"])
+    changed = 0
+    while state["versions"]:
+        version = state["versions"][0]
+        transform = transforms[version]
+        done = col.db.scalar(
+            "select count() from notes where mid = ? and id <= ?",
+            model["id"],
+            state["last_nid"],
+        )
+        while True:
+            rows = col.db.all(
+                "select id, flds from notes where mid = ? and id > ? order by id limit ?",
+                model["id"],
+                state["last_nid"],
+                batch_size,
+            )
+            if not rows:
+                break
+            notes = []
+            for nid, flds in rows:
+                fields = flds.split("\x1f")
+                new_fields = transform(dict(zip(names, fields)))
+                if new_fields:
+                    for name, value in new_fields.items():
+                        fields[ords[name]] = value
+                    notes.append((nid, fields))
+            write_note_fields(col, model, notes, "ترقية ملحوظات ARQImporter")
+            changed += len(notes)
+            done += len(rows)
+            state["last_nid"] = rows[-1][0]
+            col.set_config(MIGRATION_CONFIG_KEY, state)
+            if progress:
+                progress(version, done, total)
+        state["versions"].pop(0)
+        state["last_nid"] = 0
+        col.set_config(MIGRATION_CONFIG_KEY, state)
+    col.remove_config(MIGRATION_CONFIG_KEY)
+    return changed
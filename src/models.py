@@ -4,15 +4,28 @@ Mostly based on models.py from the LPCG add-on: https://github.com/sobjornstad/A
 """
 from abc import ABC
 from textwrap import dedent
-from typing import Callable, Dict, Tuple, Type
+from typing import Callable, Dict, Optional, Tuple, Type
 import os
 
-import aqt
-from aqt.utils import askUser, showInfo
+try:
+    import aqt
+    from aqt.operations import QueryOp
+    from aqt.utils import askUser, showInfo, tooltip
+except ImportError:  # only anki is installed, as for tests that use to_model(col)
+    aqt = None  # type: ignore
+from anki.collection import Collection
 from anki.consts import MODEL_CLOZE
 from anki.models import TemplateDict as AnkiTemplate
 from anki.models import NotetypeDict as AnkiModel
 
+from .migration import (
+    NoteTransform,
+    pending_migration,
+    run_note_transforms,
+    schedule_note_transforms,
+)
+from .neighbor_context import CONTEXT_FIELD, context_transform
+
 
 class TemplateData(ABC):
     """
@@ -24,10 +37,15 @@ class TemplateData(ABC):
     back: str
 
     @classmethod
-    def to_template(cls) -> AnkiTemplate:
-        "Create and return an Anki template object for this model definition."
-        assert aqt.mw is not None, "Tried to use models before Anki is initialized!"
-        mm = aqt.mw.col.models
+    def to_template(cls, col: Optional[Collection] = None) -> AnkiTemplate:
+        """
+        Create and return an Anki template object for this model definition.
+        Uses the collection of the main window if _col_ isn't given.
+        """
+        if col is None:
+            assert aqt.mw is not None, "Tried to use models before Anki is initialized!"
+            col = aqt.mw.col
+        mm = col.models
         t = mm.new(cls.name)
         t["qfmt"] = dedent(cls.front).strip()
         t["afmt"] = dedent(cls.back).strip()
@@ -46,23 +64,27 @@ class ModelData(ABC):
     sort_field: str
     is_cloze: bool
     version: str
-    upgrades: Tuple[Tuple[str, str, Callable[[AnkiModel], None]], ...]
+    # (from version, to version, model function[, note transform])
+    upgrades: Tuple[Tuple, ...]
 
     @classmethod
-    def to_model(cls) -> Tuple[AnkiModel, str]:
+    def to_model(cls, col: Optional[Collection] = None) -> Tuple[AnkiModel, str]:
         """
         Create and return a pair of (Anki model object, version spec)
         for this model definition.
+        Uses the collection of the main window if _col_ isn't given.
         """
-        assert aqt.mw is not None, "Tried to use models before Anki is initialized!"
-        mm = aqt.mw.col.models
+        if col is None:
+            assert aqt.mw is not None, "Tried to use models before Anki is initialized!"
+            col = aqt.mw.col
+        mm = col.models
         model = mm.new(cls.name)
         for i in cls.fields:
             field = mm.new_field(i)
             field["rtl"] = True
             mm.add_field(model, field)
         for template in cls.templates:
-            t = template.to_template()
+            t = template.to_template(col)
             mm.addTemplate(model, t)
         model["css"] = dedent(cls.styling).strip()
         model["sortf"] = cls.fields.index(cls.sort_field)
@@ -82,6 +104,9 @@ class ModelData(ABC):
         [1] Version number to upgrade to
         [2] Function taking one argument, the model, and mutating it as required;
             raises an exception if update failed.
+        [3] Optional function to run on the fields of every note afterwards, see
+            migration.NoteTransform. These are only scheduled here;
+            run them with run_note_migration().
 
         Returns the new version the model is at.
         """
@@ -89,14 +114,23 @@ class ModelData(ABC):
         model = aqt.mw.col.models.by_name(cls.name)
 
         at_version = current_version
-        for cur_ver, new_ver, func in cls.upgrades:
+        transform_versions = []
+        for cur_ver, new_ver, func, *transform in cls.upgrades:
             if at_version == cur_ver:
                 func(model)
                 at_version = new_ver
+                if transform:
+                    transform_versions.append(new_ver)
         if at_version != current_version:
             aqt.mw.col.models.save(model)
+        schedule_note_transforms(aqt.mw.col, transform_versions)
         return at_version
 
+    @classmethod
+    def note_transforms(cls) -> Dict[str, NoteTransform]:
+        "Return the note transforms of the upgrades by the version they upgrade to."
+        return {upgrade[1]: upgrade[3] for upgrade in cls.upgrades if len(upgrade) > 3}
+
     @classmethod
     def in_collection(cls) -> bool:
         """
@@ -115,8 +149,8 @@ class ModelData(ABC):
         """
         if cls.is_at_version(current_version):
             return False
-        for cur_ver, _, __ in cls.upgrades:
-            if current_version == cur_ver:
+        for upgrade in cls.upgrades:
+            if current_version == upgrade[0]:
                 return True
         return False
 
@@ -129,17 +163,43 @@ class ModelData(ABC):
 SRCDIR = os.path.dirname(os.path.realpath(__file__))
 
 
+def read_upgrade_file(version: str, filename: str) -> str:
+    with open(
+        os.path.join(SRCDIR, "upgrades", version, filename), encoding="utf-8"
+    ) as f:
+        return f.read()
+
+
+def add_field(name: str, version: str) -> Callable[[AnkiModel], None]:
+    "Return an upgrade function adding the field _name_ and the templates of _version_."
+
+    def upgrade(model: AnkiModel) -> None:
+        mm = aqt.mw.col.models
+        field = mm.new_field(name)
+        field["rtl"] = True
+        mm.add_field(model, field)
+        update_templates(version)(model)
+
+    return upgrade
+
+
+def update_templates(version: str) -> Callable[[AnkiModel], None]:
+    "Return an upgrade function replacing the template and styling with those of _version_."
+
+    def upgrade(model: AnkiModel) -> None:
+        template = model["tmpls"][0]
+        template["qfmt"] = dedent(read_upgrade_file(version, "front.txt")).strip()
+        template["afmt"] = dedent(read_upgrade_file(version, "back.txt")).strip()
+        model["css"] = dedent(read_upgrade_file(version, "styling.txt")).strip()
+
+    return upgrade
+
+
 class ARQOne(ModelData):
     class ARQOneTemplate(TemplateData):
         name = "ARQ1"
-        with open(
-            os.path.join(SRCDIR, "upgrades/1.1.0/front.txt"), encoding="utf-8"
-        ) as f:
-            front = f.read()
-        with open(
-            os.path.join(SRCDIR, "upgrades/1.1.0/back.txt"), encoding="utf-8"
-        ) as f:
-            back = f.read()
+        front = read_upgrade_file("1.2.0", "front.txt")
+        back = read_upgrade_file("1.2.0", "back.txt")
 
     name = "ARQ 1.0"
     fields = (
@@ -151,16 +211,48 @@ class ARQOne(ModelData):
         "كل الأسئلة",
         "إضافي",
         "مصادر",
+        CONTEXT_FIELD,
     )
     templates = (ARQOneTemplate,)
-    with open(
-        os.path.join(SRCDIR, "upgrades/1.1.0/styling.txt"), encoding="utf-8"
-    ) as f:
-        styling = f.read()
+    styling = read_upgrade_file("1.2.0", "styling.txt")
     sort_field = "رقم السؤال"
     is_cloze = False
-    version = "1.1.0"
-    upgrades = ()
+    version = "1.2.0"
+    upgrades = (
+        # table of contents of the chapters in the "show all" view, decompression of
+        # compressed media and of media with a table of the distinct answer lines, font
+        # subsets, and the questions around each note so that the set is loaded on demand
+        (
+            "1.1.0",
+            "1.2.0",
+            add_field(CONTEXT_FIELD, "1.2.0"),
+            context_transform(lambda: aqt.mw.col),
+        ),
+    )
+
+
+def run_note_migration() -> None:
+    """
+    Run the pending note transforms of ARQ note type upgrades in the background,
+    resuming an interrupted migration.
+    """
+
+    def progress(version: str, done: int, total: int) -> None:
+        aqt.mw.taskman.run_on_main(
+            lambda: aqt.mw.progress.update(
+                label="ترقية ملحوظات ARQImporter إلى الإصدار %s" % version,
+                value=done,
+                max=total,
+            )
+        )
+
+    QueryOp(
+        parent=aqt.mw,
+        op=lambda col: run_note_transforms(
+            col, ARQOne.name, ARQOne.note_transforms(), progress=progress
+        ),
+        success=lambda count: tooltip("تم تحديث %i ملحوظة." % count),
+    ).with_progress().run_in_background()
 
 
 def ensure_note_type() -> None:
@@ -192,10 +284,16 @@ def ensure_note_type() -> None:
                 "تظهر بشكل صحيح لكي تستطيع الاسترجاع من نسخة احتياطية "
                 "في حال كان هناك خطب ما."
             )
-        return
+    else:
+        assert mod.is_at_version(
+            aqt.mw.col.get_config("arqimporter_model_version")
+        ), (
+            "قالب ARQImporter الخاص بك قديم، لكنني لم أعثر على طريقة تحديث صالحة. "
+            "من المرجح أن تصادف مشاكل. "
+            "الرجاء التواصل مع المطور أو طلب الدعم لحل هذه المشكلة."
+        )
 
-    assert mod.is_at_version(aqt.mw.col.get_config("arqimporter_model_version")), (
-        "قالب ARQImporter الخاص بك قديم، لكنني لم أعثر على طريقة تحديث صالحة. "
-        "من المرجح أن تصادف مشاكل. "
-        "الرجاء التواصل مع المطور أو طلب الدعم لحل هذه المشكلة."
-    )
+    # started once, after the upgrade added its transforms to those of an interrupted
+    # migration, so that the notes are visited in a single run
+    if pending_migration(aqt.mw.col):
+        run_note_migration()
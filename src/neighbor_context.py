@@ -0,0 +1,100 @@
+"""
+The questions around each note, stored in its "سياق" field so that the back template can
+show them without loading the media file of the whole question set, which it then only
+loads when all questions are shown.
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .migration import NoteTransform
+from .question_sets import (
+    StoredNote,
+    fetch_question_set,
+    fetch_question_sets,
+    update_note_fields,
+)
+
+CONTEXT_FIELD = "سياق"
+
+# number of questions before and after each note kept in its context, 0 to keep none,
+# set from the add-on config
+CONTEXT_SIZE = 2
+
+
+def render_context(blocks: List[Dict[str, str]], i: int, size: int) -> str:
+    """
+    Return the context of the block at index _i_ of _blocks_: the HTML of the _size_ blocks
+    before it and of the _size_ blocks after it, without the block itself, which the card
+    already shows. Each of the two groups is in the format of the media file, wrapped in an
+    element giving the question number of its first block, and left out if it's empty.
+    Empty if _size_ is 0.
+    """
+    if not size:
+        return ""
+    start = max(i - size, 0)
+    groups = ((start, blocks[start:i]), (i + 1, blocks[i + 1 : i + size + 1]))
+    return "".join(
+        f'<div data-start="{first + 1}">'
+        + "".join(
+            f"<div><div>{b['question']}</div><div>{b['answer']}</div><div>{b['extra']}</div></div>"
+            for b in group
+        )
+        + "</div>"
+        for first, group in groups
+        if group
+    )
+
+
+def question_set_contexts(notes: List[StoredNote], size: int) -> List[str]:
+    "Return the contexts of the notes of a question set, ordered by question number."
+    blocks = [note.block for note in notes]
+    return [render_context(blocks, i, size) for i in range(len(notes))]
+
+
+def context_changes(notes: List[StoredNote]) -> Dict[int, Dict[str, str]]:
+    """
+    Return the context of each note of a question set, ordered by question number, whose
+    context changed, computed with the current CONTEXT_SIZE, as {note ID: {field: value}}
+    for update_note_fields.
+    """
+    return {
+        note.nid: {CONTEXT_FIELD: context}
+        for note, context in zip(notes, question_set_contexts(notes, CONTEXT_SIZE))
+        if note.context != context
+    }
+
+
+def update_neighbor_context(col: Any, title: str) -> int:
+    """
+    Recompute the contexts of the notes of the question set and write those that changed
+    in one bulk update. Returns the number of updated notes.
+    """
+    changes = context_changes(fetch_question_set(col, title))
+    update_note_fields(col, changes)
+    return len(changes)
+
+
+def context_transform(get_col: Callable[[], Any]) -> NoteTransform:
+    """
+    Return a note transform filling the context of notes imported before the field existed.
+    The question sets are read from the collection returned by _get_col_ in one pass the
+    first time a note is transformed and kept for the whole migration, as the notes of
+    sets imported in turns are visited interleaved in ID order.
+    """
+    # {title: (blocks ordered by question number, {question number: index in blocks})}
+    sets: Dict[str, Tuple[List[Dict[str, str]], Dict[int, int]]] = {}
+
+    def transform(fields: Dict[str, str]) -> Optional[Dict[str, str]]:
+        if not sets and CONTEXT_SIZE:
+            for title, notes in fetch_question_sets(get_col()).items():
+                sets[title] = (
+                    [note.block for note in notes],
+                    {note.seq: i for i, note in enumerate(notes)},
+                )
+        blocks, positions = sets.get(fields["عنوان"], ([], {}))
+        i = positions.get(int(fields["رقم السؤال"] or 0))
+        context = "" if i is None else render_context(blocks, i, CONTEXT_SIZE)
+        if context != fields[CONTEXT_FIELD]:
+            return {CONTEXT_FIELD: context}
+        return None
+
+    return transform
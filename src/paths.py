@@ -0,0 +1,10 @@
+import os
+
+SRCDIR = os.path.dirname(os.path.realpath(__file__))
+USER_FILES_DIR = os.path.join(SRCDIR, "user_files")
+
+
+def user_files_path(filename: str) -> str:
+    "Return the path of _filename_ in the add-on's user files folder."
+    os.makedirs(USER_FILES_DIR, exist_ok=True)
+    return os.path.join(USER_FILES_DIR, filename)
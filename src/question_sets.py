@@ -0,0 +1,392 @@
+"""
+Helpers for question sets already imported into the collection and their media files.
+"""
+
+import base64
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import time
+import zlib
+from typing import (
+    Any,
+    Collection,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+MODEL_NAME = "ARQ 1.0"
+MEDIA_PREFIX = "arq-"
+MEDIA_REFS_CONFIG_KEY = "arqimporter_media_refs"
+LEDGER_CONFIG_KEY = "arqimporter_ledger"
+# older entries are dropped from the import ledger
+MAX_LEDGER_ENTRIES = 100
+# a compressed media file defines ARQCompressed, the base64 of the gzipped plain file,
+# which the back template decompresses and runs
+COMPRESSED_PREFIX = b'var ARQCompressed = "'
+COMPRESSED_SUFFIX = b'";'
+MEDIA_REF_RE = re.compile(r'<img src="([^"]*)">')
+HTML_TAG_RE = re.compile(r"<[^>]*>")
+
+
+class StoredNote(NamedTuple):
+    "An ARQ note read from the collection."
+
+    nid: int
+    seq: int
+    block: Dict[str, str]
+    # value of the "كل الأسئلة" field
+    media: str
+    # value of the "سياق" field, empty for notes of note type versions before it
+    context: str = ""
+
+
+def media_filename(data: bytes) -> str:
+    "Name a question set's media file after a digest of its contents."
+    return f"{MEDIA_PREFIX}{hashlib.sha1(data).hexdigest()}.js"
+
+
+class QuestionSetMedia:
+    """
+    A question set media file written from chunks of text to a temporary file, so that
+    memory use doesn't depend on the size of the set. The chunks are encoded and hashed
+    one at a time, and the file is named after the digest of its contents.
+    If _compress_ is true, the chunks are gzipped and base64-encoded as they are written.
+    Used as a context manager, the temporary files are discarded on exit.
+    """
+
+    def __init__(self, chunks: Iterable[str], compress: bool = False):
+        self.dir = tempfile.mkdtemp(prefix="arqimporter")
+        try:
+            self._write(chunks, compress)
+        except BaseException:
+            self.discard()
+            raise
+
+    def _write(self, chunks: Iterable[str], compress: bool) -> None:
+        digest = hashlib.sha1()
+        partial_path = os.path.join(self.dir, "partial")
+        # size of the plain file
+        self.raw_size = 0
+        with open(partial_path, "wb") as f:
+
+            def write(data: bytes) -> None:
+                digest.update(data)
+                f.write(data)
+
+            # the gzip header zlib writes has no timestamp, so the output is reproducible
+            compressor = zlib.compressobj(9, zlib.DEFLATED, 31) if compress else None
+            pending = b""
+            if compressor:
+                write(COMPRESSED_PREFIX)
+            for chunk in chunks:
+                data = chunk.encode()
+                self.raw_size += len(data)
+                if not compressor:
+                    write(data)
+                    continue
+                pending += compressor.compress(data)
+                # base64 is written in groups of 3 bytes so that it's the same as encoding
+                # the compressed data at once
+                cut = len(pending) - len(pending) % 3
+                write(base64.b64encode(pending[:cut]))
+                pending = pending[cut:]
+            if compressor:
+                write(base64.b64encode(pending + compressor.flush()))
+                write(COMPRESSED_SUFFIX)
+            self.size = f.tell()
+        self.filename = f"{MEDIA_PREFIX}{digest.hexdigest()}.js"
+        self.path = os.path.join(self.dir, self.filename)
+        os.replace(partial_path, self.path)
+
+    def save(self, col: Any) -> str:
+        "Add the file to the media folder, returning its name there."
+        return col.media.add_file(self.path)
+
+    def discard(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def __enter__(self) -> "QuestionSetMedia":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.discard()
+
+
+def media_ref(filename: str) -> str:
+    """
+    Return the value of the "كل الأسئلة" field referencing _filename_.
+    The back template loads the file by slicing the name out of this value,
+    and Anki treats it as an image reference so the file is synced and kept by Check Media.
+    """
+    return f'<img src="{filename}">'
+
+
+def field_ords(model: Dict) -> Dict[str, int]:
+    return {field["name"]: field["ord"] for field in model["flds"]}
+
+
+def note_block(fields: List[str], ords: Dict[str, int]) -> Dict[str, str]:
+    "Convert the fields of an ARQ note back to a block as returned by parse_questions."
+    return {
+        "question": fields[ords["سؤال"]],
+        "answer": fields[ords["جواب"]],
+        "chapter": fields[ords["باب"]],
+        # older versions appended spaces to mark notes as modified
+        "extra": fields[ords["إضافي"]].strip(),
+    }
+
+
+def stored_note(nid: int, flds: str, ords: Dict[str, int]) -> StoredNote:
+    fields = flds.split("\x1f")
+    return StoredNote(
+        nid,
+        int(fields[ords["رقم السؤال"]] or 0),
+        note_block(fields, ords),
+        fields[ords["كل الأسئلة"]],
+        fields[ords["سياق"]] if "سياق" in ords else "",
+    )
+
+
+def question_set_titles(col: Any) -> List[str]:
+    model = col.models.by_name(MODEL_NAME)
+    return col.db.list(
+        "select distinct field_at_index(flds, ?) from notes where mid = ? order by 1",
+        field_ords(model)["عنوان"],
+        model["id"],
+    )
+
+
+def fetch_question_set(col: Any, title: str) -> List[StoredNote]:
+    "Return the notes of the question set ordered by question number, using a single query."
+    model = col.models.by_name(MODEL_NAME)
+    ords = field_ords(model)
+    rows = col.db.all(
+        "select id, flds from notes where mid = ? and field_at_index(flds, ?) = ? "
+        "order by cast(field_at_index(flds, ?) as integer)",
+        model["id"],
+        ords["عنوان"],
+        title,
+        ords["رقم السؤال"],
+    )
+    return [stored_note(nid, flds, ords) for nid, flds in rows]
+
+
+def fetch_question_sets(
+    col: Any, titles: Optional[Collection[str]] = None
+) -> Dict[str, List[StoredNote]]:
+    """
+    Group all ARQ notes, or the notes of the question sets in _titles_, by title,
+    reading the notes table in one pass. The notes of each set are ordered by question number.
+    """
+    model = col.models.by_name(MODEL_NAME)
+    ords = field_ords(model)
+    sets: Dict[str, List[StoredNote]] = {}
+    for nid, flds in col.db.execute(
+        "select id, flds from notes where mid = ?", model["id"]
+    ):
+        title = flds.split("\x1f", ords["عنوان"] + 1)[ords["عنوان"]]
+        if titles is not None and title not in titles:
+            continue
+        sets.setdefault(title, []).append(stored_note(nid, flds, ords))
+    for notes in sets.values():
+        notes.sort(key=lambda note: note.seq)
+    return sets
+
+
+def question_set_nids(col: Any, title: str) -> List[int]:
+    escaped_title = title.replace('"', '\\"')
+    return col.find_notes(f'"note:{MODEL_NAME}" "عنوان:{escaped_title}"')
+
+
+# name of the step in Anki's Edit > Undo that undoes changes to the fields of notes
+UNDO_NAME = "تحديث ملحوظات ARQImporter"
+
+
+def save_notes(col: Any, notes: List[Any], undo_name: str = UNDO_NAME) -> None:
+    """
+    Save the changed _notes_ with Collection.update_notes, which updates their sort field,
+    checksum and sync state, as one step that Edit > Undo in Anki undoes as _undo_name_.
+    """
+    if not notes:
+        return
+    position = col.add_custom_undo_entry(undo_name)
+    col.update_notes(notes)
+    col.merge_undo_entries(position)
+
+
+def update_note_fields(
+    col: Any, changes: Dict[int, Dict[str, str]], undo_name: str = UNDO_NAME
+) -> None:
+    """
+    Set fields of many ARQ notes given as {note ID: {field name: value}}, saving them
+    together with save_notes. Cards and their scheduling are left untouched.
+    """
+    notes = []
+    for nid, values in changes.items():
+        note = col.get_note(nid)
+        for name, value in values.items():
+            note[name] = value
+        notes.append(note)
+    save_notes(col, notes, undo_name)
+
+
+def write_note_fields(
+    col: Any,
+    model: Dict,
+    notes: Iterable[Tuple[int, List[str]]],
+    undo_name: str = UNDO_NAME,
+) -> None:
+    """
+    Replace all fields of the given (note ID, fields) pairs of notes of _model_, saving
+    them together with save_notes.
+    Raises ValueError if the number of fields of a note doesn't match _model_.
+    """
+    loaded = []
+    for nid, fields in notes:
+        if len(fields) != len(model["flds"]):
+            raise ValueError(
+                f"note {nid} has {len(fields)} fields instead of {len(model['flds'])}"
+            )
+        note = col.get_note(nid)
+        note.fields = list(fields)
+        loaded.append(note)
+    save_notes(col, loaded, undo_name)
+
+
+def get_media_refs(col: Any) -> Dict[str, str]:
+    "Return the map of question set titles to the media file each one uses."
+    return col.get_config(MEDIA_REFS_CONFIG_KEY, default={})
+
+
+def relink_question_set(
+    col: Any, title: str, filename: str, nids: Optional[List[int]] = None
+) -> None:
+    """
+    Point all notes of the question set, or the given notes of it, to _filename_ in one
+    bulk update, and trash the file previously used by the set if no other set uses it.
+    Also marks the updated notes as modified so that exporting and importing them
+    elsewhere picks up the change.
+    """
+    col.find_and_replace(
+        note_ids=question_set_nids(col, title) if nids is None else nids,
+        search="^.*$",
+        replacement=media_ref(filename),
+        regex=True,
+        field_name="كل الأسئلة",
+    )
+    refs = get_media_refs(col)
+    # sets imported before media files were named by their contents use their title
+    old_filename = refs.get(title, f"{title}.js")
+    refs[title] = filename
+    col.set_config(MEDIA_REFS_CONFIG_KEY, refs)
+    if old_filename != filename and old_filename not in refs.values():
+        trash_question_set_media(col, old_filename)
+
+
+def trash_question_set_media(col: Any, filename: str) -> None:
+    "Trash the media file _filename_, if it exists."
+    if os.path.exists(os.path.join(col.media.dir(), filename)):
+        col.media.trash_files([filename])
+
+
+def get_import_ledger(col: Any) -> List[Dict[str, Any]]:
+    "Return the entries of the import ledger, oldest first."
+    return col.get_config(LEDGER_CONFIG_KEY, default=[])
+
+
+def record_import(
+    col: Any,
+    title: str,
+    nids: List[int],
+    media_file: str,
+    options: Dict[str, Any],
+    source_digest: Optional[str] = None,
+    media_sizes: Optional[Sequence[int]] = None,
+) -> None:
+    """
+    Add an entry for an import that added the notes _nids_ to the import ledger.
+    Notes added in one import get increasing IDs, so only their range is kept.
+    _media_sizes_ is the size of the media file and of its plain contents.
+    """
+    if not nids:
+        return
+    ledger = get_import_ledger(col)
+    ledger.append(
+        {
+            "title": title,
+            "time": int(time.time()),
+            "options": options,
+            "source_digest": source_digest,
+            "first_nid": min(nids),
+            "last_nid": max(nids),
+            "count": len(nids),
+            "media": media_file,
+            "media_size": media_sizes[0] if media_sizes else None,
+            "media_raw_size": media_sizes[1] if media_sizes else None,
+        }
+    )
+    col.set_config(LEDGER_CONFIG_KEY, ledger[-MAX_LEDGER_ENTRIES:])
+
+
+def merge_ledger_entry(col: Any, title: str, first_nid: int, count: int) -> None:
+    """
+    Add the _count_ notes from _first_nid_ that an interrupted import added before it was
+    resumed to the last entry of the ledger, which records the rest of its notes.
+    """
+    ledger = get_import_ledger(col)
+    if not ledger or ledger[-1]["title"] != title:
+        return
+    ledger[-1]["first_nid"] = min(ledger[-1]["first_nid"], first_nid)
+    ledger[-1]["count"] += count
+    col.set_config(LEDGER_CONFIG_KEY, ledger)
+
+
+def remove_ledger_entry(col: Any, first_nid: int) -> None:
+    col.set_config(
+        LEDGER_CONFIG_KEY,
+        [e for e in get_import_ledger(col) if e["first_nid"] != first_nid],
+    )
+
+
+def referenced_media(col: Any) -> Set[str]:
+    "Return the names of all media files referenced by ARQ notes, using a single query."
+    model = col.models.by_name(MODEL_NAME)
+    values = col.db.list(
+        "select distinct field_at_index(flds, ?) from notes where mid = ?",
+        field_ords(model)["كل الأسئلة"],
+        model["id"],
+    )
+    return {match for value in values for match in MEDIA_REF_RE.findall(value)}
+
+
+def collect_garbage(col: Any) -> List[str]:
+    """
+    Trash question set media files that are no longer referenced by any ARQ note,
+    and drop sets that no longer exist from the media map.
+    Returns the names of the trashed files.
+    """
+    referenced = referenced_media(col)
+    unused = [
+        filename
+        for filename in os.listdir(col.media.dir())
+        if filename.startswith(MEDIA_PREFIX)
+        and filename.endswith(".js")
+        and filename not in referenced
+    ]
+    if unused:
+        col.media.trash_files(unused)
+    refs = get_media_refs(col)
+    col.set_config(
+        MEDIA_REFS_CONFIG_KEY,
+        {title: filename for title, filename in refs.items() if filename in referenced},
+    )
+    return unused
@@ -0,0 +1,39 @@
+from typing import List, Optional
+
+from aqt.qt import *
+
+
+class QuestionSetsDialog(QDialog):
+    "Let the user pick several question sets by title."
+
+    def __init__(self, parent, titles: List[str], prompt: str):
+        QDialog.__init__(self, parent)
+        self.setWindowTitle("مجموعات الأسئلة")
+        self.setLayoutDirection(Qt.LayoutDirection.RightToLeft)
+        layout = QVBoxLayout(self)
+        layout.addWidget(QLabel(prompt, self))
+        self.titlesList = QListWidget(self)
+        self.titlesList.addItems(titles)
+        self.titlesList.setSelectionMode(
+            QAbstractItemView.SelectionMode.ExtendedSelection
+        )
+        self.titlesList.selectAll()
+        layout.addWidget(self.titlesList)
+        buttons = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel,
+            parent=self,
+        )
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addWidget(buttons)
+
+    def selected_titles(self) -> List[str]:
+        return [item.text() for item in self.titlesList.selectedItems()]
+
+
+def choose_question_sets(parent, titles: List[str], prompt: str) -> Optional[List[str]]:
+    "Return the selected titles, or None if the user cancelled."
+    dialog = QuestionSetsDialog(parent, titles, prompt)
+    if not dialog.exec():
+        return None
+    return dialog.selected_titles()
@@ -0,0 +1,81 @@
+"""
+Rename imported question sets.
+"""
+from typing import TYPE_CHECKING, Any, Optional
+
+from . import gen_notes
+from .question_sets import (
+    LEDGER_CONFIG_KEY,
+    MEDIA_REFS_CONFIG_KEY,
+    MODEL_NAME,
+    field_ords,
+    get_import_ledger,
+    get_media_refs,
+    note_block,
+    relink_question_set,
+    write_note_fields,
+)
+from .watcher import WATCHES_CONFIG_KEY, get_watches
+
+if TYPE_CHECKING:
+    from .search_index import SearchIndex
+
+
+def retitle_question_set(
+    col: Any, old_title: str, new_title: str, index: Optional["SearchIndex"] = None
+) -> int:
+    """
+    Rename a question set, updating the title field of all its notes with one read of the
+    notes table and one undoable update of the notes, and moving its entries in the media
+    map, watched files, import ledger and search index to the new title.
+    Media files are named after their contents, so they are kept, except for sets imported
+    before that, whose file named after the old title is replaced.
+    Raises ValueError if a set with the new title exists.
+    Returns the number of renamed notes.
+    """
+    model = col.models.by_name(MODEL_NAME)
+    ords = field_ords(model)
+    if col.db.scalar(
+        "select exists(select 1 from notes where mid = ? and field_at_index(flds, ?) = ?)",
+        model["id"],
+        ords["عنوان"],
+        new_title,
+    ):
+        raise ValueError(new_title)
+    notes = []
+    for nid, flds in col.db.all(
+        "select id, flds from notes where mid = ? and field_at_index(flds, ?) = ? "
+        "order by cast(field_at_index(flds, ?) as integer)",
+        model["id"],
+        ords["عنوان"],
+        old_title,
+        ords["رقم السؤال"],
+    ):
+        fields = flds.split("\x1f")
+        fields[ords["عنوان"]] = new_title
+        notes.append((nid, fields))
+    write_note_fields(col, model, notes, "إعادة تسمية مجموعة أسئلة")
+
+    refs = get_media_refs(col)
+    # sets imported before media files were named by their contents use their title
+    filename = refs.pop(old_title, f"{old_title}.js")
+    refs[new_title] = filename
+    col.set_config(MEDIA_REFS_CONFIG_KEY, refs)
+    if filename == f"{old_title}.js" and notes:
+        media_file = gen_notes.write_question_set_to_file(
+            col, [note_block(fields, ords) for _, fields in notes]
+        )
+        relink_question_set(col, new_title, media_file, [nid for nid, _ in notes])
+
+    watches = get_watches(col)
+    if old_title in watches:
+        watches[new_title] = watches.pop(old_title)
+        col.set_config(WATCHES_CONFIG_KEY, watches)
+    ledger = get_import_ledger(col)
+    for entry in ledger:
+        if entry["title"] == old_title:
+            entry["title"] = new_title
+    col.set_config(LEDGER_CONFIG_KEY, ledger)
+    if index is not None:
+        index.retitle(old_title, new_title)
+    return len(notes)
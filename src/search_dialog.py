@@ -0,0 +1,70 @@
+from aqt.qt import *
+from aqt.operations import QueryOp
+from aqt.utils import tooltip
+
+from .paths import user_files_path
+from .search_index import SearchIndex
+
+
+def open_search_index(mw) -> SearchIndex:
+    "Open the search index of the current profile."
+    return SearchIndex(user_files_path(f"search-{mw.pm.name}.db"))
+
+
+class SearchDialog(QDialog):
+    def __init__(self, mw, parent=None):
+        self.mw = mw
+        QDialog.__init__(self, parent)
+        self.index = open_search_index(mw)
+        self.setWindowTitle("البحث في الأسئلة المستوردة")
+        self.setLayoutDirection(Qt.LayoutDirection.RightToLeft)
+        self.resize(500, 500)
+
+        layout = QVBoxLayout(self)
+        self.searchBox = QLineEdit(self)
+        self.searchBox.setPlaceholderText("ابحث في الأسئلة والأجوبة")
+        layout.addWidget(self.searchBox)
+        self.resultsTable = QTableWidget(0, 3, self)
+        self.resultsTable.setHorizontalHeaderLabels(
+            ["العنوان", "رقم السؤال", "معرف الملحوظة"]
+        )
+        self.resultsTable.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.resultsTable.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.resultsTable)
+        buttonsLayout = QHBoxLayout()
+        self.rebuildButton = QPushButton("إعادة بناء الفهرس", self)
+        self.rebuildButton.setToolTip(
+            "يعيد فهرسة كل ملحوظات ARQImporter الموجودة في مجموعتك"
+        )
+        buttonsLayout.addWidget(self.rebuildButton)
+        buttonsLayout.addStretch()
+        self.closeButton = QPushButton("إغلاق", self)
+        buttonsLayout.addWidget(self.closeButton)
+        layout.addLayout(buttonsLayout)
+
+        self.searchBox.textChanged.connect(self.onSearch)
+        self.rebuildButton.clicked.connect(self.onRebuild)
+        self.closeButton.clicked.connect(self.reject)
+
+        if not self.index.count():
+            self.onRebuild()
+
+    def onSearch(self, text: str) -> None:
+        results = self.index.search(text)
+        self.resultsTable.setRowCount(len(results))
+        for row, result in enumerate(results):
+            for column, value in enumerate(result):
+                self.resultsTable.setItem(row, column, QTableWidgetItem(str(value)))
+
+    def onRebuild(self) -> None:
+        def on_success(count: int) -> None:
+            tooltip("تمت فهرسة %i ملحوظة." % count, parent=self)
+            self.onSearch(self.searchBox.text())
+
+        QueryOp(
+            parent=self, op=self.index.rebuild, success=on_success
+        ).with_progress().run_in_background()
+
+    def done(self, result: int) -> None:
+        self.index.close()
+        super().done(result)
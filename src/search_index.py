@@ -0,0 +1,140 @@
+"""
+A full-text search index over imported ARQ notes.
+
+The index lives in an SQLite FTS5 database outside the collection. Questions and answers
+are normalized before indexing and querying, so searches ignore Arabic diacritics,
+tatweel and the different forms of alef.
+"""
+import re
+import sqlite3
+from typing import Any, Iterable, List, NamedTuple, Tuple
+
+ARABIC_DIACRITICS_RE = re.compile(
+    "[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06dc\u06df-\u06e8\u06ea-\u06ed\u0640]"
+)
+HTML_TAG_RE = re.compile(r"<[^>]*>")
+LETTER_VARIANTS = str.maketrans(
+    {
+        "\u0622": "\u0627",  # آ
+        "\u0623": "\u0627",  # أ
+        "\u0625": "\u0627",  # إ
+        "\u0671": "\u0627",  # ٱ
+        "\u0649": "\u064a",  # ى
+    }
+)
+
+
+def normalize_text(text: str) -> str:
+    "Strip HTML tags, diacritics and letter variants that searches should ignore."
+    text = HTML_TAG_RE.sub(" ", text)
+    text = ARABIC_DIACRITICS_RE.sub("", text)
+    return text.translate(LETTER_VARIANTS)
+
+
+def build_match_query(query: str) -> str:
+    """
+    Turn free text typed by the user into an FTS5 query matching all of its words,
+    treating each word as a prefix.
+    """
+    terms = normalize_text(query).split()
+    return " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+class SearchResult(NamedTuple):
+    title: str
+    seq: int
+    nid: int
+
+
+class SearchIndex:
+    """
+    FTS5 index of the question and answer fields of ARQ notes.
+    Rows are keyed by note ID, so re-adding a note replaces its previous entry.
+    """
+
+    def __init__(self, path: str):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "create virtual table if not exists arq_notes using fts5("
+            "question, answer, title unindexed, seq unindexed, "
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+    def close(self) -> None:
+        self.db.close()
+
+    def add(self, rows: Iterable[Tuple[int, str, int, str, str]]) -> None:
+        "Index (note ID, title, sequence number, question, answer) rows."
+        rows = list(rows)
+        with self.db:
+            self.db.executemany(
+                "delete from arq_notes where rowid = ?", ((row[0],) for row in rows)
+            )
+            self._insert(rows)
+
+    def _insert(self, rows: Iterable[Tuple[int, str, int, str, str]]) -> None:
+        self.db.executemany(
+            "insert into arq_notes(rowid, question, answer, title, seq) "
+            "values (?, ?, ?, ?, ?)",
+            (
+                (nid, normalize_text(question), normalize_text(answer), title, seq)
+                for nid, title, seq, question, answer in rows
+            ),
+        )
+
+    def remove(self, nids: Iterable[int]) -> None:
+        with self.db:
+            self.db.executemany(
+                "delete from arq_notes where rowid = ?", ((nid,) for nid in nids)
+            )
+
+    def retitle(self, old_title: str, new_title: str) -> None:
+        with self.db:
+            self.db.execute(
+                "update arq_notes set title = ? where title = ?", (new_title, old_title)
+            )
+
+    def clear(self) -> None:
+        with self.db:
+            self.db.execute("delete from arq_notes")
+
+    def count(self) -> int:
+        return self.db.execute("select count(*) from arq_notes").fetchone()[0]
+
+    def search(self, query: str, limit: int = 100) -> List[SearchResult]:
+        "Return the best matches of _query_ in questions and answers."
+        match = build_match_query(query)
+        if not match:
+            return []
+        rows = self.db.execute(
+            "select title, seq, rowid from arq_notes where arq_notes match ? "
+            "order by rank limit ?",
+            (match, limit),
+        )
+        return [SearchResult(title, int(seq), nid) for title, seq, nid in rows]
+
+    def rebuild(self, col: Any) -> int:
+        """
+        Replace the contents of the index with all ARQ notes in the collection.
+        Returns the number of indexed notes.
+        """
+        model = col.models.by_name("ARQ 1.0")
+        ords = {field["name"]: field["ord"] for field in model["flds"]}
+        rows = []
+        for nid, flds in col.db.execute(
+            "select id, flds from notes where mid = ?", model["id"]
+        ):
+            fields = flds.split("\x1f")
+            rows.append(
+                (
+                    nid,
+                    fields[ords["عنوان"]],
+                    int(fields[ords["رقم السؤال"]] or 0),
+                    fields[ords["سؤال"]],
+                    fields[ords["جواب"]],
+                )
+            )
+        with self.db:
+            self.db.execute("delete from arq_notes")
+            self._insert(rows)
+        return len(rows)
@@ -0,0 +1,90 @@
+"""
+Reading source text files in the encodings Arabic texts are commonly saved in:
+UTF-8, UTF-16 as exported by Word, and Windows-1256.
+"""
+
+import codecs
+from itertools import chain
+from typing import BinaryIO, Iterator, Optional
+
+# bytes read to detect the encoding of a file
+SAMPLE_SIZE = 64 * 1024
+CHUNK_SIZE = 64 * 1024
+
+BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+# characters str.splitlines() splits at
+LINE_BREAKS = frozenset("\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029")
+
+
+def _utf16_byte_order(sample: bytes) -> Optional[str]:
+    """
+    Guess whether a sample without a BOM is UTF-16, from where the high bytes of ASCII
+    and Arabic characters, 0x00 and 0x06, fall. Returns the codec or None.
+    """
+    pairs = len(sample) // 2
+    if not pairs:
+        return None
+    even = sample[0 : pairs * 2 : 2]
+    odd = sample[1 : pairs * 2 : 2]
+    high_even = even.count(0) + even.count(6)
+    high_odd = odd.count(0) + odd.count(6)
+    if high_odd >= pairs * 0.6 and high_even <= pairs * 0.1:
+        return "utf-16-le"
+    if high_even >= pairs * 0.6 and high_odd <= pairs * 0.1:
+        return "utf-16-be"
+    return None
+
+
+def detect_encoding(sample: bytes) -> str:
+    """
+    Return the codec of a text starting with _sample_: the one its BOM indicates, UTF-16
+    if its bytes look like it, UTF-8 if the sample is valid UTF-8, and Windows-1256 otherwise.
+    Arabic letters are all above 0xC0 in Windows-1256, so they can't be continuation bytes
+    and Windows-1256 Arabic text is practically never valid UTF-8.
+    """
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    utf16 = _utf16_byte_order(sample)
+    if utf16:
+        return utf16
+    try:
+        # the sample may end in the middle of a character
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return "cp1256"
+    return "utf-8"
+
+
+def iter_decoded_lines(
+    f: BinaryIO, encoding: Optional[str] = None, chunk_size: int = CHUNK_SIZE
+) -> Iterator[str]:
+    """
+    Decode a binary file in chunks with an incremental decoder, which decodes a character
+    split between chunks whole, yielding its lines without line breaks as str.splitlines()
+    would. The encoding is detected from the start of the file if not given.
+    A CRLF split between chunks yields an extra blank line.
+    """
+    sample = f.read(SAMPLE_SIZE)
+    if encoding is None:
+        encoding = detect_encoding(sample)
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    chunks = chain(
+        (sample[i : i + chunk_size] for i in range(0, len(sample), chunk_size)),
+        iter(lambda: f.read(chunk_size), b""),
+    )
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.splitlines()
+        if lines and pending[-1] not in LINE_BREAKS:
+            pending = lines.pop()
+        else:
+            pending = ""
+        yield from lines
+    pending += decoder.decode(b"", final=True)
+    yield from pending.splitlines()
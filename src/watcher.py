@@ -0,0 +1,192 @@
+"""
+Watch mode: import questions appended to the end of a source file after it was imported.
+
+The state of each watched question set is kept in the collection config, so that only the
+part of the file added since the last update is read and parsed.
+"""
+
+import hashlib
+import os
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from .gen_notes import add_notes, iter_blocks
+from .question_sets import fetch_question_set
+
+if TYPE_CHECKING:
+    from .search_index import SearchIndex
+
+WATCHES_CONFIG_KEY = "arqimporter_watches"
+# bytes before the read offset of a watched file compared on each poll, to tell a file
+# that was rewritten from one that was appended to
+ANCHOR_SIZE = 256
+
+
+def read_new_blocks(
+    path: str,
+    offset: int,
+    qa_marker: str,
+    question_marker: bool,
+    chapter_marker: Optional[str],
+    extra_marker: Optional[str],
+    chapter: Optional[List[str]] = None,
+) -> Tuple[List[Dict[str, str]], int, List[str]]:
+    """
+    Parse the blocks in the UTF-8 file at _path_ starting at byte _offset_, with the chapter
+    lines _chapter_ in effect there. The last block is held back, as more of its lines may
+    still be appended, as is a last line without a line break.
+    Returns the complete blocks, the offset the held back block starts at,
+    and the chapter lines in effect there.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    data = data[: data.rfind(b"\n") + 1]
+    lines: List[str] = []
+    line_offsets: List[int] = []
+    pos = offset
+    for raw_line in data.splitlines(keepends=True):
+        for line in raw_line.decode("utf-8-sig" if pos == 0 else "utf-8").splitlines():
+            line = line.strip()
+            if line:
+                lines.append(line)
+                line_offsets.append(pos)
+        pos += len(raw_line)
+    chapter = list(chapter or [])
+    blocks = list(
+        iter_blocks(
+            lines, qa_marker, question_marker, chapter_marker, extra_marker, chapter
+        )
+    )
+    if len(blocks) < 2:
+        return [], offset, chapter
+    complete = [block for _, block in blocks[:-1]]
+    last_chapter = complete[-1]["chapter"]
+    return (
+        complete,
+        line_offsets[blocks[-1][0]],
+        last_chapter.split("<br>") if last_chapter else [],
+    )
+
+
+def file_anchor(path: str, offset: int) -> str:
+    "Return the digest of the ANCHOR_SIZE bytes before _offset_ in the file at _path_."
+    with open(path, "rb") as f:
+        start = max(offset - ANCHOR_SIZE, 0)
+        f.seek(start)
+        return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+
+def get_watches(col: Any) -> Dict[str, Dict[str, Any]]:
+    "Return the map of watched question set titles to their watch state."
+    return col.get_config(WATCHES_CONFIG_KEY, default={})
+
+
+def watch_file(
+    col: Any,
+    title: str,
+    path: str,
+    offset: int,
+    chapter: Optional[List[str]],
+    deck_id: int,
+    tags: List[str],
+    qa_marker: str,
+    question_marker: bool,
+    chapter_marker: Optional[str],
+    extra_marker: Optional[str],
+    chapter_decks: bool = False,
+) -> None:
+    """
+    Start watching the file at _path_ for questions added to the question set from byte
+    _offset_ on, where the block held back by the import starts, with the chapter lines
+    _chapter_ in effect there. If _chapter_ is None, _offset_ is where the file ended when
+    the set was imported, and the chapter of its last question is in effect.
+    """
+    if chapter is None:
+        notes = fetch_question_set(col, title)
+        last_chapter = notes[-1].block["chapter"] if notes else ""
+        chapter = last_chapter.split("<br>") if last_chapter else []
+    watches = get_watches(col)
+    watches[title] = {
+        "path": path,
+        "offset": offset,
+        "anchor": file_anchor(path, offset),
+        "chapter": chapter,
+        "deck_id": deck_id,
+        "tags": tags,
+        "qa_marker": qa_marker,
+        "question_marker": question_marker,
+        "chapter_marker": chapter_marker,
+        "extra_marker": extra_marker,
+        "chapter_decks": chapter_decks,
+    }
+    col.set_config(WATCHES_CONFIG_KEY, watches)
+
+
+def unwatch_file(col: Any, title: str) -> None:
+    watches = get_watches(col)
+    if watches.pop(title, None) is not None:
+        col.set_config(WATCHES_CONFIG_KEY, watches)
+
+
+def poll_watches(
+    col: Any, note_constructor: Callable, index: Optional["SearchIndex"] = None
+) -> Tuple[Dict[str, int], Dict[str, str]]:
+    """
+    Add notes for the complete blocks appended to each watched file since the last poll.
+    Files that haven't changed size are only checked for their size. Files that were
+    rewritten rather than appended to, or that can't be decoded past the imported part,
+    are no longer watched, as reading them again from the stored offset would fail on
+    every poll.
+    Returns the number of added notes of each updated question set, and the reason each
+    file that is no longer watched was dropped for, by question set title.
+    """
+    watches = get_watches(col)
+    added: Dict[str, int] = {}
+    stopped: Dict[str, str] = {}
+    for title, state in list(watches.items()):
+        try:
+            size = os.path.getsize(state["path"])
+        except OSError:
+            continue
+        if size == state["offset"]:
+            continue
+        try:
+            if size < state["offset"] or state.get("anchor") not in (
+                None,
+                file_anchor(state["path"], state["offset"]),
+            ):
+                raise ValueError("تغير الملف قبل نهاية الجزء المستورد منه")
+            blocks, offset, chapter = read_new_blocks(
+                state["path"],
+                state["offset"],
+                state["qa_marker"],
+                state["question_marker"],
+                state["chapter_marker"],
+                state["extra_marker"],
+                state["chapter"],
+            )
+        except (UnicodeDecodeError, ValueError) as exc:
+            del watches[title]
+            stopped[title] = str(exc)
+            continue
+        if blocks:
+            old_blocks = [note.block for note in fetch_question_set(col, title)]
+            added[title] = add_notes(
+                col,
+                note_constructor,
+                title,
+                state["tags"],
+                [],
+                state["deck_id"],
+                prev_imported_number=len(old_blocks),
+                index=index,
+                blocks=old_blocks + blocks,
+                chapter_decks=state.get("chapter_decks", False),
+                ledger_options={"mode": "watch", **state},
+            )
+        state["offset"] = offset
+        state["anchor"] = file_anchor(state["path"], offset)
+        state["chapter"] = chapter
+    if added or stopped:
+        col.set_config(WATCHES_CONFIG_KEY, watches)
+    return added, stopped
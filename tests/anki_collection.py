@@ -0,0 +1,91 @@
+"""
+A real Anki collection in a temporary directory with the ARQ note type installed,
+for end-to-end tests and benchmarks that need the costs of the real database and media folder.
+Neither a main window nor network access is needed.
+"""
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    from anki.collection import Collection
+except ImportError:  # Anki isn't installed
+    Collection = None  # type: ignore
+
+if Collection is not None:
+    # the note type is built without aqt, so only anki needs to be installed
+    from src.models import ARQOne
+
+
+def anki_available() -> bool:
+    return Collection is not None
+
+
+class TempCollection:
+    "A collection in a temporary directory that's removed on close."
+
+    def __init__(self) -> None:
+        self.dir = tempfile.mkdtemp(prefix="arqimporter-col")
+        self.col = Collection(os.path.join(self.dir, "collection.anki2"))
+        model, version = ARQOne.to_model(self.col)
+        self.col.models.add(model)
+        self.col.set_config("arqimporter_model_version", version)
+
+    def db_size(self) -> int:
+        "Size of the database in bytes."
+        return self.col.db.scalar("pragma page_count") * self.col.db.scalar(
+            "pragma page_size"
+        )
+
+    def media_size(self) -> int:
+        media_dir = self.col.media.dir()
+        return sum(
+            os.path.getsize(os.path.join(media_dir, filename))
+            for filename in os.listdir(media_dir)
+        )
+
+    def close(self) -> None:
+        self.col.close(downgrade=False)
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def generate_text(questions: int, chapter_size: int = 100) -> List[str]:
+    "Return the cleansed lines of a text with _questions_ questions, in chapters marked with #."
+    lines = []
+    for i in range(1, questions + 1):
+        if i % chapter_size == 1:
+            lines.append(f"# الباب {i // chapter_size + 1}")
+        lines.append(f"السؤال رقم {i}؟")
+        lines.append(
+            f"{i:02}- أَحْمَدُ رَبِّي وَاهِبَ العُقُولِ .. وَصَلِّ يَارَبِّ عَلَى الرَّسُولِ **"
+        )
+        lines.append(
+            f"{i:02}- وَاكْتُبْ قَبُولَ نَظْمِيَ الصَّغِيرِ .. كَأَصْلِهِ مُخْتَصَرِ التَّحْرِيرِ **"
+        )
+    return lines
+
+
+class PhaseTimer:
+    "Accumulate the time spent in wrapped functions by phase name."
+
+    def __init__(self) -> None:
+        self.times: Dict[str, float] = defaultdict(float)
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.times[name] += time.perf_counter() - start
+
+        return wrapper
+
+    def summary(self, total: Optional[float] = None) -> str:
+        phases = [f"{name} {seconds:.2f}s" for name, seconds in self.times.items()]
+        if total is not None:
+            phases.append(f"other {total - sum(self.times.values()):.2f}s")
+        return ", ".join(phases)
@@ -0,0 +1,118 @@
+"""
+Frozen copies of parse_questions and cleanse_text as they were before any performance work.
+The differential tests in test_parser_fuzz.py use them as the reference semantics.
+Do not change them.
+"""
+from typing import List, Optional
+
+
+def parse_questions(
+    lines: List[str],
+    qa_marker: str,
+    question_marker: bool,
+    chapter_marker: Optional[str],
+    extra_marker: Optional[str],
+) -> List:
+    """
+    Parse question pairs. If _question_marker_ is true, treat the _qa_marker_ as a
+    separator between the question and the answer, otherwise treat it as a marker for the answer lines.
+    """
+
+    def is_chapter_line(i):
+        return (
+            i < len(lines)
+            and bool(chapter_marker)
+            and lines[i].startswith(chapter_marker)
+        )
+
+    def is_question_line(i):
+        if i >= len(lines):
+            return False
+        res = (
+            (qa_marker in lines[i]) if question_marker else (qa_marker not in lines[i])
+        )
+        res &= not is_chapter_line(i)
+
+        return res
+
+    def is_answer_line(i):
+        if i >= len(lines):
+            return False
+        res = (
+            (qa_marker in lines[i])
+            if not question_marker
+            else (qa_marker not in lines[i])
+        )
+        res &= (
+            not is_chapter_line(i) and not is_question_line(i) and not is_extra_line(i)
+        )
+
+        return res
+
+    def is_extra_line(i):
+        if i >= len(lines):
+            return False
+        res = bool(extra_marker) and lines[i].startswith(extra_marker)
+        res &= not is_chapter_line(i) and qa_marker not in lines[i]
+
+        return res
+
+    ret = []
+    cur_question = []
+    cur_answer = []
+    cur_chapter: List[str] = []
+    cur_extra = []
+
+    i = 0
+    while i < len(lines):
+        if is_chapter_line(i):
+            cur_chapter = []
+            while is_chapter_line(i):
+                cur_chapter.append(lines[i][len(chapter_marker) :].strip())
+                i += 1
+        while is_question_line(i):
+            cur_question.append(lines[i])
+            i += 1
+        while is_answer_line(i):
+            cur_answer.append(lines[i])
+            i += 1
+        while is_extra_line(i):
+            cur_extra.append(lines[i][len(extra_marker) :].strip())
+            i += 1
+        ret.append(
+            {
+                "question": "<br>".join(cur_question),
+                "answer": "<br>".join(cur_answer),
+                "chapter": "<br>".join(cur_chapter),
+                "extra": "<br>".join(cur_extra),
+            }
+        )
+        cur_question = []
+        cur_answer = []
+        cur_extra = []
+
+    return ret
+
+
+def cleanse_text(string: str) -> List[str]:
+    def _normalize_blank_lines(text_lines):
+        # remove consecutive lone newlines
+        new_text = []
+        last_line = ""
+        for i in text_lines:
+            if last_line.strip() or i.strip():
+                new_text.append(i)
+            last_line = i
+        # remove lone newlines at beginning and end
+        for i in (0, -1):
+            if not new_text[i].strip():
+                del new_text[i]
+        return new_text
+
+    text = string.splitlines()
+    text = [i.strip() for i in text]
+    text = _normalize_blank_lines(text)
+    # entirely remove all blank lines
+    text = [i for i in text if i.strip()]
+
+    return text
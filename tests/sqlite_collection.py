@@ -0,0 +1,220 @@
+"""
+A minimal stand-in for Anki's Collection, backed by an SQLite database with the notes
+table of Anki's schema and a media folder in a temporary directory, for tests and
+benchmarks of code that works with the database directly.
+"""
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+import weakref
+from typing import Any, Dict, Iterable, List, Optional
+
+FIELDS = (
+    "سؤال",
+    "جواب",
+    "رقم السؤال",
+    "عنوان",
+    "باب",
+    "كل الأسئلة",
+    "إضافي",
+    "مصادر",
+    "سياق",
+)
+
+
+class DBProxy:
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        # in Anki each call goes through the backend, which costs much more than here
+        self.calls = 0
+        self.conn.create_function(
+            "field_at_index", 2, lambda flds, i: flds.split("\x1f")[i]
+        )
+
+    def execute(self, sql: str, *args: Any) -> List:
+        self.calls += 1
+        return self.conn.execute(sql, args).fetchall()
+
+    def executemany(self, sql: str, args: Iterable) -> None:
+        self.calls += 1
+        self.conn.executemany(sql, args)
+
+    def all(self, sql: str, *args: Any) -> List:
+        return self.execute(sql, *args)
+
+    def list(self, sql: str, *args: Any) -> List:
+        return [row[0] for row in self.execute(sql, *args)]
+
+    def scalar(self, sql: str, *args: Any) -> Any:
+        return self.execute(sql, *args)[0][0]
+
+
+class SqliteNote:
+    "A note read from the notes table, with its fields by name like Anki's Note."
+
+    def __init__(self, nid: int, fields: List[str]):
+        self.id = nid
+        self.fields = fields
+
+    def __getitem__(self, name: str) -> str:
+        return self.fields[FIELDS.index(name)]
+
+    def __setitem__(self, name: str, value: str) -> None:
+        self.fields[FIELDS.index(name)] = value
+
+
+class Media:
+    def __init__(self, path: str):
+        self.path = path
+
+    def dir(self) -> str:
+        return self.path
+
+    def add_file(self, path: str) -> str:
+        filename = os.path.basename(path)
+        shutil.copyfile(path, os.path.join(self.path, filename))
+        return filename
+
+    def trash_files(self, filenames: Iterable[str]) -> None:
+        for filename in filenames:
+            os.remove(os.path.join(self.path, filename))
+
+    def write_data(self, filename: str, data: bytes) -> str:
+        path = os.path.join(self.path, filename)
+        assert not os.path.exists(path)
+        with open(path, "wb") as f:
+            f.write(data)
+        return filename
+
+
+class ModelManager:
+    def __init__(self, model: Dict):
+        self.model = model
+
+    def by_name(self, name: str) -> Optional[Dict]:
+        return self.model if name == self.model["name"] else None
+
+
+class SqliteCollection:
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self.db = DBProxy(path)
+        self.db.execute(
+            "create table notes (id integer primary key, guid text, mid integer, "
+            "mod integer, usn integer, tags text, flds text, sfld text, csum integer, "
+            "flags integer, data text)"
+        )
+        self.models = ModelManager(
+            {
+                "id": 1,
+                "name": "ARQ 1.0",
+                "sortf": FIELDS.index("رقم السؤال"),
+                "flds": [{"name": name, "ord": i} for i, name in enumerate(FIELDS)],
+            }
+        )
+        self.media = Media(tempfile.mkdtemp())
+        weakref.finalize(self, shutil.rmtree, self.media.dir(), True)
+        self.config: Dict[str, str] = {}
+        # names of the undo entries notes were updated in
+        self.undo_entries: List[str] = []
+
+    def add_notes(self, notes: Iterable[Dict[str, str]]) -> None:
+        "Insert notes given as {field name: value}, numbering their IDs from 1."
+        start = self.db.scalar("select count() from notes")
+        self.db.executemany(
+            "insert into notes values (?, '', 1, ?, 0, '', ?, '', 0, 0, '')",
+            (
+                (
+                    start + i + 1,
+                    int(time.time()),
+                    "\x1f".join(note.get(name, "") for name in FIELDS),
+                )
+                for i, note in enumerate(notes)
+            ),
+        )
+
+    def add_note(self, note: Any, deck_id: int) -> None:
+        "Insert a note with its fields by name, like Anki's Note, giving it the next ID."
+        note.id = self.db.scalar("select coalesce(max(id), 0) + 1 from notes")
+        self.db.execute(
+            "insert into notes values (?, '', 1, ?, 0, ?, ?, '', 0, 0, '')",
+            note.id,
+            int(time.time()),
+            " ".join(note.tags),
+            "\x1f".join(note[name] if name in note else "" for name in FIELDS),
+        )
+
+    def find_notes(self, query: str) -> List[int]:
+        "Only the search for the notes of a question set the add-on makes is supported."
+        match = re.fullmatch(r'"note:[^"]*" "عنوان:((?:[^"\\]|\\.)*)"', query)
+        assert match, query
+        return self.db.list(
+            "select id from notes where field_at_index(flds, ?) = ? order by id",
+            FIELDS.index("عنوان"),
+            re.sub(r"\\(.)", r"\1", match.group(1)),
+        )
+
+    def find_and_replace(
+        self,
+        note_ids: List[int],
+        search: str,
+        replacement: str,
+        regex: bool,
+        field_name: str,
+    ) -> int:
+        changed = []
+        for nid in note_ids:
+            note = self.get_note(nid)
+            value = re.sub(
+                search if regex else re.escape(search), replacement, note[field_name]
+            )
+            if value != note[field_name]:
+                note[field_name] = value
+                changed.append(note)
+        self.update_notes(changed)
+        return len(changed)
+
+    def get_note(self, nid: int) -> SqliteNote:
+        return SqliteNote(
+            nid,
+            self.db.scalar("select flds from notes where id = ?", nid).split("\x1f"),
+        )
+
+    def update_notes(self, notes: List[SqliteNote]) -> None:
+        self.db.executemany(
+            "update notes set flds = ?, mod = ?, usn = ? where id = ?",
+            (
+                ("\x1f".join(note.fields), int(time.time()), self.usn(), note.id)
+                for note in notes
+            ),
+        )
+
+    def add_custom_undo_entry(self, name: str) -> int:
+        self.undo_entries.append(name)
+        return len(self.undo_entries)
+
+    def merge_undo_entries(self, target: int) -> None:
+        assert target == len(self.undo_entries)
+
+    def remove_notes(self, nids: List[int]) -> None:
+        self.db.execute("delete from notes where id in (%s)" % ",".join(map(str, nids)))
+
+    def note_count(self) -> int:
+        return self.db.scalar("select count() from notes")
+
+    def usn(self) -> int:
+        return -1
+
+    # values are stored as JSON like Anki does, so that changes to them aren't saved by accident
+    def get_config(self, key: str, default: Any = None) -> Any:
+        return json.loads(self.config[key]) if key in self.config else default
+
+    def set_config(self, key: str, value: Any) -> None:
+        self.config[key] = json.dumps(value)
+
+    def remove_config(self, key: str) -> None:
+        self.config.pop(key, None)
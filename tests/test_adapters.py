@@ -0,0 +1,113 @@
+import os
+import tempfile
+import unittest
+
+from src.adapters import read_delimited, read_markdown, read_structured_file
+
+
+class TestAdapters(unittest.TestCase):
+    def test_csv(self):
+        lines = [
+            'ما الحمد؟,"الثناء على المحمود\r',
+            'بصفاته الحسنة",الباب الأول',
+            "ما الشكر؟,الثناء على المنعم بنعمته,,فرق بينهما",
+            "سؤال بلا جواب؟",
+            ",,الباب الثاني",
+            "ما الصبر؟,حبس النفس,",
+        ]
+        blocks = list(read_delimited(lines, ","))
+        self.assertEqual(
+            blocks,
+            [
+                {
+                    "question": "ما الحمد؟",
+                    "answer": "الثناء على المحمود<br>بصفاته الحسنة",
+                    "chapter": "الباب الأول",
+                    "extra": "",
+                },
+                {
+                    "question": "ما الشكر؟",
+                    "answer": "الثناء على المنعم بنعمته",
+                    "chapter": "الباب الأول",
+                    "extra": "فرق بينهما",
+                },
+                {
+                    "question": "سؤال بلا جواب؟",
+                    "answer": "",
+                    "chapter": "الباب الأول",
+                    "extra": "",
+                },
+                {
+                    "question": "ما الصبر؟",
+                    "answer": "حبس النفس",
+                    "chapter": "الباب الثاني",
+                    "extra": "",
+                },
+            ],
+        )
+
+    def test_header_columns(self):
+        lines = ["الباب\tالجواب\tالسؤال", "الأول\tجواب\tسؤال؟"]
+        columns = {"question": "السؤال", "answer": "الجواب", "chapter": "الباب"}
+        self.assertEqual(
+            list(read_delimited(lines, "\t", columns, header=True)),
+            [{"question": "سؤال؟", "answer": "جواب", "chapter": "الأول", "extra": ""}],
+        )
+        with self.assertRaises(ValueError):
+            list(read_delimited(lines, "\t", {"question": "المسألة"}, header=True))
+
+    def test_markdown(self):
+        lines = [
+            "مقدمة لا تستورد",
+            "# الباب الأول",
+            "## الفصل الأول",
+            "- ما الحمد؟",
+            "  الثناء على المحمود",
+            "  - بصفاته الحسنة",
+            "> تعريف لغوي",
+            "1. ما الشكر؟",
+            "الثناء على المنعم",
+            "# الباب الثاني #",
+            "* ما الصبر؟",
+        ]
+        self.assertEqual(
+            list(read_markdown(lines)),
+            [
+                {
+                    "question": "ما الحمد؟",
+                    "answer": "الثناء على المحمود<br>بصفاته الحسنة",
+                    "chapter": "الباب الأول<br>الفصل الأول",
+                    "extra": "تعريف لغوي",
+                },
+                {
+                    "question": "ما الشكر؟",
+                    "answer": "الثناء على المنعم",
+                    "chapter": "الباب الأول<br>الفصل الأول",
+                    "extra": "",
+                },
+                {
+                    "question": "ما الصبر؟",
+                    "answer": "",
+                    "chapter": "الباب الثاني",
+                    "extra": "",
+                },
+            ],
+        )
+
+    def test_structured_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "أسئلة.tsv")
+            with open(path, "w", encoding="utf-16") as f:
+                f.write("سؤال؟\tجواب\n")
+            self.assertEqual(
+                read_structured_file(path),
+                [{"question": "سؤال؟", "answer": "جواب", "chapter": "", "extra": ""}],
+            )
+            path = os.path.join(tmpdir, "أسئلة.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("سؤال؟\tجواب\n")
+            self.assertIsNone(read_structured_file(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,196 @@
+"""
+End-to-end tests of importing into a real Anki collection, skipped if Anki isn't installed.
+
+Set ARQ_BENCHMARK_NOTES to a number of questions to time the import phases at a tenth,
+and all, of that number.
+"""
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+from src import gen_notes
+from src.gen_notes import add_notes, insert_notes, plan_notes
+from src.question_sets import (
+    UNDO_NAME,
+    fetch_question_set,
+    get_media_refs,
+    write_note_fields,
+)
+from src.search_index import SearchIndex
+
+from .anki_collection import PhaseTimer, TempCollection, anki_available, generate_text
+
+BENCHMARK_NOTES = int(os.environ.get("ARQ_BENCHMARK_NOTES", "0"))
+
+if anki_available():
+    from anki.notes import Note
+
+
+@unittest.skipUnless(anki_available(), "Anki isn't installed")
+class TestCollection(unittest.TestCase):
+    def setUp(self):
+        self.temp = TempCollection()
+        self.col = self.temp.col
+        self.index = SearchIndex(os.path.join(self.temp.dir, "search.db"))
+
+    def tearDown(self):
+        self.index.close()
+        self.temp.close()
+
+    def import_text(self, lines, **kwargs):
+        return add_notes(
+            self.col,
+            Note,
+            "مجموعة",
+            [],
+            lines,
+            1,
+            "؟",
+            True,
+            "#",
+            None,
+            index=self.index,
+            **kwargs,
+        )
+
+    def test_import_and_insert(self):
+        lines = generate_text(250)
+        self.assertEqual(self.import_text(lines), 250)
+        notes = fetch_question_set(self.col, "مجموعة")
+        self.assertEqual([note.seq for note in notes], list(range(1, 251)))
+        filename = get_media_refs(self.col)["مجموعة"]
+        self.assertTrue(os.path.exists(os.path.join(self.col.media.dir(), filename)))
+
+        # before the third question
+        lines[7:7] = ["سؤال مدرج؟", "جواب مدرج"]
+        self.assertEqual(
+            insert_notes(
+                self.col, Note, "مجموعة", [], lines, 1, "؟", True, "#", None, self.index
+            ),
+            1,
+        )
+        notes = fetch_question_set(self.col, "مجموعة")
+        self.assertEqual(len(notes), 251)
+        self.assertEqual(notes[2].block["question"], "سؤال مدرج؟")
+        self.assertEqual(notes[-1].block["question"], "السؤال رقم 250؟")
+        new_filename = get_media_refs(self.col)["مجموعة"]
+        self.assertNotEqual(new_filename, filename)
+        self.assertEqual(
+            {note.media for note in notes}, {f'<img src="{new_filename}">'}
+        )
+        self.assertFalse(os.path.exists(os.path.join(self.col.media.dir(), filename)))
+        self.assertEqual(self.index.search("مدرج")[0].seq, 3)
+
+    def test_write_note_fields(self):
+        "Written notes get the sort field and checksum Anki gives them, in one undo step."
+        model = self.col.models.by_name("ARQ 1.0")
+        values = [
+            '<b>سؤال</b>&nbsp;<img src="صورة.png">؟',
+            " 12 &amp; <i>13</i> ",
+            "<div>فقرة</div><br>",
+        ]
+        written = []
+        for value in values:
+            note = Note(self.col, model)
+            note.fields = [value] * len(note.fields)
+            self.col.add_note(note, 1)
+            written.append(Note(self.col, model))
+            self.col.add_note(written[-1], 1)
+            write_note_fields(self.col, model, [(written[-1].id, note.fields)])
+            self.assertEqual(
+                self.col.db.first(
+                    "select flds, sfld, csum from notes where id = ?", written[-1].id
+                ),
+                self.col.db.first(
+                    "select flds, sfld, csum from notes where id = ?", note.id
+                ),
+            )
+        self.assertEqual(self.col.undo_status().undo, UNDO_NAME)
+
+
+@unittest.skipUnless(
+    anki_available() and BENCHMARK_NOTES, "set ARQ_BENCHMARK_NOTES to run"
+)
+class TestCollectionBenchmark(unittest.TestCase):
+    def run_import(self, questions):
+        temp = TempCollection()
+        index = SearchIndex(os.path.join(temp.dir, "search.db"))
+        timer = PhaseTimer()
+        lines = generate_text(questions)
+        patches = [
+            mock.patch.object(
+                gen_notes,
+                "parse_questions",
+                timer.wrap("parse", gen_notes.parse_questions),
+            ),
+            mock.patch.object(
+                gen_notes,
+                "save_question_set_media",
+                timer.wrap("media", gen_notes.save_question_set_media),
+            ),
+            mock.patch.object(
+                gen_notes,
+                "relink_question_set",
+                timer.wrap("relink", gen_notes.relink_question_set),
+            ),
+            mock.patch.object(
+                gen_notes,
+                "update_note_fields",
+                timer.wrap("renumber", gen_notes.update_note_fields),
+            ),
+            mock.patch.object(index, "add", timer.wrap("search index", index.add)),
+        ]
+        for patcher in patches:
+            patcher.start()
+        try:
+            start = time.perf_counter()
+            plan_notes(temp.col, "مجموعة", lines, 1, "؟", True, "#", None)
+            print(
+                f"plan {questions}: {time.perf_counter() - start:.2f}s",
+                file=sys.stderr,
+            )
+            start = time.perf_counter()
+            add_notes(
+                temp.col, Note, "مجموعة", [], lines, 1, "؟", True, "#", None, 0, index
+            )
+            total = time.perf_counter() - start
+            print(
+                f"import {questions}: {total:.2f}s ({timer.summary(total)}), "
+                f"database {temp.db_size() / 2**20:.1f} MiB, "
+                f"media {temp.media_size() / 2**20:.1f} MiB",
+                file=sys.stderr,
+            )
+            # insert a question in the middle of every chapter, renumbering the notes after it
+            positions = [
+                i
+                for i, line in enumerate(lines)
+                if line.startswith("السؤال رقم") and line.endswith("50؟")
+            ]
+            for i in reversed(positions):
+                lines[i:i] = [f"سؤال مدرج {i}؟", "جواب مدرج"]
+            timer.times.clear()
+            start = time.perf_counter()
+            insert_notes(
+                temp.col, Note, "مجموعة", [], lines, 1, "؟", True, "#", None, index
+            )
+            total = time.perf_counter() - start
+            print(
+                f"insert into {questions}: {total:.2f}s ({timer.summary(total)}), "
+                f"database {temp.db_size() / 2**20:.1f} MiB",
+                file=sys.stderr,
+            )
+        finally:
+            for patcher in patches:
+                patcher.stop()
+            index.close()
+            temp.close()
+
+    def test_scales(self):
+        for questions in (BENCHMARK_NOTES // 10, BENCHMARK_NOTES):
+            self.run_import(questions)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.exporter import export_question_set, format_question_set
+from src.gen_notes import cleanse_text, parse_questions
+from src.question_sets import record_import
+
+from .sqlite_collection import SqliteCollection
+from .test_gen_notes import test_text, test_text2
+
+
+class TestExporter(unittest.TestCase):
+    def assertRoundTrips(self, text, *args):
+        blocks = parse_questions(cleanse_text(text), *args)
+        exported = "\n".join(format_question_set(blocks, args[2], args[3]))
+        self.assertEqual(parse_questions(cleanse_text(exported), *args), blocks)
+
+    def test_round_trip(self):
+        lines = cleanse_text(test_text)
+        lines.insert(30, "# باب الأدلة")
+        lines.insert(31, "# فصل الكتاب")
+        text = "\n".join(lines)
+        self.assertRoundTrips(text, "؟", True, "#", None)
+        self.assertRoundTrips(text, "-", False, "#", None)
+        self.assertRoundTrips(test_text2, "؟", True, None, "$")
+
+    def test_chapters_written_once(self):
+        blocks = parse_questions(cleanse_text(test_text), "؟", True, "#", None)
+        lines = list(format_question_set(blocks))
+        self.assertEqual(lines[0], "# النظم الصغير")
+        self.assertEqual(sum(line.startswith("#") for line in lines), 1)
+
+    def test_conflicting_lines(self):
+        block = {"question": "سؤال؟", "answer": "جواب", "chapter": "", "extra": ""}
+        for changes, markers in (
+            ({"answer": "# ليس بابًا"}, ("#", "$")),
+            ({"answer": "جواب<br>$ ليس إضافيًا"}, ("#", "$")),
+            ({"chapter": "باب"}, (None, "$")),
+            ({"extra": "إضافي؟"}, ("#", "$", "؟")),
+        ):
+            with self.subTest(changes=changes):
+                with self.assertRaises(ValueError):
+                    list(format_question_set([dict(block, **changes)], *markers))
+        # the same lines are fine with other markers
+        self.assertEqual(
+            list(format_question_set([dict(block, answer="# $ جواب")], "@", "!")),
+            ["سؤال؟", "# $ جواب"],
+        )
+
+    def test_export_with_import_markers(self):
+        "A set is exported with the markers it was imported with, and parses back the same."
+        text = "@ باب\nسؤال؟\n# جواب\n! إضافي\nسؤال آخر؟\n$ جواب آخر"
+        args = ("؟", True, "@", "!")
+        blocks = parse_questions(cleanse_text(text), *args)
+        col = SqliteCollection()
+        col.add_notes(
+            {
+                "سؤال": block["question"],
+                "جواب": block["answer"],
+                "باب": block["chapter"],
+                "إضافي": block["extra"],
+                "رقم السؤال": str(seq),
+                "عنوان": "مجموعة",
+            }
+            for seq, block in enumerate(blocks, 1)
+        )
+        options = dict(
+            qa_marker="؟", question_marker=True, chapter_marker="@", extra_marker="!"
+        )
+        record_import(col, "مجموعة", [1, 2], "arq-1.js", options)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "export.txt")
+        self.assertEqual(export_question_set(col, "مجموعة", path), 2)
+        with open(path, encoding="utf-8") as f:
+            self.assertEqual(parse_questions(cleanse_text(f.read()), *args), blocks)
+
+        # the usual markers would turn the answers into a chapter and extra lines
+        col.set_config("arqimporter_ledger", [])
+        with self.assertRaises(ValueError):
+            export_question_set(col, "مجموعة", path)
+
+
+if __name__ == "__main__":
+    unittest.main()
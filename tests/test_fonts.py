@@ -0,0 +1,66 @@
+import os
+import unittest
+from unittest import mock
+
+from src import fonts
+
+from .sqlite_collection import SqliteCollection
+
+
+def fake_subset(path, characters):
+    "The characters a subset of the font covers instead of the font."
+    return "".join(sorted(characters)).encode()
+
+
+class TestFonts(unittest.TestCase):
+    def setUp(self):
+        self.col = SqliteCollection()
+        self.dir = self.col.media.dir()
+        # only the regular font is installed
+        with open(os.path.join(self.dir, "_Sh_LoutsSh.ttf"), "wb") as f:
+            f.write(b"font")
+        patcher = mock.patch.object(fonts, "subset_font", fake_subset)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def subset(self):
+        with open(
+            os.path.join(self.dir, "_arq-font-500.woff2"), encoding="utf-8", newline=""
+        ) as f:
+            return set(f.read())
+
+    def test_text_characters(self):
+        self.assertEqual(
+            fonts.text_characters(["<b>سُؤال</b>&nbsp;", '<img src="arq-1.js">']),
+            set("سُؤال "),
+        )
+
+    def test_incremental_update(self):
+        self.assertEqual(
+            fonts.update_font_subsets(self.col, ["بِسْمِ"]), ["_arq-font-500.woff2"]
+        )
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "_arq-font-700.woff2")))
+        self.assertEqual(self.subset(), fonts.BASE_CHARACTERS)
+
+        # nothing to do without new characters
+        self.assertEqual(fonts.update_font_subsets(self.col, ["مِسْب"]), [])
+        self.assertEqual(
+            fonts.update_font_subsets(self.col, ["ﷺ"]), ["_arq-font-500.woff2"]
+        )
+        self.assertEqual(self.subset(), fonts.BASE_CHARACTERS | {"ﷺ"})
+
+        # a deleted subset is written again
+        os.remove(os.path.join(self.dir, "_arq-font-500.woff2"))
+        self.assertEqual(
+            fonts.update_font_subsets(self.col, []), ["_arq-font-500.woff2"]
+        )
+
+        self.col.add_notes([{"سؤال": "سؤال﴾؟", "عنوان": "أ"}])
+        fonts.update_font_subsets(
+            self.col, fonts.collection_texts(self.col), rebuild=True
+        )
+        self.assertEqual(self.subset(), fonts.BASE_CHARACTERS | {"﴾"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,23 @@
+import base64
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 
 from src.gen_notes import *
+from src.neighbor_context import CONTEXT_SIZE, render_context
+from src.question_sets import (
+    QuestionSetMedia,
+    fetch_question_set,
+    get_media_refs,
+    media_ref,
+)
+
+from .sqlite_collection import SqliteCollection
 
 # TODO: put chapter markers
 test_text = """
@@ -171,33 +188,38 @@ $ ٣٠٠ لتر تقريبا
 """
 
 
-class MockModel:
+class MockDecks:
     def __init__(self):
-        self.properties = {}
+        self.ids = {"Default": 1}
+        self.lookups = 0
+
+    def name(self, did):
+        return next(name for name, i in self.ids.items() if i == did)
 
-    def __call__(self):
-        return self.properties
+    def id(self, name):
+        self.lookups += 1
+        return self.ids.setdefault(name, len(self.ids) + 1)
 
-    def by_name(self, name):
-        return self
 
+class MockCollection(SqliteCollection):
+    "Keeps the added notes as they were added, besides storing them in the notes table."
 
-class MockCollection:
     def __init__(self):
+        super().__init__()
         self.notes = []
+        self.decks = MockDecks()
+        self.path = "/profiles/تجربة/collection.anki2"
 
     def add_note(self, note, deck_id):
+        super().add_note(note, deck_id)
         self.notes.append(note)
-
-    @property
-    def models(self):
-        return MockModel()
+        note.deck_id = deck_id
 
 
 class MockNote:
     def __init__(self, collection, ntype):
         self.collection = collection
-        self.note_type = ntype
+        self.model = ntype
         self.tags = []
         self.properties = {}
 
@@ -213,6 +235,9 @@ class MockNote:
     def __contains__(self, item):
         return item in self.properties
 
+    def note_type(self):
+        return self.model
+
 
 def mock_note():
     col = MockCollection()
@@ -288,6 +313,136 @@ class TestGenNotes(unittest.TestCase):
         notes = self.mock_note["col"].notes
         self.assertEqual(notes[0]["إضافي"], "٣٠٠ لتر تقريبا")
 
+    def test_media_named_by_contents(self):
+        add_notes(**self.mock_note)
+        notes = self.mock_note["col"].notes
+        self.assertRegex(notes[0]["كل الأسئلة"], r'^<img src="arq-[0-9a-f]{40}\.js">$')
+        for note in notes:
+            self.assertEqual(note["كل الأسئلة"], notes[0]["كل الأسئلة"])
+
+        other = mock_note()
+        other["title"] = "Other title"
+        add_notes(**other)
+        self.assertEqual(other["col"].notes[0]["كل الأسئلة"], notes[0]["كل الأسئلة"])
+
+        other = mock_note()
+        other["text"] = other["text"][:-1]
+        add_notes(**other)
+        self.assertNotEqual(other["col"].notes[0]["كل الأسئلة"], notes[0]["كل الأسئلة"])
+
+    def test_stored_notes(self):
+        "The added notes get their contexts and reference the saved media file."
+        add_notes(**self.mock_note)
+        col = self.mock_note["col"]
+        notes = fetch_question_set(col, "Hello")
+        self.assertEqual(len(notes), 57)
+        blocks = [note.block for note in notes]
+        for i, note in enumerate(notes):
+            self.assertEqual(note.context, render_context(blocks, i, CONTEXT_SIZE))
+        filename = get_media_refs(col)["Hello"]
+        self.assertTrue(os.path.exists(os.path.join(col.media.dir(), filename)))
+        self.assertEqual({note.media for note in notes}, {media_ref(filename)})
+
+    def test_streamed_media(self):
+        lines = parse_questions(self.mock_note["text"], "؟", True, "#", None)
+        media = QuestionSetMedia(render_question_set(lines))
+        with open(media.path, "rb") as f:
+            data = f.read()
+        media.discard()
+        self.assertFalse(os.path.exists(media.path))
+        self.assertEqual(data.decode(), "".join(render_question_set(lines)))
+        self.assertEqual(media.size, len(data))
+        self.assertEqual(media.filename, f"arq-{hashlib.sha1(data).hexdigest()}.js")
+        self.assertTrue(data.startswith('var ARQText = "<div><div>مقدمة'.encode()))
+
+    def test_failed_media(self):
+        "The temporary directory of a file that can't be written is removed."
+
+        def chunks():
+            yield "var ARQText = "
+            raise OSError("disk full")
+
+        temp = tempfile.mkdtemp()
+        try:
+            with mock.patch.object(tempfile, "tempdir", temp):
+                with self.assertRaises(OSError):
+                    QuestionSetMedia(chunks(), compress=True)
+            self.assertEqual(os.listdir(temp), [])
+        finally:
+            shutil.rmtree(temp)
+
+    def test_compressed_media(self):
+        lines = parse_questions(self.mock_note["text"], "؟", True, "#", None)
+        plain = "".join(render_question_set(lines)).encode()
+        # one chunk per character, to cross the groups of base64 in every way
+        media = QuestionSetMedia(iter(plain.decode()), compress=True)
+        with open(media.path, "rb") as f:
+            data = f.read()
+        media.discard()
+        self.assertEqual(media.raw_size, len(plain))
+        self.assertEqual(media.size, len(data))
+        self.assertLess(media.size * 2, media.raw_size)
+        prefix = b'var ARQCompressed = "'
+        self.assertTrue(data.startswith(prefix) and data.endswith(b'";'))
+        self.assertEqual(
+            gzip.decompress(base64.b64decode(data[len(prefix) : -2])), plain
+        )
+        other = QuestionSetMedia(render_question_set(lines), compress=True)
+        other.discard()
+        self.assertEqual(other.filename, media.filename)
+
+    def test_chapter_index(self):
+        lines = cleanse_text(test_text)
+        lines.insert(30, "# باب الأدلة")
+        blocks = parse_questions(lines, "؟", True, "#", None)
+        media = "".join(render_question_set(blocks))
+        text_line, chapters_line = media.split("\n")
+        text = json.loads(text_line[len("var ARQText = ") : -1])
+        chapters = json.loads(chapters_line[len("var ARQChapters = ") : -1])
+        self.assertEqual(
+            [(c["name"], c["start"], c["end"]) for c in chapters],
+            [("النظم الصغير", 1, 12), ("باب الأدلة", 13, 58)],
+        )
+        utf16 = text.encode("utf-16-le")
+        for chapter in chapters:
+            html = utf16[
+                chapter["offset"] * 2 : (chapter["offset"] + chapter["length"]) * 2
+            ].decode("utf-16-le")
+            self.assertEqual(
+                html.count("<div><div>"), chapter["end"] - chapter["start"] + 1
+            )
+            self.assertIn(blocks[chapter["start"] - 1]["question"], html)
+        self.assertEqual(sum(c["length"] for c in chapters), len(utf16) // 2)
+
+    def test_line_table(self):
+        blocks = parse_questions(self.mock_note["text"], "؟", True, "#", None)
+        media = "".join(render_line_table(blocks))
+        blocks_line, lines_line, chapters_line = media.split("\n")
+        table = json.loads(blocks_line[len("var ARQBlocks = ") : -1])
+        lines = json.loads(lines_line[len("var ARQLines = ") : -1])
+        chapters = json.loads(chapters_line[len("var ARQChapters = ") : -1])
+        self.assertEqual(
+            [
+                {
+                    "question": question,
+                    "answer": "<br>".join(lines[i] for i in ids),
+                    "chapter": "النظم الصغير",
+                    "extra": extra,
+                }
+                for question, ids, extra in table
+            ],
+            blocks,
+        )
+        self.assertEqual(chapters, [{"name": "النظم الصغير", "start": 1, "end": 57}])
+        self.assertLess(len(lines), sum(len(ids) for _, ids, _ in table))
+
+        # verses are repeated as the answers of several questions of the test text
+        self.assertTrue(use_line_table(blocks))
+        self.assertTrue("".join(render_media(blocks)).startswith("var ARQBlocks"))
+        unique = [dict(block, answer=str(i)) for i, block in enumerate(blocks)]
+        self.assertFalse(use_line_table(unique))
+        self.assertTrue("".join(render_media(unique)).startswith("var ARQText"))
+
     def test_previously_imported_notes(self):
         self.mock_note["prev_imported_number"] = 2
         added = add_notes(**self.mock_note)
@@ -306,6 +461,110 @@ class TestGenNotes(unittest.TestCase):
         )
         self.assertEqual(notes[1]["رقم السؤال"], "4")
 
+    def test_chapter_decks(self):
+        lines = cleanse_text(test_text)
+        lines.insert(30, "# باب الأدلة")
+        lines.insert(31, "# فصل <b>الكتاب</b>")
+        self.mock_note["text"] = lines
+        add_notes(**self.mock_note, chapter_decks=True)
+        col = self.mock_note["col"]
+        self.assertEqual(
+            col.decks.ids,
+            {
+                "Default": 1,
+                "Default::النظم الصغير": 2,
+                "Default::باب الأدلة::فصل الكتاب": 3,
+            },
+        )
+        self.assertEqual(col.decks.lookups, 2)
+        for note in col.notes:
+            self.assertEqual(note.deck_id, 2 if note["باب"] == "النظم الصغير" else 3)
+        self.assertEqual(chapter_deck_name("Default", ""), "Default")
+
+
+class TestParallelParsing(unittest.TestCase):
+    def setUp(self) -> None:
+        lines = cleanse_text(test_text)
+        # put a chapter before every fifth question, with some consecutive chapter lines
+        self.lines = []
+        for i, line in enumerate(lines):
+            if i % 11 == 0:
+                self.lines.append(f"# باب {i}")
+                if i % 2 == 0:
+                    self.lines.append(f"# فصل {i}")
+            self.lines.append(line)
+
+    def test_split_at_chapters(self):
+        ranges = split_at_chapters(self.lines, "#", 4)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], len(self.lines))
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+            self.assertTrue(self.lines[start].startswith("#"))
+            self.assertFalse(self.lines[start - 1].startswith("#"))
+
+    def test_matches_serial_parsing(self):
+        for lines in (self.lines, self.lines[3:], cleanse_text(test_text)):
+            for args in (("؟", True, "#", None), ("-", False, "#", "$")):
+                self.assertEqual(
+                    parse_questions_parallel(lines, *args, max_workers=2, min_lines=0),
+                    parse_questions(lines, *args),
+                )
+
+
+class TestInsertedBlocks(unittest.TestCase):
+    def setUp(self) -> None:
+        self.blocks = parse_questions(cleanse_text(test_text), "؟", True, "#", None)
+
+    def test_insertions(self):
+        new_blocks = list(self.blocks)
+        extra_block = {
+            "question": "سؤال جديد؟",
+            "answer": "",
+            "chapter": "",
+            "extra": "",
+        }
+        new_blocks.insert(40, extra_block)
+        new_blocks.insert(2, extra_block)
+        new_blocks.append(extra_block)
+        inserted, positions = align_inserted_blocks(self.blocks, new_blocks)
+        self.assertEqual(inserted, [2, 41, 59])
+        self.assertEqual(positions[:2], [0, 1])
+        self.assertEqual(positions[2:40], list(range(3, 41)))
+        self.assertEqual(positions[40:], list(range(42, 59)))
+
+    def test_insert_notes(self):
+        col = MockCollection()
+        kwargs = dict(
+            col=col,
+            note_constructor=MockNote,
+            title="Hello",
+            tags=[],
+            text=[],
+            deck_id=1,
+        )
+        add_notes(**kwargs, blocks=self.blocks[:2] + self.blocks[3:])
+        old_filename = get_media_refs(col)["Hello"]
+        self.assertEqual(insert_notes(**kwargs, blocks=self.blocks), 1)
+        notes = fetch_question_set(col, "Hello")
+        self.assertEqual([note.block for note in notes], self.blocks)
+        self.assertEqual(notes[2].nid, 57)
+        for i, note in enumerate(notes):
+            self.assertEqual(note.context, render_context(self.blocks, i, CONTEXT_SIZE))
+        filename = get_media_refs(col)["Hello"]
+        self.assertEqual({note.media for note in notes}, {media_ref(filename)})
+        # the media file of the set before the insertion isn't used anymore
+        self.assertEqual(os.listdir(col.media.dir()), [filename])
+        self.assertNotEqual(filename, old_filename)
+
+    def test_changed_question(self):
+        new_blocks = list(self.blocks)
+        new_blocks[5] = dict(new_blocks[5], answer="جواب آخر")
+        with self.assertRaises(ValueError):
+            align_inserted_blocks(self.blocks, new_blocks)
+        with self.assertRaises(ValueError):
+            align_inserted_blocks(self.blocks, self.blocks[1:])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from src import gen_notes, metrics, paths
+from src.import_checkpoint import (
+    discard_unrecorded_notes,
+    pending_import,
+    resumed_job,
+    write_checkpoint,
+)
+from src.import_queue import run_import_job
+from src.question_sets import get_import_ledger
+
+from .sqlite_collection import SqliteCollection
+from .test_gen_notes import MockCollection, MockNote, test_text
+from .test_import_queue import make_job
+
+
+class ConfigCollection(MockCollection):
+    def __init__(self):
+        super().__init__()
+        self.crash_at = None
+
+    def add_note(self, note, deck_id):
+        if len(self.notes) == self.crash_at:
+            raise SystemExit
+        super().add_note(note, deck_id)
+
+
+class TestImportCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.metrics_dir = tempfile.mkdtemp()
+        for patcher in (
+            mock.patch.object(paths, "USER_FILES_DIR", self.dir),
+            mock.patch.object(
+                metrics,
+                "METRICS_PATH",
+                os.path.join(self.metrics_dir, "import_metrics.jsonl"),
+            ),
+            mock.patch.object(gen_notes, "CHUNK_SIZE", 10),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+        shutil.rmtree(self.metrics_dir)
+
+    def test_resume(self):
+        col = ConfigCollection()
+        col.crash_at = 25
+        with self.assertRaises(SystemExit):
+            run_import_job(col, MockNote, make_job("كبيرة", test_text))
+        checkpoint = pending_import(col)
+        self.assertEqual(checkpoint["last_seq"], 20)
+        self.assertEqual(
+            sorted(os.listdir(self.dir)),
+            [
+                "checkpoint-تجربة-%s.json" % checkpoint["source_digest"],
+                "checkpoint-تجربة.json",
+            ],
+        )
+        # nothing is synced to devices where the job file doesn't exist
+        self.assertEqual(col.config, {})
+        other_profile = ConfigCollection()
+        other_profile.path = "/profiles/أخرى/collection.anki2"
+        self.assertIsNone(pending_import(other_profile))
+
+        job = resumed_job(col)
+        self.assertEqual(job["prev_imported_number"], 20)
+        self.assertEqual(len(job["blocks"]), 57)
+        self.assertEqual(discard_unrecorded_notes(col), 5)
+        del col.notes[20:]
+        col.crash_at = None
+        with mock.patch.object(gen_notes, "parse_questions_parallel") as parse:
+            self.assertEqual(run_import_job(col, MockNote, job), 37)
+        parse.assert_not_called()
+        self.assertEqual(
+            [int(note["رقم السؤال"]) for note in col.notes], list(range(1, 58))
+        )
+        self.assertIsNone(pending_import(col))
+        self.assertEqual(os.listdir(self.dir), [])
+        # the notes added before the crash are reverted with the rest
+        [entry] = get_import_ledger(col)
+        self.assertEqual(
+            (entry["first_nid"], entry["last_nid"], entry["count"]), (1, 57, 57)
+        )
+        self.assertEqual(entry["options"]["prev_imported_number"], 0)
+
+    def test_small_import(self):
+        col = ConfigCollection()
+        with mock.patch.object(gen_notes, "CHUNK_SIZE", 100):
+            run_import_job(col, MockNote, make_job("صغيرة", test_text))
+        self.assertIsNone(pending_import(col))
+        self.assertEqual(os.listdir(self.dir), [])
+
+    def test_discard_unrecorded_notes(self):
+        col = SqliteCollection()
+        self.assertEqual(discard_unrecorded_notes(col), 0)
+        col.add_notes(
+            {"رقم السؤال": str(i), "عنوان": title}
+            for title in ("كبيرة", "أخرى")
+            for i in range(1, 26)
+        )
+        write_checkpoint(
+            col,
+            {"title": "كبيرة", "source_digest": "", "last_seq": 20, "path": ""},
+        )
+        self.assertEqual(discard_unrecorded_notes(col), 5)
+        self.assertEqual(col.db.scalar("select count() from notes"), 45)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.import_queue import (
+    DONE,
+    FAILED,
+    PENDING,
+    RUNNING,
+    run_import_queue,
+)
+from src.metrics import read_metrics
+
+from .test_gen_notes import MockCollection, MockNote, test_text, test_text2
+
+
+def make_job(title, source, **options):
+    job = {
+        "title": title,
+        "tags": [],
+        "source": source,
+        "blocks": None,
+        "deck_id": 1,
+        "qa_marker": "؟",
+        "question_marker": True,
+        "chapter_marker": "#",
+        "extra_marker": None,
+        "prev_imported_number": 0,
+        "insert": False,
+        "chapter_decks": False,
+        "source_path": None,
+        "source_size": 0,
+        "watch": False,
+        "status": PENDING,
+    }
+    job.update(options)
+    return job
+
+
+class TestImportQueue(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.metrics_path = os.path.join(self.dir, "metrics.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_jobs_run_in_order(self):
+        col = MockCollection()
+        col.set_config = lambda key, value: None
+        col.get_config = lambda key, default=None: default
+        jobs = [
+            make_job("الأولى", test_text),
+            # a malformed block fails its job without stopping the queue
+            make_job("معطوبة", "", blocks=[{"answer": "جواب"}]),
+            make_job("الثانية", test_text2, extra_marker="$"),
+            make_job("مستوردة", test_text, status=DONE, result=57),
+        ]
+        changes = []
+        failed = run_import_queue(
+            col,
+            MockNote,
+            jobs,
+            on_change=lambda job: changes.append((job["title"], job["status"])),
+            metrics_path=self.metrics_path,
+        )
+        self.assertEqual(failed, 1)
+        self.assertEqual([job["status"] for job in jobs], [DONE, FAILED, DONE, DONE])
+        self.assertEqual(jobs[0]["result"], 57)
+        self.assertEqual(jobs[2]["result"], 1)
+        self.assertIsInstance(jobs[1]["error"], KeyError)
+        self.assertEqual(
+            [note["عنوان"] for note in col.notes],
+            ["الأولى"] * 57 + ["الثانية"],
+        )
+        self.assertEqual(
+            changes,
+            [
+                ("الأولى", RUNNING),
+                ("الأولى", DONE),
+                ("معطوبة", RUNNING),
+                ("معطوبة", FAILED),
+                ("الثانية", RUNNING),
+                ("الثانية", DONE),
+            ],
+        )
+        # only the jobs that added notes are recorded
+        self.assertEqual(
+            [(e["mode"], e["added"]) for e in read_metrics(self.metrics_path)],
+            [("append", 57), ("append", 1)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
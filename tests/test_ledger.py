@@ -0,0 +1,86 @@
+import os
+import unittest
+
+from src.gen_notes import revert_import
+from src.neighbor_context import CONTEXT_SIZE, render_context
+from src.question_sets import (
+    MEDIA_REFS_CONFIG_KEY,
+    fetch_question_set,
+    get_import_ledger,
+    get_media_refs,
+    media_ref,
+    record_import,
+)
+
+from .sqlite_collection import SqliteCollection
+
+
+class TestLedger(unittest.TestCase):
+    def setUp(self):
+        self.col = SqliteCollection()
+
+    def add_set(self, title, first, count, start_seq=1):
+        "Add notes for questions first..first+count-1 numbered from start_seq."
+        self.col.add_notes(
+            {"سؤال": f"{title} {i}؟", "رقم السؤال": str(seq), "عنوان": title}
+            for seq, i in enumerate(range(first, first + count), start_seq)
+        )
+
+    def test_revert_appended(self):
+        self.add_set("أ", 1, 10)
+        record_import(self.col, "أ", list(range(1, 11)), "arq-1.js", {})
+        self.add_set("ب", 1, 5)
+        self.add_set("أ", 11, 5, 11)
+        record_import(self.col, "أ", list(range(16, 21)), "arq-2.js", {})
+        self.assertEqual(revert_import(self.col, 16), 5)
+        notes = fetch_question_set(self.col, "أ")
+        self.assertEqual(len(notes), 10)
+        self.assertEqual(len(fetch_question_set(self.col, "ب")), 5)
+        self.assertEqual([e["first_nid"] for e in get_import_ledger(self.col)], [1])
+        # the last remaining notes lost their neighbors after them
+        blocks = [note.block for note in notes]
+        for i, note in enumerate(notes):
+            self.assertEqual(note.context, render_context(blocks, i, CONTEXT_SIZE))
+        filename = get_media_refs(self.col)["أ"]
+        self.assertEqual({note.media for note in notes}, {media_ref(filename)})
+        self.assertEqual(os.listdir(self.col.media.dir()), [filename])
+
+    def test_revert_inserted(self):
+        self.add_set("أ", 1, 10)
+        # two questions inserted after the third, shifting the rest
+        for nid in range(4, 11):
+            self.col.db.execute(
+                "update notes set flds = ? where id = ?",
+                "\x1f".join([f"أ {nid}؟", "", str(nid + 2), "أ", "", "", "", "", ""]),
+                nid,
+            )
+        self.add_set("أ", 100, 2, 4)
+        record_import(self.col, "أ", [11, 12], "arq-2.js", {})
+        revert_import(self.col, 11)
+        notes = fetch_question_set(self.col, "أ")
+        self.assertEqual([n.seq for n in notes], list(range(1, 11)))
+        self.assertEqual([n.nid for n in notes], list(range(1, 11)))
+
+    def test_revert_unrecorded(self):
+        self.add_set("أ", 1, 3)
+        record_import(self.col, "أ", [1, 2, 3], "arq-1.js", {})
+        with self.assertRaises(ValueError):
+            revert_import(self.col, 2)
+        self.assertEqual(len(fetch_question_set(self.col, "أ")), 3)
+        self.assertEqual(len(get_import_ledger(self.col)), 1)
+
+    def test_revert_whole_set(self):
+        self.add_set("أ", 1, 3)
+        record_import(self.col, "أ", [1, 2, 3], "arq-1.js", {"deck_id": 1})
+        self.col.set_config(MEDIA_REFS_CONFIG_KEY, {"أ": "arq-1.js"})
+        with open(os.path.join(self.col.media.dir(), "arq-1.js"), "w") as f:
+            f.write("var ARQText = '';")
+        self.assertEqual(revert_import(self.col, 1), 3)
+        self.assertEqual(os.listdir(self.col.media.dir()), [])
+        self.assertEqual(fetch_question_set(self.col, "أ"), [])
+        self.assertEqual(self.col.get_config(MEDIA_REFS_CONFIG_KEY), {})
+        self.assertEqual(get_import_ledger(self.col), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
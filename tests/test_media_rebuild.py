@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from src import media_rebuild
+from src.media_rebuild import rebuild_question_set_media
+from src.question_sets import fetch_question_set, get_media_refs, media_ref
+
+from .sqlite_collection import SqliteCollection
+
+TITLES = [f"مجموعة {i}" for i in range(10)]
+
+
+class TestMediaRebuild(unittest.TestCase):
+    def setUp(self):
+        self.col = SqliteCollection()
+        self.col.add_notes(
+            {"سؤال": f"{title} {i}؟", "رقم السؤال": str(i), "عنوان": title}
+            for title in TITLES
+            for i in range(1, 4)
+        )
+        # the temporary files of the rendered sets
+        self.temp = tempfile.mkdtemp()
+        patcher = mock.patch.object(tempfile, "tempdir", self.temp)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp)
+
+    def test_rebuild(self):
+        report = rebuild_question_set_media(self.col, max_workers=2)
+        self.assertEqual((report.sets, report.notes, report.written), (10, 30, 10))
+        refs = get_media_refs(self.col)
+        self.assertEqual(
+            sorted(os.listdir(self.col.media.dir())), sorted(refs.values())
+        )
+        for title in TITLES:
+            self.assertEqual(
+                {note.media for note in fetch_question_set(self.col, title)},
+                {media_ref(refs[title])},
+            )
+        self.assertEqual(os.listdir(self.temp), [])
+        self.assertEqual(rebuild_question_set_media(self.col).written, 0)
+
+    def test_failure(self):
+        "The sets rendered ahead of a set whose notes can't be updated are discarded."
+        with mock.patch.object(
+            media_rebuild,
+            "relink_question_set",
+            side_effect=[None, OSError("disk full")],
+        ):
+            with self.assertRaises(OSError):
+                rebuild_question_set_media(self.col, max_workers=1)
+        self.assertEqual(len(os.listdir(self.col.media.dir())), 2)
+        self.assertEqual(os.listdir(self.temp), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
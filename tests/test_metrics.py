@@ -0,0 +1,87 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from src import metrics
+from src.gen_notes import add_notes, cleanse_text
+
+from .test_gen_notes import MockCollection, MockNote, test_text
+
+
+def entry(questions, notes_per_sec):
+    return {
+        "time": 0,
+        "mode": "append",
+        "questions": questions,
+        "added": questions,
+        "source_bytes": 0,
+        "media_bytes": None,
+        "phases": {"parse": 0.1},
+        "seconds": questions / notes_per_sec,
+        "notes_per_sec": notes_per_sec,
+        "collection_notes": 0,
+    }
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "metrics.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_rotation(self):
+        with mock.patch.object(metrics, "MAX_FILE_SIZE", 500):
+            for i in range(10):
+                metrics.record_metrics(entry(i + 1, 100), self.path)
+        self.assertTrue(os.path.exists(self.path + ".1"))
+        self.assertLess(os.path.getsize(self.path), 500)
+        entries = metrics.read_metrics(self.path)
+        # the entries of the file rotated before the last one are dropped
+        self.assertLess(len(entries), 10)
+        self.assertEqual(entries[-1]["questions"], 10)
+        self.assertEqual(
+            [e["questions"] for e in entries], sorted(e["questions"] for e in entries)
+        )
+
+        # a line cut short is skipped
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write('{"questions":')
+        self.assertEqual(len(metrics.read_metrics(self.path)), len(entries))
+
+    def test_regressions(self):
+        entries = [entry(500, 1000) for _ in range(metrics.MIN_BASELINE)]
+        entries += [entry(50, 100), entry(600, 400), entry(700, 900)]
+        analyzed = metrics.analyze(entries)
+        self.assertEqual(
+            [e["regression"] for e in analyzed], [False] * 6 + [True, False]
+        )
+        self.assertEqual(analyzed[-2]["baseline"], 1000)
+        # a small set has no baseline of its own yet
+        self.assertIsNone(analyzed[-3]["baseline"])
+
+        report = metrics.format_report(analyzed, last=3, regressions_only=True)
+        self.assertEqual(report.count("⚠"), 1)
+        self.assertEqual(metrics.format_report([]), "لا توجد عمليات استيراد مسجلة بعد.")
+
+    def test_phase_timings(self):
+        timings = {}
+        add_notes(
+            MockCollection(),
+            MockNote,
+            "test",
+            [],
+            cleanse_text(test_text),
+            1,
+            "؟",
+            chapter_marker="#",
+            timings=timings,
+        )
+        self.assertEqual(list(timings), ["parse", "media", "notes", "index", "relink"])
+
+
+if __name__ == "__main__":
+    unittest.main()
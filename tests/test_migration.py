@@ -0,0 +1,156 @@
+import os
+import sys
+import time
+import unittest
+
+from src.migration import (
+    MIGRATION_CONFIG_KEY,
+    pending_migration,
+    run_note_transforms,
+    schedule_note_transforms,
+)
+from src.question_sets import write_note_fields
+
+from .sqlite_collection import SqliteCollection
+
+# set to a number of notes to compare the speed of batch sizes and per-note updates
+BENCHMARK_NOTES = int(os.environ.get("ARQ_BENCHMARK_NOTES", "0"))
+
+
+def add_sources(fields):
+    return {"مصادر": "مصدر " + fields["رقم السؤال"]}
+
+
+def mark_chapter(fields):
+    if not fields["باب"].startswith("* "):
+        return {"باب": "* " + fields["باب"]}
+    return None
+
+
+class Interrupted(Exception):
+    pass
+
+
+class TestMigration(unittest.TestCase):
+    def setUp(self):
+        self.col = SqliteCollection()
+        self.col.add_notes(
+            {"سؤال": f"سؤال {i}؟", "رقم السؤال": str(i), "باب": "باب"}
+            for i in range(1, 1001)
+        )
+        self.transforms = {"1.2.0": add_sources, "1.3.0": mark_chapter}
+
+    def fields(self):
+        return [
+            flds.split("\x1f")
+            for flds in self.col.db.list("select flds from notes order by id")
+        ]
+
+    def test_run(self):
+        schedule_note_transforms(self.col, ["1.2.0", "1.3.0"])
+        progress = []
+        changed = run_note_transforms(
+            self.col,
+            "ARQ 1.0",
+            self.transforms,
+            batch_size=300,
+            progress=lambda *args: progress.append(args),
+        )
+        self.assertEqual(changed, 2000)
+        self.assertIsNone(pending_migration(self.col))
+        self.assertEqual(
+            progress[:4], [("1.2.0", n, 1000) for n in (300, 600, 900, 1000)]
+        )
+        for i, fields in enumerate(self.fields()):
+            self.assertEqual(fields[7], f"مصدر {i + 1}")
+            self.assertEqual(fields[4], "* باب")
+
+    def test_resume(self):
+        schedule_note_transforms(self.col, ["1.2.0", "1.3.0"])
+        calls = []
+
+        def interrupted(fields):
+            calls.append(fields["رقم السؤال"])
+            if len(calls) > 1250:
+                raise Interrupted()
+            return self.transforms["1.2.0" if len(calls) <= 1000 else "1.3.0"](fields)
+
+        with self.assertRaises(Interrupted):
+            run_note_transforms(
+                self.col,
+                "ARQ 1.0",
+                {"1.2.0": interrupted, "1.3.0": interrupted},
+                batch_size=100,
+            )
+        self.assertEqual(
+            pending_migration(self.col), {"versions": ["1.3.0"], "last_nid": 200}
+        )
+        changed = run_note_transforms(self.col, "ARQ 1.0", self.transforms)
+        self.assertEqual(changed, 800)
+        self.assertNotIn(MIGRATION_CONFIG_KEY, self.col.config)
+        for fields in self.fields():
+            self.assertEqual(fields[4], "* باب")
+
+    def test_field_count(self):
+        "Fields that don't match the note type aren't written."
+        model = self.col.models.by_name("ARQ 1.0")
+        fields = self.fields()[0]
+        with self.assertRaises(ValueError):
+            write_note_fields(self.col, model, [(1, fields[:-1])])
+        self.assertEqual(self.fields()[0], fields)
+        write_note_fields(self.col, model, [(1, ["<b>1</b>"] * len(fields))], "ترقية")
+        self.assertEqual(self.fields()[0], ["<b>1</b>"] * len(fields))
+        self.assertEqual(self.col.undo_entries, ["ترقية"])
+
+    def test_nothing_pending(self):
+        schedule_note_transforms(self.col, [])
+        self.assertEqual(run_note_transforms(self.col, "ARQ 1.0", self.transforms), 0)
+
+
+@unittest.skipUnless(BENCHMARK_NOTES, "set ARQ_BENCHMARK_NOTES to run")
+class TestMigrationBenchmark(unittest.TestCase):
+    def make_collection(self):
+        col = SqliteCollection()
+        col.add_notes(
+            {"سؤال": f"سؤال {i}؟", "جواب": "جواب " * 20, "رقم السؤال": str(i)}
+            for i in range(1, BENCHMARK_NOTES + 1)
+        )
+        return col
+
+    def report(self, name, col, seconds):
+        print(
+            f"{name}: {BENCHMARK_NOTES} notes in {seconds:.2f}s "
+            f"({BENCHMARK_NOTES / seconds:.0f} notes/s), {col.db.calls} database calls",
+            file=sys.stderr,
+        )
+
+    def test_batch_sizes(self):
+        for batch_size in (100, 1000, 2000, 10000):
+            col = self.make_collection()
+            schedule_note_transforms(col, ["1.2.0"])
+            col.db.calls = 0
+            start = time.perf_counter()
+            run_note_transforms(col, "ARQ 1.0", {"1.2.0": add_sources}, batch_size)
+            self.report(f"batches of {batch_size}", col, time.perf_counter() - start)
+
+    def test_per_note(self):
+        "The naive approach: read, transform and write each note on its own."
+        col = self.make_collection()
+        col.db.calls = 0
+        start = time.perf_counter()
+        for nid in col.db.list("select id from notes"):
+            fields = col.db.scalar("select flds from notes where id = ?", nid).split(
+                "\x1f"
+            )
+            fields[7] = add_sources({"رقم السؤال": fields[2]})["مصادر"]
+            col.db.execute(
+                "update notes set flds = ?, mod = ? where id = ?",
+                "\x1f".join(fields),
+                int(time.time()),
+                nid,
+            )
+        self.report("per note", col, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+from unittest import mock
+
+from src import neighbor_context
+from src.migration import run_note_transforms, schedule_note_transforms
+from src.neighbor_context import (
+    context_transform,
+    render_context,
+    update_neighbor_context,
+)
+from src.question_sets import fetch_question_set
+
+from .sqlite_collection import SqliteCollection
+
+
+def block(i):
+    return {"question": f"س{i}", "answer": f"ج{i}", "chapter": "", "extra": ""}
+
+
+class TestNeighborContext(unittest.TestCase):
+    def setUp(self):
+        self.col = SqliteCollection()
+        # the notes of two sets imported in turns, as the migration visits them in ID order
+        self.col.add_notes(
+            {"سؤال": f"س{i}", "جواب": f"ج{i}", "رقم السؤال": str(i), "عنوان": title}
+            for i in range(1, 11)
+            for title in ("أ", "ب")
+        )
+
+    def contexts(self, title):
+        return [note.context for note in fetch_question_set(self.col, title)]
+
+    def test_render_context(self):
+        blocks = [block(i) for i in range(1, 6)]
+        self.assertEqual(
+            render_context(blocks, 0, 1),
+            '<div data-start="2"><div><div>س2</div><div>ج2</div><div></div></div></div>',
+        )
+        context = render_context(blocks, 3, 2)
+        self.assertEqual(
+            context,
+            '<div data-start="2">'
+            "<div><div>س2</div><div>ج2</div><div></div></div>"
+            "<div><div>س3</div><div>ج3</div><div></div></div></div>"
+            '<div data-start="5"><div><div>س5</div><div>ج5</div><div></div></div></div>',
+        )
+        # the card already shows the current block
+        self.assertNotIn("س4", context)
+        self.assertEqual(render_context(blocks[:1], 0, 2), "")
+        self.assertEqual(render_context(blocks, 3, 0), "")
+
+    def test_update(self):
+        self.assertEqual(update_neighbor_context(self.col, "أ"), 10)
+        contexts = self.contexts("أ")
+        self.assertEqual(
+            contexts[4], render_context([block(i) for i in range(1, 11)], 4, 2)
+        )
+        self.assertEqual(self.contexts("ب"), [""] * 10)
+        # unchanged contexts aren't written again
+        calls = self.col.db.calls
+        self.assertEqual(update_neighbor_context(self.col, "أ"), 0)
+        self.assertEqual(self.col.db.calls, calls + 1)
+
+        with mock.patch.object(neighbor_context, "CONTEXT_SIZE", 0):
+            self.assertEqual(update_neighbor_context(self.col, "أ"), 10)
+        self.assertEqual(self.contexts("أ"), [""] * 10)
+
+    def test_backfill(self):
+        update_neighbor_context(self.col, "أ")
+        expected = self.contexts("أ")
+        self.col.db.execute(
+            "update notes set flds = replace(flds, ?, '') where id = 1", expected[0]
+        )
+        schedule_note_transforms(self.col, ["1.2.0"])
+        transform = context_transform(lambda: self.col)
+        with mock.patch.object(
+            neighbor_context,
+            "fetch_question_sets",
+            wraps=neighbor_context.fetch_question_sets,
+        ) as fetch:
+            changed = run_note_transforms(
+                self.col, "ARQ 1.0", {"1.2.0": transform}, batch_size=3
+            )
+        self.assertEqual(changed, 11)
+        # the interleaved sets are read once, not each time the set changes
+        fetch.assert_called_once()
+        self.assertEqual(self.contexts("أ"), expected)
+        # the sets have the same questions
+        self.assertEqual(self.contexts("ب"), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,243 @@
+"""
+Differential tests comparing the parsing and cleansing engines of the add-on against the
+legacy implementations in legacy_parser.py on randomly generated texts.
+
+Set ARQ_FUZZ_CASES and ARQ_FUZZ_SEED to control the number of generated cases and the seed,
+and ARQ_FUZZ_REPORT=1 to print the relative speed of each engine.
+"""
+import io
+import os
+import random
+import sys
+import time
+import unittest
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.gen_notes import (
+    cleanse_text,
+    parse_questions,
+    parse_questions_parallel,
+    split_at_chapters,
+)
+from src.source_files import iter_decoded_lines
+
+from . import legacy_parser
+
+CASES = int(os.environ.get("ARQ_FUZZ_CASES", "300"))
+SEED = int(os.environ.get("ARQ_FUZZ_SEED", "1"))
+REPORT = bool(os.environ.get("ARQ_FUZZ_REPORT"))
+
+QA_MARKERS = ["؟", "?", "-", ":", ".."]
+CHAPTER_MARKERS = [None, "#", "##", "باب"]
+EXTRA_MARKERS = [None, "$", "*", "-"]
+WORDS = ["ما", "تعريف", "الواجب", "01-", "وَصَلِّ", "**", "..", "[1]", "<b>", "x"]
+
+
+def _split_parse(lines, qa_marker, question_marker, chapter_marker, extra_marker):
+    "Parse the chapter ranges used by parse_questions_parallel in this process."
+    if not chapter_marker:
+        return parse_questions(
+            lines, qa_marker, question_marker, chapter_marker, extra_marker
+        )
+    ret = []
+    for start, end in split_at_chapters(lines, chapter_marker, 8):
+        ret.extend(
+            parse_questions(
+                lines[start:end],
+                qa_marker,
+                question_marker,
+                chapter_marker,
+                extra_marker,
+            )
+        )
+    return ret
+
+
+def _parallel_parse(*args):
+    return parse_questions_parallel(*args, max_workers=2, min_lines=0)
+
+
+STREAM_ENCODINGS = ["utf-8", "utf-8-sig", "utf-16", "utf-16-le", "cp1256"]
+
+
+def _decoded_cleanse(text):
+    "Encode the text, then detect the encoding and decode it in small chunks to cleanse it."
+    encoding = STREAM_ENCODINGS[len(text) % len(STREAM_ENCODINGS)]
+    f = io.BytesIO(text.encode(encoding, errors="replace"))
+    return cleanse_text("\n".join(iter_decoded_lines(f, chunk_size=7)))
+
+
+# (name, legacy engine, optimized engine, run on every nth case only)
+PARSE_ENGINES: List[Tuple[str, Callable, Callable, int]] = [
+    ("parse_questions", legacy_parser.parse_questions, parse_questions, 1),
+    ("split at chapters", legacy_parser.parse_questions, _split_parse, 1),
+    # starting worker processes is slow, so only check a sample of cases
+    ("parse_questions_parallel", legacy_parser.parse_questions, _parallel_parse, 25),
+]
+CLEANSE_ENGINES: List[Tuple[str, Callable, Callable, int]] = [
+    ("cleanse_text", legacy_parser.cleanse_text, cleanse_text, 1),
+    ("decoded cleanse", legacy_parser.cleanse_text, _decoded_cleanse, 1),
+]
+
+
+class Case:
+    "A randomly generated input: marker options and the raw lines of the text."
+
+    def __init__(
+        self,
+        qa_marker: str,
+        question_marker: bool,
+        chapter_marker: Optional[str],
+        extra_marker: Optional[str],
+        lines: List[str],
+    ):
+        self.qa_marker = qa_marker
+        self.question_marker = question_marker
+        self.chapter_marker = chapter_marker
+        self.extra_marker = extra_marker
+        self.lines = lines
+
+    def with_lines(self, lines: List[str]) -> "Case":
+        return Case(
+            self.qa_marker,
+            self.question_marker,
+            self.chapter_marker,
+            self.extra_marker,
+            lines,
+        )
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines)
+
+    @property
+    def args(self) -> Tuple:
+        return (
+            self.qa_marker,
+            self.question_marker,
+            self.chapter_marker,
+            self.extra_marker,
+        )
+
+    def __repr__(self) -> str:
+        return f"Case(args={self.args!r}, lines={self.lines!r})"
+
+
+def generate_case(rnd: random.Random) -> Case:
+    qa_marker = rnd.choice(QA_MARKERS)
+    chapter_marker = rnd.choice(CHAPTER_MARKERS)
+    extra_marker = rnd.choice(EXTRA_MARKERS)
+
+    def words() -> str:
+        return " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(0, 4)))
+
+    kinds = [
+        lambda: f"{words()} {qa_marker} {words()}",
+        lambda: words(),
+        lambda: f"{chapter_marker or '#'} {words()}",
+        lambda: f"{chapter_marker or '#'} {words()}{qa_marker}",
+        lambda: f"{extra_marker or '$'}{words()}",
+        lambda: f"{extra_marker or '$'} {words()} {qa_marker}",
+        lambda: "",
+        lambda: " \t ",
+        lambda: f"  {words()}{qa_marker}  ",
+    ]
+    lines = [rnd.choice(kinds)() for _ in range(rnd.randint(0, 40))]
+    if lines and rnd.random() < 0.2:
+        # consecutive chapter lines
+        i = rnd.randrange(len(lines))
+        lines[i:i] = [f"{chapter_marker or '#'} {words()}"] * 2
+    return Case(
+        qa_marker, rnd.choice([True, False]), chapter_marker, extra_marker, lines
+    )
+
+
+def run_engine(engine: Callable, *args: Any) -> Tuple[str, Any, float]:
+    "Run an engine, returning ('ok', result, seconds) or ('error', exception type, seconds)."
+    start = time.perf_counter()
+    try:
+        result = ("ok", engine(*args))
+    except Exception as exc:  # pylint: disable=broad-except
+        result = ("error", type(exc))
+    return result[0], result[1], time.perf_counter() - start
+
+
+def shrink(case: Case, fails: Callable[[Case], bool]) -> Case:
+    "Remove chunks of lines, then single lines, while the case keeps failing."
+    chunk = max(1, len(case.lines) // 2)
+    while chunk >= 1:
+        i = 0
+        while i < len(case.lines):
+            candidate = case.with_lines(case.lines[:i] + case.lines[i + chunk :])
+            if fails(candidate):
+                case = candidate
+            else:
+                i += chunk
+        chunk //= 2
+    return case
+
+
+class TestParserFuzz(unittest.TestCase):
+    speed: Dict[str, List[float]] = {}
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        if not REPORT:
+            return
+        for name, ratios in cls.speed.items():
+            ratios = sorted(ratios)
+            print(
+                f"{name}: {len(ratios)} cases, optimized/legacy time "
+                f"median {ratios[len(ratios) // 2]:.2f}, "
+                f"min {ratios[0]:.2f}, max {ratios[-1]:.2f}",
+                file=sys.stderr,
+            )
+
+    def check_engines(
+        self,
+        engines: List[Tuple[str, Callable, Callable, int]],
+        make_args: Callable[[Case], Tuple],
+    ) -> None:
+        rnd = random.Random(SEED)
+        for n in range(CASES):
+            case = generate_case(rnd)
+            for name, legacy, optimized, every in engines:
+                if n % every:
+                    continue
+
+                def fails(c: Case) -> bool:
+                    return (
+                        run_engine(legacy, *make_args(c))[:2]
+                        != run_engine(optimized, *make_args(c))[:2]
+                    )
+
+                *expected, legacy_time = run_engine(legacy, *make_args(case))
+                *actual, optimized_time = run_engine(optimized, *make_args(case))
+                if expected != actual:
+                    self.fail(
+                        f"{name} differs from the legacy engine on case {n} "
+                        f"(seed {SEED}), shrunk to {shrink(case, fails)!r}"
+                    )
+                if legacy_time:
+                    self.speed.setdefault(name, []).append(optimized_time / legacy_time)
+
+    def test_parse_engines(self):
+        self.check_engines(
+            PARSE_ENGINES,
+            lambda case: (
+                [line.strip() for line in case.lines if line.strip()],
+                *case.args,
+            ),
+        )
+
+    def test_cleanse_engines(self):
+        self.check_engines(CLEANSE_ENGINES, lambda case: (case.text,))
+
+    def test_shrink(self):
+        case = Case("؟", True, "#", None, ["a", "b", "# c", "d", "e"])
+        shrunk = shrink(case, lambda c: "# c" in c.lines and "e" in c.lines)
+        self.assertEqual(shrunk.lines, ["# c", "e"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+
+from src.gen_notes import plan_notes
+
+from .sqlite_collection import SqliteCollection
+
+
+class Decks:
+    def __init__(self, names):
+        self.names = names
+
+    def name(self, did):
+        return self.names[did]
+
+    def id_for_name(self, name):
+        return next((did for did, n in self.names.items() if n == name), None)
+
+
+def block(question, answer="جواب", chapter="", extra=""):
+    return {"question": question, "answer": answer, "chapter": chapter, "extra": extra}
+
+
+class TestPlan(unittest.TestCase):
+    def setUp(self):
+        self.col = SqliteCollection()
+        self.col.decks = Decks({1: "الأصول", 2: "الأصول::الأدلة"})
+        self.col.add_notes(
+            {
+                "سؤال": f"سؤال {i}؟",
+                "جواب": "جواب",
+                "رقم السؤال": str(i),
+                "عنوان": "أ",
+            }
+            for i in range(1, 6)
+        )
+        self.blocks = [block(f"سؤال {i}؟") for i in range(1, 6)]
+
+    def plan(self, blocks, **kwargs):
+        calls = self.col.db.calls
+        plan = plan_notes(self.col, "أ", [], 1, blocks=blocks, **kwargs)
+        # a single read of the question set
+        self.assertEqual(self.col.db.calls, calls + 1)
+        return plan
+
+    def test_insert(self):
+        blocks = self.blocks[:2] + [block("مدرج؟")] + self.blocks[2:]
+        plan = self.plan(blocks, insert=True)
+        self.assertEqual(plan["new"], 1)
+        self.assertEqual(plan["existing"], 5)
+        self.assertEqual(plan["renumbered"], 3)
+        self.assertEqual(plan["touched"], 5)
+        self.assertIsNone(plan["error"])
+        self.assertFalse(plan["title_exists"])
+
+        plan = self.plan(self.blocks[1:], insert=True)
+        self.assertEqual(plan["error"], "mismatch")
+        self.assertEqual(plan["new"], 0)
+
+    def test_append(self):
+        plan = self.plan(self.blocks)
+        self.assertTrue(plan["title_exists"])
+        self.assertEqual(plan["new"], 5)
+
+        blocks = self.blocks + [
+            block("سؤال 1؟", chapter="الأدلة"),
+            block("", chapter="الأدلة"),
+            block("بلا جواب؟", "", chapter="الأحكام"),
+        ]
+        plan = self.plan(blocks, prev_imported_number=5, chapter_decks=True)
+        self.assertFalse(plan["title_exists"])
+        self.assertEqual(plan["new"], 3)
+        self.assertEqual(plan["chapters"], 3)
+        self.assertEqual(plan["new_decks"], ["الأصول::الأحكام"])
+        self.assertEqual(
+            [(w["seq"], w["kind"]) for w in plan["warnings"]],
+            [
+                (6, "duplicate_question"),
+                (7, "empty_question"),
+                (8, "empty_answer"),
+            ],
+        )
+
+        plan = self.plan(self.blocks, prev_imported_number=5)
+        self.assertEqual(plan["error"], "no_new_blocks")
+
+
+if __name__ == "__main__":
+    unittest.main()
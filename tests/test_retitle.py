@@ -0,0 +1,75 @@
+import os
+import unittest
+
+from src.question_sets import (
+    MEDIA_REFS_CONFIG_KEY,
+    fetch_question_set,
+    get_import_ledger,
+    get_media_refs,
+    media_ref,
+    record_import,
+)
+from src.retitle import retitle_question_set
+from src.search_index import SearchIndex
+from src.watcher import WATCHES_CONFIG_KEY, get_watches
+
+from .sqlite_collection import SqliteCollection
+
+
+class TestRetitle(unittest.TestCase):
+    def setUp(self):
+        self.col = SqliteCollection()
+        for title in ("قديم", "آخر"):
+            self.col.add_notes(
+                {"سؤال": f"سؤال {i}؟", "رقم السؤال": str(i), "عنوان": title}
+                for i in range(1, 6)
+            )
+        self.index = SearchIndex(":memory:")
+        self.index.rebuild(self.col)
+
+    def tearDown(self):
+        self.index.close()
+
+    def test_retitle(self):
+        self.col.set_config(
+            MEDIA_REFS_CONFIG_KEY, {"قديم": "arq-1.js", "آخر": "arq-2.js"}
+        )
+        self.col.set_config(WATCHES_CONFIG_KEY, {"قديم": {"path": "x.txt"}})
+        record_import(self.col, "قديم", [1, 2, 3, 4, 5], "arq-1.js", {})
+        self.assertEqual(retitle_question_set(self.col, "قديم", "جديد", self.index), 5)
+        self.assertEqual(fetch_question_set(self.col, "قديم"), [])
+        self.assertEqual(len(fetch_question_set(self.col, "جديد")), 5)
+        self.assertEqual(len(fetch_question_set(self.col, "آخر")), 5)
+        self.assertEqual(
+            get_media_refs(self.col), {"جديد": "arq-1.js", "آخر": "arq-2.js"}
+        )
+        self.assertEqual(list(get_watches(self.col)), ["جديد"])
+        self.assertEqual(get_import_ledger(self.col)[0]["title"], "جديد")
+        self.assertEqual(
+            {result.title for result in self.index.search("سؤال")}, {"جديد", "آخر"}
+        )
+
+    def test_file_named_by_title(self):
+        "Sets imported before media files were named by their contents get a new file."
+        with open(os.path.join(self.col.media.dir(), "قديم.js"), "w") as f:
+            f.write("var ARQText = '';")
+        retitle_question_set(self.col, "قديم", "جديد")
+        filename = get_media_refs(self.col)["جديد"]
+        self.assertTrue(filename.startswith("arq-"))
+        self.assertEqual(
+            {note.media for note in fetch_question_set(self.col, "جديد")},
+            {media_ref(filename)},
+        )
+        self.assertEqual(
+            {note.media for note in fetch_question_set(self.col, "آخر")}, {""}
+        )
+        self.assertEqual(os.listdir(self.col.media.dir()), [filename])
+
+    def test_existing_title(self):
+        with self.assertRaises(ValueError):
+            retitle_question_set(self.col, "قديم", "آخر")
+        self.assertEqual(len(fetch_question_set(self.col, "قديم")), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
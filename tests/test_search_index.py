@@ -0,0 +1,51 @@
+import unittest
+
+from src.gen_notes import add_notes
+from src.search_index import *
+
+from .test_gen_notes import mock_note
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = SearchIndex(":memory:")
+
+    def tearDown(self) -> None:
+        self.index.close()
+
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text("أَحْمَدُ رَبِّي"), "احمد ربي")
+        self.assertEqual(normalize_text("<b>إِلَى</b>"), " الي ")
+
+    def test_diacritic_insensitive_search(self):
+        self.index.add(
+            [
+                (10, "Hello", 1, "مقدمة؟", "أَحْمَدُ رَبِّي وَاهِبَ العُقُولِ"),
+                (11, "Hello", 2, "أبواب العلم؟", "عِلْمُ الأُصُولِ"),
+            ]
+        )
+        self.assertEqual(self.index.search("احمد"), [SearchResult("Hello", 1, 10)])
+        self.assertEqual(self.index.search("الاصول"), [SearchResult("Hello", 2, 11)])
+        self.assertEqual(self.index.search("ابو"), [SearchResult("Hello", 2, 11)])
+        self.assertEqual(self.index.search('"'), [])
+        self.assertEqual(self.index.search(""), [])
+
+    def test_readding_replaces_entry(self):
+        self.index.add([(10, "Hello", 1, "سؤال قديم؟", "")])
+        self.index.add([(10, "Hello", 1, "سؤال جديد؟", "")])
+        self.assertEqual(self.index.count(), 1)
+        self.assertEqual(self.index.search("قديم"), [])
+        self.index.remove([10])
+        self.assertEqual(self.index.count(), 0)
+
+    def test_add_notes_populates_index(self):
+        kwargs = mock_note()
+        added = add_notes(**kwargs, index=self.index)
+        self.assertEqual(self.index.count(), added)
+        self.assertEqual(
+            self.index.search("المرجحات"), [SearchResult("Hello", 57, 57)]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import io
+import unittest
+
+from src.gen_notes import cleanse_text
+from src.source_files import detect_encoding, iter_decoded_lines
+
+from .test_gen_notes import test_text
+
+
+class TestSourceFiles(unittest.TestCase):
+    def test_detect_encoding(self):
+        for encoding, detected in (
+            ("utf-8", "utf-8"),
+            ("utf-8-sig", "utf-8-sig"),
+            ("utf-16", "utf-16"),
+            ("utf-16-le", "utf-16-le"),
+            ("utf-16-be", "utf-16-be"),
+            ("cp1256", "cp1256"),
+        ):
+            with self.subTest(encoding=encoding):
+                data = test_text.encode(encoding)
+                # a sample ending in the middle of a character
+                self.assertEqual(detect_encoding(data[:1001]), detected)
+
+    def test_streamed_lines(self):
+        text = test_text.replace("\n", "\r\n") * 50
+        for encoding in ("utf-8", "utf-16", "cp1256"):
+            with self.subTest(encoding=encoding):
+                f = io.BytesIO(text.encode(encoding))
+                self.assertEqual(
+                    cleanse_text("\n".join(iter_decoded_lines(f, chunk_size=1000))),
+                    cleanse_text(text),
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from src.gen_notes import cleanse_text, parse_questions
+from src.import_queue import run_import_job
+from src.question_sets import fetch_question_set
+from src.watcher import file_anchor, get_watches, poll_watches, read_new_blocks
+
+from .sqlite_collection import SqliteCollection
+from .test_gen_notes import MockCollection, MockNote, test_text
+from .test_import_queue import make_job
+
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "source.txt")
+        lines = cleanse_text(test_text)
+        lines.insert(30, "# باب الأدلة")
+        lines.insert(31, "# فصل الكتاب")
+        self.text = "\n".join(lines) + "\n"
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_appended_chunks(self):
+        "Polling a file while it's written in chunks gives the blocks of the whole file."
+        args = ("؟", True, "#", None)
+        data = self.text.encode()
+        offset = 0
+        chapter = []
+        blocks = []
+        with open(self.path, "wb") as f:
+            # chunks end in the middle of lines and of multi-byte characters
+            for end in range(0, len(data) + 997, 997):
+                f.write(data[end - 997 if end else 0 : end])
+                f.flush()
+                new_blocks, offset, chapter = read_new_blocks(
+                    self.path, offset, *args, chapter
+                )
+                blocks.extend(new_blocks)
+        expected = parse_questions(cleanse_text(self.text), *args)
+        # the last block is held back until more lines are added after it
+        self.assertEqual(blocks, expected[:-1])
+        with open(self.path, "ab") as f:
+            f.write("سؤال جديد؟\n".encode())
+        new_blocks, _, _ = read_new_blocks(self.path, offset, *args, chapter)
+        self.assertEqual(new_blocks, expected[-1:])
+
+    def test_answer_appended_to_last_question(self):
+        "Lines appended to the last imported question are imported as its answer."
+        source = "س1؟\nج1\nس2؟\n"
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(source)
+        col = MockCollection()
+        job = make_job(
+            "أ",
+            source,
+            source_path=self.path,
+            source_size=os.path.getsize(self.path),
+            watch=True,
+        )
+        metrics_path = os.path.join(self.dir, "metrics.jsonl")
+        self.assertEqual(
+            run_import_job(col, MockNote, job, metrics_path=metrics_path), 1
+        )
+        self.assertEqual(get_watches(col)["أ"]["offset"], len("س1؟\nج1\n".encode()))
+
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("ج2\nس3؟\nج3\n")
+        self.assertEqual(poll_watches(col, MockNote), ({"أ": 1}, {}))
+        self.assertEqual(
+            [
+                (note.block["question"], note.block["answer"])
+                for note in fetch_question_set(col, "أ")
+            ],
+            [("س1؟", "ج1"), ("س2؟", "ج2")],
+        )
+
+    def test_nothing_complete(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("سؤال؟\nجواب\nجواب آخر بلا سطر جديد")
+        self.assertEqual(
+            read_new_blocks(self.path, 0, "؟", True, "#", None, ["باب"]),
+            ([], 0, ["باب"]),
+        )
+
+    def test_rewritten_file(self):
+        "A rewritten file is dropped instead of being read again from a stale offset."
+        col = SqliteCollection()
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("سؤال؟\nجواب\n")
+        state = {
+            "path": self.path,
+            "offset": os.path.getsize(self.path),
+            "anchor": file_anchor(self.path, os.path.getsize(self.path)),
+            "chapter": [],
+            "qa_marker": "؟",
+            "question_marker": True,
+            "chapter_marker": "#",
+            "extra_marker": None,
+        }
+        # watches from before anchors were stored
+        old_state = {k: v for k, v in state.items() if k != "anchor"}
+        col.set_config("arqimporter_watches", {"أ": state, "ب": old_state})
+        self.assertEqual(poll_watches(col, MockNote), ({}, {}))
+
+        # an edit before the offset leaves it in the middle of a character
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("سؤالٌ؟\nجواب\nسؤال آخر؟\nجواب\n")
+        added, stopped = poll_watches(col, MockNote)
+        self.assertEqual(added, {})
+        self.assertEqual(stopped["أ"], "تغير الملف قبل نهاية الجزء المستورد منه")
+        self.assertIn("utf-8", stopped["ب"])
+        self.assertEqual(get_watches(col), {})
+
+
+if __name__ == "__main__":
+    unittest.main()